@@ -17,75 +17,163 @@
         # cin_not_recorded_message_displayed : to prevent NFC does not have CIN# recorded repeatidly  
 
 import csv                                                      # Import the CSV module for reading and writing CSV files
+import locale
 import os                                                       # Import the OS module for file and path operations
+import signal
+import sys
 import time                                                     # Import the time module for adding delays
+STARTED_AT = time.perf_counter()                                # Startup is timed from here, see mark_startup
 from datetime import datetime                                   # Import datetime for timestamp creation
-from smartcard.System import readers                            # Import readers to interact with NFC readers
-from smartcard.util import toHexString                          # Import toHexString to convert byte data to hex string
-from smartcard.Exceptions import NoCardException                # Import NoCardException for error handling
-import tkinter as tk                                            # Import tkinter for creating the GUI
-#import tkinterFileDialog                                       # Import the FileDialog for User to pick file path for csv_path and folder_path
-from tkinter import ttk, messagebox, filedialog, simpledialog   # Import ttk for themed tkinter widgets
 import threading                                                # Import threading for running NFC reading in a separate thread
-import openpyxl
-from smartcard.util import toBytes
+# tkinter, pyscard and openpyxl are imported where they are first needed: tkinter only in GUI mode (import_gui),
+# pyscard when the readers start (start_readers) and openpyxl when the master list is read (Roster)
+from transfer_followup import TransferFollowUps, WAITING_TEXT   # Import the rows waiting for transfer information
+from student_record import Student, AttendanceRecord            # Import the student and attendance record types
+from station_config import load_config                          # Import the config file / command-line settings
+from roster import Roster, normalize_cin                        # Import the in-memory master list shared by every lookup
+from roster_snapshot import RosterSnapshot                      # Import the saved copy of the master list for fast startup
+from roster_watch import RosterWatcher                          # Import the watch that reloads the master list when it changes
+from roster_search import entry_key
+from tag_io import read_payload, read_uid, write_pages, verify_pages, TagRead   # Import the batched tag reader and writer
+from tag_registry import TagRegistry                            # Import the tag UID -> student registry
+from tag_provisioning import ProvisioningBatch, parse_row_ranges   # Import bulk tag writing
+from tag_payload import encode_payload, decode_payload, payload_complete   # Import the tag payload format (compact and legacy)
+from scan_pipeline import ScanPipeline                          # Import the asyncio scan pipeline
+from reader_backend import create_reader_pool, INSERTED, REMOVED, NO_READER   # Import the reader backends (PC/SC or simulated)
+from metrics import Metrics                                     # Import the per-stage timing histograms
+from hub_client import HubClient, DUPLICATE                     # Import the client of the shared check-in hub
+from excel_export import ExcelExporter                          # Import the background Excel export of the attendance
+from attendance_writer import AttendanceWriter                  # Import the group-commit attendance writer
+from attendance_checkpoint import AttendanceCheckpoint          # Import the resume checkpoint for the attendance CSV
+from attendance_store import AttendanceStore, CSV_HEADER, normalize_row, store_event_key   # Import the SQLite attendance store
 # from flask import Flask                             # Import flask for web application
 
-# Show message box to prompt user for master list file
-messagebox.showinfo("Select Master List", "Please select the Excel file containing the master list of students.")
-
-# student_list = tk.filedialog.askopenfilename(title="yourmom", initaldir=os.path.expanduser('~'))   
-# print(student_list)
-
-# Now open the file dialog
-file_path = filedialog.askopenfilename(
-        title="Master List of Students",
-        filetypes=[("Excel Files", "*.xlsx"), ("All files", "*.*")],
-    )
-if not file_path:
-    messagebox.showerror("Error", "No file selected. The program will now exit.")
-    exit()
-print(file_path)
-
-# eventName = input('Enter a name of the event (NO SPACES): ')
-# eventName = "WelcomeMixer"
-# Function to get event name and folder location
-def get_event_details():
-    root = tk.Tk()
-    root.withdraw()  # Hide the main window
-    event_name = simpledialog.askstring("Event Name", "Enter the name of the event (No Spaces):")
-    if event_name is None:  # User cancelled
-        exit()
-    folder_path = filedialog.askdirectory(title="Select folder for event data")
-    if not folder_path:  # User cancelled
-        exit()
-    return event_name, folder_path
-
-# def get_student_list():
-#     root = tk.Tk()
-#     root.withdraw()
-#     student_list = filedialog.askopenfilename("")
-
-# Get event details
-eventName, folder_path = get_event_details()
-
-# Get one drive path details
-# fileName, oneDrive_folderPath = get_student_list()
-
-# Define custom event
-CUSTOM_EVENT = '<<AttendanceLogged>>'
-
-# Set the path for the attendance CSV file
-# csv_path = os.path.join(os.path.expanduser('~'), 'Documents', 'Fall2024Events', eventName, 'attendance.csv') 
-csv_path = os.path.join(folder_path, f"{eventName}_attendance.csv")
-
-# Path to Excel file in OneDrive Folder for Students
-# onedrive_path = os.path.join(os.path.expanduser('~'), 'OneDrive - Cal State LA', 'Registered ECST Transfers.xlsx')
-onedrive_path = file_path
-
-# Creating the flask app and URL's path component at root for the app
-# app = Flask(__name__)
-# @app.route("/")
+# Function to import tkinter and the widgets built on it, only called in GUI mode
+def import_gui():
+    global tk, ttk, messagebox, filedialog, simpledialog, VirtualTable, UIQueue
+    import tkinter as tk                                        # Import tkinter for creating the GUI
+    from tkinter import ttk, messagebox, filedialog, simpledialog   # Import ttk for themed tkinter widgets
+    from virtual_table import VirtualTable                      # Import the table that only draws the visible rows
+    from ui_queue import UIQueue                                # Import the queue worker threads use to update the GUI
+
+# Startup phases, seconds since STARTED_AT; time spent waiting on the operator's dialogs is left out
+startup_times = {}
+dialog_seconds = 0.0
+
+def mark_startup(phase):
+    startup_times[phase] = time.perf_counter() - STARTED_AT - dialog_seconds
+
+def report_startup(mode):
+    phases = ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in startup_times.items())
+    print(f"Startup ({mode}): {phases}")
+
+# Function to ask for whatever the config left out: master list, event name and folder location
+# root is the (still hidden) main window, so no second Tk instance is created
+def get_event_details(root, config):
+    global dialog_seconds
+    started = time.perf_counter()
+    file_path = config.master_list
+    if not file_path:
+        # Show message box to prompt user for master list file
+        messagebox.showinfo("Select Master List", "Please select the Excel file containing the master list of students.", parent=root)
+        # Now open the file dialog
+        file_path = filedialog.askopenfilename(
+                parent=root,
+                title="Master List of Students",
+                filetypes=[("Excel Files", "*.xlsx"), ("All files", "*.*")],
+            )
+        if not file_path:
+            messagebox.showerror("Error", "No file selected. The program will now exit.", parent=root)
+            sys.exit()
+    print(file_path)
+
+    event_name = config.event
+    if not event_name:
+        event_name = simpledialog.askstring("Event Name", "Enter the name of the event (No Spaces):", parent=root)
+        if event_name is None:  # User cancelled
+            sys.exit()
+    folder_path = config.output_folder
+    if not folder_path:
+        folder_path = filedialog.askdirectory(parent=root, title="Select folder for event data")
+        if not folder_path:  # User cancelled
+            sys.exit()
+    dialog_seconds += time.perf_counter() - started
+    return file_path, event_name, folder_path
+
+# Attendance rows are written in groups, every COMMIT_INTERVAL seconds or once COMMIT_ROWS rows are waiting
+COMMIT_INTERVAL = 0.5
+COMMIT_ROWS = 25
+# Every event's attendance also goes into one SQLite database, indexed by (event, CIN) and by timestamp
+ATTENDANCE_DB_PATH = os.path.join(os.path.expanduser('~'), 'Documents', 'AttendanceTracker', 'attendance.db')
+
+# Rows added to the Attendance tab per Tk callback while resuming
+RESUME_CHUNK_ROWS = 5000
+
+# Every stage of a tap is timed; the numbers are written to <event>_metrics.prom every METRICS_INTERVAL seconds
+# and, with --trace, one JSON line per tap goes to <event>_trace.jsonl
+METRICS_INTERVAL = 15.0
+# The attendance CSV is copied to <event>_attendance.xlsx every EXCEL_INTERVAL seconds (0 = never)
+EXCEL_INTERVAL = 30.0
+WATCH_INTERVAL = 2.0                    # Seconds between checks of the master list for changes, --watch-interval
+mark_attended = False                   # Also mark who attended next to the master list, --mark-attended
+trace_taps = False
+metrics = Metrics()
+
+# Function to set up the event: attendance CSV, database, writer and master list
+def setup_event(file_path, event_name, folder_path):
+    global eventName, event_key, csv_path, onedrive_path, roster
+    global attendance_store, attendance_checkpoint, attendance_writer, transfer_followups, tag_registry, roster_snapshot
+    global hub_client, excel_exporter, roster_watcher
+    eventName = event_name
+
+    # Set the path for the attendance CSV file
+    # csv_path = os.path.join(os.path.expanduser('~'), 'Documents', 'Fall2024Events', eventName, 'attendance.csv') 
+    csv_path = os.path.join(folder_path, f"{eventName}_attendance.csv")
+    # The database holds many events, so rows are kept under the CSV's path: the same name in another folder is another event
+    event_key = store_event_key(csv_path)
+
+    attendance_store = AttendanceStore(ATTENDANCE_DB_PATH)
+    # Tags already enrolled or read once are recognized by UID, next to the attendance in the same database
+    tag_registry = TagRegistry(ATTENDANCE_DB_PATH)
+
+    # The checkpoint remembers the signed-in CINs up to a byte offset, so a restart only parses newer rows
+    attendance_checkpoint = AttendanceCheckpoint(csv_path)
+    attendance_writer = AttendanceWriter(csv_path, commit_interval=COMMIT_INTERVAL, commit_rows=COMMIT_ROWS,
+                                         on_commit=attendance_checkpoint.committed,
+                                         on_journaled=lambda rows: attendance_store.add_rows(event_key, rows),
+                                         metrics=metrics)
+    # Rows recorded before the operator entered their transfer information
+    transfer_followups = TransferFollowUps()
+
+    # Path to Excel file in OneDrive Folder for Students
+    # onedrive_path = os.path.join(os.path.expanduser('~'), 'OneDrive - Cal State LA', 'Registered ECST Transfers.xlsx')
+    onedrive_path = file_path
+
+    # The master list is loaded once and shared by enrollment, the Excel Data tab and search
+    # Nothing is read until the first lookup, and then from the snapshot unless the workbook changed
+    roster_snapshot = RosterSnapshot(os.path.join(os.path.dirname(ATTENDANCE_DB_PATH), "roster_cache.db"))
+    roster = Roster(onedrive_path, snapshot=roster_snapshot, on_change=roster_changed, on_indexed=roster_indexed)
+    # Edits to the master list are picked up while the station runs, see start_roster_watch
+    roster_watcher = RosterWatcher(roster, interval=WATCH_INTERVAL or 2.0)
+
+    metrics.gauge("backlog", lambda: pipeline.backlog())
+    metrics.gauge("waiting_transfer_info", transfer_followups.count)
+    metrics.gauge("writer_pending", lambda: len(attendance_writer.pending))
+    metrics.gauge("roster_snapshot_hit_rate", lambda: roster_snapshot.hit_rate() or 0.0)
+
+    excel_exporter = None
+    if EXCEL_INTERVAL > 0:
+        excel_exporter = ExcelExporter(csv_path, os.path.join(folder_path, f"{eventName}_attendance.xlsx"), eventName,
+                                       EXCEL_INTERVAL, master_list=onedrive_path, mark_attended=mark_attended, metrics=metrics)
+
+    # Check-ins are also decided by the hub, when the stations of this event share one
+    if hub_url:
+        hub_client = HubClient(hub_url, eventName, station_name, on_late_duplicate=report_late_duplicate, metrics=metrics)
+        metrics.gauge("hub_outbox", hub_client.pending)
+    trace_path = os.path.join(folder_path, f"{eventName}_trace.jsonl") if trace_taps else None
+    metrics.start(os.path.join(folder_path, f"{eventName}_metrics.prom"), METRICS_INTERVAL, trace_path)
+
+# The Flask app is the check-in hub shared by the stations, see checkin_hub.py and start_hub_client
 
 # The line creates a path that points to a file named attendance.csv in the Documents folder of the user's home directory.
 # os.path.expanduser('~'):
@@ -109,71 +197,87 @@ def globalVar():
     global stated
     stated = None
 
-    global existing_entries
-    existing_entries = []
-
-    global signIn_statedAlready
-    signIn_statedAlready = False
-
     global readerStatusStated
     readerStatusStated = None
 
-    global studentData
-    studentData = ""
-
-    global previous_status
-    previous_status = None
-
     global display_noCin
     display_noCin = True
 
 # Function to get data from registered students excel
 def get_registered_student_from_excel(rowNumber):
-    print(f"Attempting to read from Excel file: {onedrive_path}")
+    print(f"Looking up row {rowNumber} in master list: {onedrive_path}")
     try:
-        workbook = openpyxl.load_workbook(onedrive_path)
-        sheet = workbook.active
-        max_row = sheet.max_row
-        print(f"Successfully opened workbook. Sheet has {sheet.max_row} rows.")
-
         rowNumber = int(rowNumber)
-        if rowNumber < 2 or rowNumber > max_row:  # Check if row is in valid range
+        roster.refresh()                    # Lookups don't reload, a tag is never written from rows older than the file
+        entry = roster.get_row(rowNumber)
+        if rowNumber < 2 or entry is None:  # Check if row is in valid range
             raise ValueError("Row number out of range")
-        firstName = sheet.cell(row=rowNumber, column=1).value
-        lastName = sheet.cell(row=rowNumber, column=2).value
-        cin = sheet.cell(row=rowNumber, column=3).value
-        major = sheet.cell(row=rowNumber, column=4).value
+        _, firstName, lastName, cin, major = entry
         if not all([firstName, lastName, cin, major]):  # Check if any field is empty
             raise ValueError("Incomplete data in row")
         
         return cin, firstName, lastName, major
     
     except ValueError as e:
-        messagebox.showerror("Error", "{e}")
+        app.show_error("Error", f"{e}")
         print(f"Error: {e}")
         return None, None, None, None
 
     except FileNotFoundError:
-            messagebox.showerror("Error", "File not found. Retrying in 5 seconds...")
+            app.show_error("Error", "File not found. Retrying in 5 seconds...")
             print(f"File not found. Retrying in 5 seconds...")
             time.sleep(5)
 
     except Exception as e:  # Handle any other exceptions
-        messagebox.showerror("Error", "File not found. Retrying in 5 seconds...")
+        app.show_error("Error", "File not found. Retrying in 5 seconds...")
         print(f"Error reading card: {e}")
 
+# Function to write a student onto the tag in the field and read it back
+# Returns (uid, reason): reason is None when the tag was written and verified, else why it wasn't
+# uid and data_bytes can be passed in when the caller already has them
+def write_tag(session, connection, cin, firstName, lastName, major, data_bytes=None, uid=None):
+    cin = normalize_cin(cin)
+    try:
+        # Build the compact tag record (read_nfc still understands the old CinNumber...End tags)
+        if data_bytes is None:
+            data_bytes = encode_payload(cin, firstName, lastName, major)
+    except ValueError as e:
+        return None, f"Cannot write tag: {e}"
+
+    try:
+        # One lock hold for UID, writes and read-back, so no tap on this reader gets in between
+        with session.lock, metrics.timer("provision"):
+            apdu_count = 0
+            if uid is None:
+                uid = read_uid(connection)
+                apdu_count += 1
+            if uid is None:
+                return None, "Could not read the tag UID"        # Without it the tag can't be registered
+            ok, written, page = write_pages(connection, data_bytes)
+            apdu_count += written
+            if not ok:
+                return uid, f"Write failed at block {page}"
+            matches, tag = verify_pages(connection, data_bytes)
+            apdu_count += tag.apdu_count
+    except Exception as e:
+        return None, f"Error writing tag: {e}"
+    metrics.count("apdus_total", apdu_count)
+    if not matches:
+        return uid, "Read-back did not match what was written"
+
+    tag_registry.register(uid, cin, firstName, lastName, major)  # The next tap of this tag needs only its UID
+    return uid, None
+
 # Function to write NFC tag
 def write_nfc(firstName, lastName, cin, major):
-    global readerStatusStated
-    
-    connection = connectReader()
+    session = connectReader()
 
-    if not connection:
+    if not session:
         print("Failed to connect to reader")
         return False
 
     try:
-        connection.connect()
+        connection = session.ensure_connected()  # Uses the card already in the field, no new connection
     except Exception as e:
         app.display_message(f"Failed to connect to card: {e}")
         print(f"Failed to connect to card: {e}")
@@ -182,75 +286,57 @@ def write_nfc(firstName, lastName, cin, major):
     # Allows the user to see that theyre assigned the NFC Tag
     app.display_message(f"Writing data for {firstName} {lastName}...")
 
-    # Format the data to match the expected read format
-    data = f"CinNumber{cin}FirstName{firstName}LastName{lastName}Major{major}End"
-    # print(f"Data to write: {data}")
-    start_block = 4
-    max_length = 121
-
-    if len(data) > max_length:
-        print(f"Data too long ({len(data)} bytes). Maximum is {max_length} bytes.")
+    uid, reason = write_tag(session, connection, cin, firstName, lastName, major)
+    if reason is not None:
+        app.show_error("Error", reason)
+        print(reason)
         return False
 
-    # Convert string to bytes
-    data_bytes = data.encode('ascii')
-    
-    # Write data in 4-byte blocks
-    for i in range(0, len(data_bytes), 4):
-        block = start_block + (i // 4)
-        chunk = data_bytes[i:i+4].ljust(4, b'\x00')  # Pad with null bytes if needed
-
-        write_command = [0xFF, 0xD6, 0x00, block, 0x04] + list(chunk)
-        # print(f"Writing to block {block}: {write_command}")
-
-        try:
-            response = connection.transmit(write_command)
-            if response[1] != 0x90 or response[2] != 0x00:
-                print(f"Write failed for block {block}. Response: {response}")
-                return False
-        except Exception as e:
-            app.show_error("Error", f"Error writing to block {block}: {e}")
-            print(f"Error writing to block {block}: {e}")
-            return False
-
     print("Write operation completed successfully")
     app.display_message("Write operation completed successfully")
 
     return True
 
 # Function to establish connection
+# Every reader keeps its own session, so this no longer re-enumerates readers on every call.
+# Returns the session of the reader that has a tag in its field (the first reader if none does).
 def connectReader():
     global readerStatusStated
 
-    r = readers()  # Get a list of available NFC readers
-    if len(r) < 1:  # Check if any readers are available
+    sessions = reader_pool.all_sessions() if reader_pool is not None else []
+    if len(sessions) < 1:  # Check if any readers are available
         print("No reader found")
         app.display_message("No Reader bruh")
         readerStatusStated = None
         return None
 
-    reader = r[0]  # Select the first available reader
-    if readerStatusStated == None:
-        print(f"Using reader: {reader}")
-        app.display_message(f"Using reader: {reader}")
-        readerStatusStated = True
+    for session in sessions:
+        if session.card_present:
+            return session
+    return sessions[0]
 
-    try:
-        connection = reader.createConnection()  # Create a connection to the reader
-    except Exception as e:
-        app.display_message(f"Unexpected error: {str(e)}")
-    
-    return connection
+# Called by the reader pool when a reader is plugged in (also for readers attached at startup)
+def on_reader_added(session):
+    global readerStatusStated
+    print(f"Using reader: {session.reader_name}")
+    app.display_message(f"Using reader: {session.reader_name}")
+    readerStatusStated = True
+    pipeline.add_source(session.reader_name, lambda: acquire_tag(session))
+
+# Called by the reader pool when a reader is unplugged
+def on_reader_removed(session):
+    app.display_message(f"Reader removed: {session.reader_name}")
+    pipeline.remove_source(session.reader_name)
+    if not reader_pool.all_sessions():
+        connectReader()  # Reports that there is no reader left
 
 def process_row_input(row_number):
     try:
         cin, firstName, lastName, major = get_registered_student_from_excel(row_number)
+        if cin is None:
+            return
         print(f"Writing data for {firstName} {lastName}...")
 
-        connection = connectReader()
-        if not connection:
-            print("Failed to connect to reader")
-            return
         if write_nfc(firstName, lastName, cin, major):
             print("Data written successfully. Please tap the NFC tag again to log attendance.")
         else:
@@ -258,166 +344,310 @@ def process_row_input(row_number):
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
 
+# Function to start bulk writing tags for rows (e.g. "2-150, 300-320"), optionally only the students matching query
+# Returns the batch, or None if there is nothing to write
+def start_provisioning(rows_text, query=None):
+    global provisioning
+    try:
+        ranges = parse_row_ranges(rows_text)
+    except ValueError as e:
+        app.show_error("Error", f"{e}")
+        print(f"Error: {e}")
+        return None
+    batch = ProvisioningBatch.from_roster(roster, ranges, query, enrolled_cins=tag_registry.enrolled_cins())
+    enrolled = sum(1 for skip in batch.skipped if skip[2] == "Already enrolled")
+    message = f"Bulk writing {len(batch.pending)} tags ({enrolled} students already enrolled, " \
+              f"{len(batch.skipped) - enrolled} rows skipped). Present the tags one after another."
+    print(message)
+    app.display_message(message)
+    if not batch.pending:
+        report_provisioning(batch)
+        return None
+    provisioning = batch
+    return batch
+
+# Function to stop bulk writing; tags presented afterwards are checked in again
+def stop_provisioning():
+    global provisioning
+    batch, provisioning = provisioning, None
+    if batch is not None:
+        batch.stop()
+        report_provisioning(batch)
+
+def report_provisioning(batch):
+    for line in batch.report():
+        print(line)
+        app.display_message(line)
+
+# Function to write the next student of the bulk batch onto a tag that was just presented
+def provision_tag(session, connection):
+    global provisioning
+    batch = provisioning
+    try:
+        with session.lock:
+            uid = read_uid(connection)
+        claimed = batch.claim(uid)
+    except ValueError as e:
+        app.display_message(f"{e}")
+        print(f"{e}")
+        return
+    except reader_pool.NO_CARD_ERRORS:
+        return
+    if claimed is None:
+        return
+    entry, data_bytes = claimed
+    row, firstName, lastName, cin, major = entry
+    try:
+        roster.refresh()
+        current = roster.find_cin(cin)
+    except Exception as e:              # The workbook is being replaced; the batch's own entry is written, the claim is always finished
+        print(f"Error reloading master list, writing row {row} as loaded: {e}")
+        current = None
+    if current is not None and current[1:] != entry[1:]:
+        # The master list changed since the batch started, the tag gets the student's details as they are now
+        row, firstName, lastName, cin, major = current
+        data_bytes = None
+
+    uid, reason = write_tag(session, connection, cin, firstName, lastName, major, data_bytes, uid)
+    batch.finish(entry, uid, reason)
+    metrics.count("provisioned_tags_total", result="written" if reason is None else "failed")
+    if reason is None:
+        message = f"Row {row}: tag written for {firstName} {lastName} ({batch.progress()})"
+    else:
+        message = f"Row {row}: {reason}, present another tag for {firstName} {lastName} ({batch.progress()})"
+    print(message)
+    app.display_message(message)
+
+    if batch.done() and provisioning is batch:
+        provisioning = None
+        report_provisioning(batch)
+        app.provisioning_finished()
+
 # Function to read NFC tag
-def read_nfc():
-    global stated, readerStatusStated, existing_entries, signIn_statedAlready, display_noCin
-    
-    connection = connectReader()
+# connection is the session's connection to the card that just entered the field
+# Only does the reader I/O; returns the raw TagRead, or None if the tag could not be read
+def read_nfc(session, connection):
+    global stated, display_noCin
 
     # Prevents from repeatedly saying that the card is not detected
     if stated != False and stated != True: 
         stated = False
 
     try:
-        connection.connect()  # Connect to the NFC card
-
-        # First, try to get the UI
-        # Applying this APDU command to this 'variable'
-        get_uid = [0xFF, 0xCA, 0x00, 0x00, 0x00] 
-        
-        # Basically, transmits the APDU command above onto the reader.
-        # The result we get is FIXED, documentation pg 11
-        # We retrieve the data, sw1 and sw2. IN THAT ORDER. That's how it assigns perfectly.
-        data, sw1, sw2 = connection.transmit(get_uid)
-        
-        # # If the data in sw1 is 90, then operation sucess.
-        # if sw1 == 0x90:
-        #     uid = toHexString(data).replace(" ", "")
-        #     print(f"UID: {uid}")
-        # else:
-        #     print(f"Error getting UID: {hex(sw1)}, {hex(sw2)}")
+        # First, try to get the UID (FF CA, documentation pg 11)
+        with session.lock:
+            uid = read_uid(connection)
+
+        # A registered tag is resolved from its UID alone, except for the periodic payload check
+        student, verify = tag_registry.resolve(uid) if uid is not None else (None, True)
+        if not verify:
+            tag = TagRead()
+            tag.uid, tag.student = uid, student
+            return tag
          
         #GetData
-        #Read in sections of 4 bytes starting from block 4
-        result = ""
-        for block in range(4, 50):  # Read blocks 4 to 49
-            read_data = [0xFF, 0xB0, 0x00, block, 0x04]  # Read 4 bytes from each block
-            data, sw1, sw2 = connection.transmit(read_data)
-            # print(f"Block: {block} Data: {data}")
-            if sw1 == 0x90:
-                # Convert data to ASCII, ignore non-printable characters
-                ascii_data = ''.join([chr(b) for b in data if 32 <= b <= 126])
-                # print (f"Block: {block} = {ascii_data}") # This prints what each block byte holds (16bytes each block)
-                result += ascii_data # stores entire data into a string
-            else:
-                # print(f"Error reading block {block}: {hex(sw1)}, {hex(sw2)}")
-                return None, None, None, None, None
-        # print(f"Raw Data: {result}")
-        
-        if sw1 == 0x90:
-            # Find the start of the CinNumber data
-            cin_start = result.find("CinNumber")
-            if cin_start != -1:
-                # Extract only the numeric part after "CinNumber"
-                cin_number = ''.join(filter(str.isdigit, result[cin_start+9:]))
-                if stated == True:
-                    stated = False
-            else:
-                if display_noCin:
-                    app.display_message("NFC does not have a CIN# recorded in the data. \nPlease input a row number to assign data.")
-                    print("NFC does not have a CIN# recorded in the data")
-                    display_noCin = False
-                return ("EMPTY", None, None, None, None)
-
-            firstName_start = result.find("FirstName")
-            lastName_start = result.find("LastName")
-            major_start = result.find("Major")
-            end = result.find("End")
-
-            fN_length = lastName_start - (firstName_start+9)
-            lN_length = major_start - (lastName_start+8)
-            maj_length = end - (major_start+5)
-
-            if firstName_start != -1:
-                # Extract only the numeric part after "FirstName"
-                firstName = result[firstName_start+9:firstName_start+9+fN_length]
+        #Read several pages per APDU starting from block 4, stopping at the end of the payload
+        with session.lock:
+            tag = read_payload(connection, is_complete=payload_complete)
+        tag.uid, tag.student = uid, student
+        print(f"Tag read took {tag.apdu_count} APDUs")
+        if not tag.ok and student is None:
+            # print(f"Error reading block: {hex(tag.sw1)}, {hex(tag.sw2)}")
+            return None
+        if stated == True:
+            stated = False
+        return tag
                 
-                if stated == True:
-                    stated = False
-            else:
-                print("FirstName not found in data")
-
-            if lastName_start != -1:
-                # Extract only the numeric part after "CinNumber"
-                lastName = result[lastName_start+8:lastName_start+8+lN_length]
-
-                if stated == True:
-                    stated = False
-            else:
-                print("LastName not found in data")
-
-            major_start = result.find("Major")
-            if major_start != -1:
-                # Extract only the numeric part after "CinNumber"
-                major = result[major_start+5:major_start+5+maj_length]
-                
-                if stated == True:
-                    stated = False
-            else:
-                print("Major not found in data")     
-        else:
-            print(f"Error reading data: {hex(sw1)}, {hex(sw2)}")
-
-        if is_cin_recorded(cin_number):
-            if not signIn_statedAlready: 
-                print(f"{firstName} {lastName} has already signed in. \n")
-                app.display_message(f"\n{firstName} {lastName} has already signed in. \n")
-                signIn_statedAlready = True
-        else:
-            signIn_statedAlready = False
-
-            # print(f"\nCIN#: {cin_number}")
-            # print(f"First Name: {firstName}")
-            # print(f"Last Name: {lastName}")                
-            # print(f"Major: {major}")    
-
-        if cin_number and firstName and lastName and major:
-            signIn_statedAlready = True
-            return ("SUCCESS", cin_number, firstName, lastName, major)
-                
-    except NoCardException:  # Handle the case when no card is detected
+    except reader_pool.NO_CARD_ERRORS:  # Handle the case when no card is detected
         if stated == False:
             app.display_message("No card detected. \nPlease place a card on the reader.")
             print("No card detected. Please place a card on the reader.")
             stated = True
             display_noCin = True
-        return ("NO_CARD", None, None, None, None)
+        return None
         
     except Exception as e:  # Handle any other exceptions
         # print(f"Error reading card: {e}")
         app.display_message("Card has been removed.")
         print("Card has been removed.")
-        
-        if signIn_statedAlready:
-                signIn_statedAlready = False
-        return ("ERROR", None, None, None, None)
-    
+        return None
+
+# Pipeline stage: wait for the next tap on one reader and read it (blocking PC/SC calls, runs on that reader's thread)
+# Returns (reader name, TagRead) or None
+def acquire_tag(session):
+    global display_noCin
+
+    # Blocks until the card monitor reports a tag entering or leaving the field
+    event, connection = session.next_event(timeout=1.0)
+
+    if event == NO_READER:
+        return None
+    if event == REMOVED:
+        # A new tap starts fresh; a tag left on the reader is not read again
+        display_noCin = True
+        app.display_message("Waiting for a tag...")
+        print("Waiting for a tag...", end='\r', flush=True)
+        return None
+    if event != INSERTED:
+        return None
+    if provisioning is not None:
+        provision_tag(session, connection)  # Tags presented during bulk writing are written, not checked in
+        return None
+    # The tap is timed from the moment connecting to the tag started
+    trace = metrics.start_tap(session.reader_name, time.perf_counter() - session.connect_seconds)
+    metrics.observe("connect", session.connect_seconds, trace)
+    with metrics.timer("read", trace):
+        tag = read_nfc(session, connection)
+    if tag is None:
+        metrics.finish_tap(trace, "failed")
+        return None
+    trace["apdus"] = tag.apdu_count + 1             # Plus the UID APDU
+    trace["resolved_by"] = "payload" if tag.apdu_count else "uid"
+    metrics.count("apdus_total", trace["apdus"])
+    tag.trace = trace
+    return session.reader_name, tag
+
+# Pipeline stage: decode the tag payload into the Student who tapped (student_record.py)
+def parse_tag(raw):
+    global display_noCin
+    reader_name, tag = raw
+    trace = getattr(tag, "trace", None)
+
+    # Decodes both the compact record and the legacy CinNumber...End string
+    with metrics.timer("parse", trace):
+        fields = decode_payload(tag.data) if tag.ok and tag.data else None
+        student = Student(*fields) if fields is not None else None
+    if student is not None and all(student):
+        if tag.uid is not None and tag_registry.register(tag.uid, *student):
+            print(f"Registered tag {tag.uid} for CIN {student.cin}")
+    elif tag.student is not None:
+        if tag.data or not tag.ok:
+            # Payload checked and found blank or damaged, the registry still knows whose tag it is
+            print(f"Tag {tag.uid} of CIN {tag.student.cin} could not be read, checked in by UID. Re-enroll it when convenient.")
+            metrics.count("unreadable_registered_tags_total")
+        student = tag.student
+    if student is None or not all(student):
+        metrics.finish_tap(trace, "empty")
+        if display_noCin:
+            app.display_message("NFC does not have a CIN# recorded in the data. \nPlease input a row number to assign data.")
+            print("NFC does not have a CIN# recorded in the data")
+            display_noCin = False
+        app.notify_empty_tag()
+        return None
+
+    # print(f"\nCIN#: {cin_number}")
+    # print(f"First Name: {firstName}")
+    # print(f"Last Name: {lastName}")                
+    # print(f"Major: {major}")    
+    if trace is not None:
+        metrics.bind(student.cin, trace)
+    return student.tapped_at(reader_name)
+
+# Pipeline stage: returns True if the student still has to be logged
+def check_not_signed_in(student):
+    trace = metrics.pending_trace_for(student.cin)
+    with metrics.timer("dedup", trace):
+        recorded = is_cin_recorded(student.cin)
+    if recorded:
+        report_duplicate(student, trace)
+        return False
+    metrics.accept(trace)
+    return True
+
+# Called by the pipeline for a second tap of a student whose first tap is still being logged
+def report_in_flight_duplicate(student):
+    report_duplicate(student, metrics.pending_trace_for(student.cin))
+
+def report_duplicate(student, trace):
+    metrics.finish_tap(trace, "duplicate")
+    print(f"{student.name()} has already signed in. \n")
+    app.display_message(f"\n{student.name()} has already signed in. \n")
+
+# Pipeline stage after check_not_signed_in: ask the hub, which knows the other stations' check-ins
+# Blocks on the network, so the pipeline runs it on its own thread; while the hub is down the tap is accepted here and queued
+def check_hub(student):
+    if hub_client is None:
+        return True
+    record = AttendanceRecord.for_student(student, "", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    if hub_client.check_in(record) == DUPLICATE:
+        metrics.finish_tap(metrics.trace_for(student.cin), "duplicate")
+        print(f"{student.name()} has already signed in at another station. \n")
+        app.display_message(f"\n{student.name()} has already signed in at another station. \n")
+        return False
+    return True
+
+# Function to start sending check-ins to the hub; rows recorded before (or while it was down) are sent first
+def start_hub_client():
+    if hub_client is None:
+        return
+    hub_client.queue_rows([AttendanceRecord.from_row(row) for row in attendance_store.rows(event_key)])
+    hub_client.start()
+    print(f"Sending check-ins to the hub at {hub_url} as station {station_name}")
+
+# Called by the hub client for taps accepted while the hub was down that another station had already taken
+def report_late_duplicate(cin, station):
+    print(f"CIN {cin} also signed in at station {station} while the hub was unreachable")
+    app.display_message(f"CIN {cin} also signed in at station {station} while the hub was unreachable")
+    metrics.count("hub_late_duplicates_total")
+
+# Pipeline stage: record the tap right away; the transfer information is asked for afterwards (runs on the writer thread)
+def record_attendance(student):
+    with metrics.timer("persist", metrics.trace_for(student.cin)):
+        record = log_attendance(student, None)
+    if record.transferred_from == WAITING_TEXT:
+        app.ask_transfer_info(student.cin, student.name())      # Queued, the next tap doesn't wait for the answer
+    return record
+
+# Pipeline stage: show the logged record (in the Attendance tab with the next GUI frame)
+def show_attendance(record):
+    trace = metrics.trace_for(record.cin)
+    with metrics.timer("notify", trace):
+        app.show_attendance(record)
+    metrics.finish_tap(trace, "logged")
+
 # Function to log attendance
-def log_attendance(student_cin, student_firstName, student_lastName, student_major, transferred_from=""):
+# student.reader is the reader that took the tap; all readers share the attendance store and this one writer
+# transferred_from=None records the tap now and leaves the record waiting for complete_transfer_info
+# Returns the AttendanceRecord shown in the Attendance tab
+def log_attendance(student, transferred_from=""):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # Get current timestamp
-    global existing_entries
+
+    # Check and add in one step so two readers can't both log the same CIN
+    is_new = attendance_store.claim(event_key, student.cin)
 
     # If CIN doesn't exist, add new entry
-    if not is_cin_recorded(student_cin):
-        # Log new attendance        
-        existing_entries.append(student_cin) # Add student CIN into global array
-        with open(csv_path, 'a', newline='') as file:  # Open the CSV file in append mode
-            writer = csv.writer(file)  # Create a CSV writer object
-            writer.writerow([student_cin, student_firstName, student_lastName, student_major, transferred_from, timestamp])  # Write the attendance record
-        app.display_message(f"\nLogged attendance for {student_firstName} {student_lastName} at {timestamp}\n")
-        print(f"Logged attendance for {student_firstName} {student_lastName} at {timestamp}\n")
+    if is_new:
+        record = AttendanceRecord.for_student(student, transferred_from or "", timestamp)
+        if transferred_from is None:
+            # In the database now, in the CSV once the transfer information is in
+            attendance_store.add_rows(event_key, [record])
+            transfer_followups.add(record)
+            record = AttendanceRecord.for_student(student, WAITING_TEXT, timestamp)
+        else:
+            # Log new attendance, the writer commits it to the CSV with the next group
+            attendance_writer.append(record)
+        app.display_message(f"\nLogged attendance for {student.name()} at {timestamp}\n")
+        print(f"Logged attendance for {student.name()} at {timestamp}\n")
     else:
-        app.display_message(f"CIN {student_cin} already recorded.")
-        print(f"CIN {student_cin} already recorded.") 
-        for entry in existing_entries:
-            print(entry)
-    return student_cin, student_firstName, student_lastName, student_major, transferred_from, timestamp  # Return the logged data
+        record = AttendanceRecord.for_student(student, transferred_from or "", timestamp)
+        app.display_message(f"CIN {student.cin} already recorded.")
+        print(f"CIN {student.cin} already recorded.") 
+    return record  # Return the logged data
+
+# Function to fill in the transfer information of a waiting record and send it to the CSV
+# Returns the completed record, or None if the CIN wasn't waiting
+def complete_transfer_info(cin, transferred_from):
+    record = transfer_followups.complete(cin, transferred_from)
+    if record is None:
+        return None
+    attendance_store.set_transferred_from(event_key, cin, transferred_from)
+    attendance_writer.append(record)
+    return record
 
 def is_cin_recorded(cin):
-    return cin in existing_entries
+    return attendance_store.is_recorded(event_key, cin)
 
 def initialize_csv(root):
-    global studentData
     
     # Ensure the directory exists
     directory = os.path.dirname(csv_path)   # Checks if the correct path exists
@@ -427,64 +657,124 @@ def initialize_csv(root):
             os.makedirs(directory)
             print(f"Created directory: {directory}")
     except OSError as e:
-        messagebox.showerror("Error", "Error creating a directory")
+        app.show_error("Error", "Error creating a directory")
         print("Error creating a directory/n")
     
     # Check if the CSV file already exists
     if not os.path.exists(csv_path):                        
         with open(csv_path, 'w', newline='') as file:       # If not, create a new CSV file
             writer = csv.writer(file)                       # Create a CSV writer object
-            writer.writerow(["Student CIN", "First Name", "Last Name", "Major", "Transferred from?", "Timestamp"])    # Write the header row
+            writer.writerow(CSV_HEADER)                     # Write the header row
+        attendance_checkpoint.reset()
         print("Created new attendance CSV file.")
     else:
         print("Attendance CSV file already exists.")
-        #Already recorded entries of the excel file is added into global array
-        with open(csv_path, 'r', newline='') as file:
-            reader = csv.reader(file)
-            next(reader)  # Skip header
-            for row in reader:
-                existing_entries.append(row[0])
-                # Handle both old format (5 columns) and new format (6 columns)
-                if len(row) >= 6:
-                    studentData = f"{row[0]},{row[1]},{row[2]},{row[3]},{row[4]},{row[5]}"
-                else:
-                    # Old format, add empty transferred_from field
-                    studentData = f"{row[0]},{row[1]},{row[2]},{row[3]},,{row[4]}"
-                root.event_generate(CUSTOM_EVENT, when='now')
+        # Finish a group commit that was cut short by a crash
+        replayed = attendance_writer.replay()
+        if replayed:
+            app.display_message(f"Recovered {replayed} attendance rows from the journal.")
+            print(f"Recovered {replayed} attendance rows from the journal.")
+        resumed_size = os.path.getsize(csv_path)   # The CSV as it was before this run, journal included
+        # Already recorded entries are loaded in bulk: from the checkpoint plus the rows appended after it
+        signed_in = attendance_checkpoint.resume()
+        attendance_store.claim_many(event_key, signed_in)
+        # CSVs logged before the database existed are imported once
+        if attendance_store.count(event_key) < len(signed_in):
+            print(f"Imported {attendance_store.import_csv(event_key, csv_path)} rows into the attendance database.")
+        print(f"Resumed {len(signed_in)} signed-in students ({attendance_checkpoint.tail_rows} rows read after the checkpoint).")
+        # Rows that were still waiting for transfer information when the program stopped never reached the CSV
+        unwritten = [list(row) for row in attendance_store.rows(event_key) if row[0] not in signed_in]
+        for row in unwritten:
+            attendance_writer.append(row)
+        if unwritten:
+            print(f"Writing {len(unwritten)} attendance rows that were waiting for transfer information.")
+        # The Attendance tab is filled a chunk at a time once the window is up, then the rows written just now
+        if root is not None:
+            root.after(0, fill_attendance_tab, root, resumed_size, [AttendanceRecord.from_row(row) for row in unwritten])
+
+# Function to read the lines of a CSV up to byte end; the CSV is written in the locale's encoding
+def _csv_lines(binary, end):
+    encoding = locale.getpreferredencoding(False)
+    while binary.tell() < end:
+        line = binary.readline()
+        if not line:
+            return
+        yield line.decode(encoding, errors="replace")
+
+# Function to show the first end bytes of the attendance CSV, RESUME_CHUNK_ROWS per Tk callback, then the tail records
+# Taps logged meanwhile are already in the tab, so resumed rows go in ahead of them and the tab keeps the CSV order
+def fill_attendance_tab(root, end, tail, reader=None, file=None, filled=0):
+    if reader is None:
+        file = open(csv_path, 'rb')
+        reader = csv.reader(_csv_lines(file, end))
+        next(reader, None)  # Skip header
+    chunk = []
+    try:
+        for _ in range(RESUME_CHUNK_ROWS):
+            row = next(reader)
+            if len(row) >= 5:
+                chunk.append(AttendanceRecord.from_row(normalize_row(row)))  # Handles the 5-, 6- and 7-column layouts
+    except StopIteration:
+        app.attendance_table.insert(filled, chunk + tail)
+        file.close()
+        return
+    except Exception as e:
+        file.close()
+        print(f"Error loading attendance rows: {e}")
+        return
+    app.attendance_table.insert(filled, chunk)
+    root.after(1, fill_attendance_tab, root, end, tail, reader, file, filled + len(chunk))   # Let the window redraw between chunks
 
+# Reads the master list on a background thread, so a large workbook doesn't hold up the window
 def load_excel_data(gui):
+    threading.Thread(target=_load_excel_data, args=(gui,), name="roster-load", daemon=True).start()
+
+# Function to start watching the master list for changes (WATCH_INTERVAL = 0 leaves it to tag writes and the Refresh button)
+def start_roster_watch():
+    if WATCH_INTERVAL > 0:
+        roster_watcher.start()
+
+# Called with the RosterDiff after every reload of the master list, on the thread that reloaded it
+def roster_changed(diff):
+    if not diff.initial and (diff or diff.moved):
+        app.display_message(f"Master list updated: {diff.summary()}")
+    app.show_roster_changes(diff)
+
+# Called on the index thread once a reload is searchable
+def roster_indexed():
+    app.show_search_index_update()
+
+def _load_excel_data(gui):
     try:
-        workbook = openpyxl.load_workbook(onedrive_path)
-        sheet = workbook.active
-        for row in range(2, sheet.max_row + 1):
-            firstName = sheet.cell(row=row, column=1).value
-            lastName = sheet.cell(row=row, column=2).value
-            cin = sheet.cell(row=row, column=3).value
-            major = sheet.cell(row=row, column=4).value
-            gui.excel_tree.insert('', 'end', values=(row, firstName, lastName, cin, major))
+        # The table shows the roster's own list of (row, firstName, lastName, cin, major), nothing is copied
+        rows = roster.all_rows()
+        gui.ui.post_call(gui.excel_table.set_rows, rows)
     except Exception as e:
         app.show_error("Error", f"Error loading Excel data: {e}")
         print(f"Error loading Excel data: {e}")
 
 class AttendanceGUI:
+    # Safe to call from any thread, the dialog is opened by the Tk thread
     def show_error(self, title, message):
-        self.master.after(0, lambda: messagebox.showerror(title, message))
+        self.ui.post_call(messagebox.showerror, title, message)
 
     def create_excel_treeview(self):
-        self.excel_tree = ttk.Treeview(self.excel_frame, columns=('Row', 'First Name', 'Last Name', 'CIN', 'Major'), show='headings')
-        for col in ['Row', 'First Name', 'Last Name', 'CIN', 'Major']:
-            self.excel_tree.heading(col, text=col)
-        self.excel_tree.pack(fill=tk.BOTH, expand=1)
+        self.excel_table = VirtualTable(self.excel_frame, columns=('Row', 'First Name', 'Last Name', 'CIN', 'Major'))
+        self.excel_table.follow = False  # The roster opens at the top
+        self.excel_table.pack(fill=tk.BOTH, expand=1)
 
     def create_search_functionality(self):
         self.search_frame = ttk.Frame(self.excel_frame)
         self.search_frame.pack(fill=tk.X, padx=10, pady=10)
-        self.search_label = ttk.Label(self.search_frame, text="Search CIN:")
+        self.search_label = ttk.Label(self.search_frame, text="Search:")
         self.search_label.pack(side=tk.LEFT)
         self.search_entry = ttk.Entry(self.search_frame)
         self.search_entry.pack(side=tk.LEFT, padx=5)
+        self.search_entry.bind('<KeyRelease>', self.search_as_you_type)  # CIN, name or major, filtered on every key
         self.search_button = ttk.Button(self.search_frame, text="Search", command=self.search_cin)
         self.search_button.pack(side=tk.LEFT)
+        self.search_status = ttk.Label(self.search_frame, text="")
+        self.search_status.pack(side=tk.LEFT, padx=5)
     
     def __init__(self, master):
         self.master = master
@@ -498,14 +788,16 @@ class AttendanceGUI:
         self.attendance_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.attendance_frame, text='Attendance')
 
-        self.tree = ttk.Treeview(self.attendance_frame, columns=('Student CIN', 'First Name', 'Last Name', 'Major', 'Transferred from?', 'Timestamp'), show='headings')
-        self.tree.heading('Student CIN', text='Student CIN#')
-        self.tree.heading('First Name', text='First Name')
-        self.tree.heading('Last Name', text='Last Name')
-        self.tree.heading('Major', text='Major')
-        self.tree.heading('Transferred from?', text='Transferred from?')
-        self.tree.heading('Timestamp', text='Timestamp')
-        self.tree.pack(fill=tk.BOTH, expand=1)
+        # Students whose transfer information hasn't been entered yet
+        self.transfer_status = ttk.Label(self.attendance_frame, text="")
+        self.transfer_status.pack(fill=tk.X, padx=10)
+        self.transfer_prompts = []      # (cin, name) waiting for the transfer dialog, oldest first
+        self.transfer_dialog_open = False
+
+        self.attendance_table = VirtualTable(self.attendance_frame,
+            columns=('Student CIN', 'First Name', 'Last Name', 'Major', 'Transferred from?', 'Timestamp', 'Reader'),
+            headings=('Student CIN#', 'First Name', 'Last Name', 'Major', 'Transferred from?', 'Timestamp', 'Reader'))
+        self.attendance_table.pack(fill=tk.BOTH, expand=1)
 
         # Excel Data Tab
         self.excel_frame = ttk.Frame(self.notebook)
@@ -531,48 +823,114 @@ class AttendanceGUI:
         self.submit_button = ttk.Button(self.input_frame, text="Submit", command=self.submit_row)
         self.submit_button.pack(side=tk.LEFT)
 
-        self.master.bind(CUSTOM_EVENT, self.handle_attendance_logged)
+        # Writes tags for a range of rows, one tag after another
+        self.bulk_button = ttk.Button(self.input_frame, text="Bulk Write...", command=self.bulk_write)
+        self.bulk_button.pack(side=tk.LEFT, padx=5)
 
         # Add a text widget for messages
         self.message_text = tk.Text(master, height=10, width=50)
         self.message_text.pack(pady=10)
 
+        # Messages, new attendance rows and dialogs from other threads reach the widgets through this queue
+        self.ui = UIQueue(master, self.message_text, metrics=metrics)
+
+        # Live numbers: taps per minute, tap latency and how much is queued up
+        self.metrics_label = ttk.Label(master, text="", justify=tk.LEFT)
+        self.metrics_label.pack(fill=tk.X, padx=10)
+        self.update_metrics_panel()
+
         # tk toolkit, window close event
         self.master.protocol("WM_DELETE_WINDOW",self.close_gui)
 
     # "destroys" the gui
     def close_gui(self):
         self.display_message("\nExiting Program...\n")
+        self.ui.drain()
+        self.ui.stop()
+        self.master.update_idletasks()
         time.sleep(2)
         self.master.destroy()
         raise SystemExit("GUI exited")
 
+    # Safe to call from any thread, the message shows up with the next GUI frame
     def display_message(self, message):
-        self.message_text.insert(tk.END, message + "\n")
-        self.message_text.see(tk.END)  # Scroll to the end
-
-    def handle_attendance_logged(self, event):
+        self.ui.post_message(message)
+
+    def show_attendance(self, record):
+        self.ui.post_row(self.attendance_table, record)
+
+    # Function to refresh the metrics panel, once a second
+    def update_metrics_panel(self):
+        summary = metrics.summary()
+        gauges = summary["gauges"]
+        latency = "-" if summary["p50_ms"] is None else f"p50 {summary['p50_ms']:.0f} ms, p95 {summary['p95_ms']:.0f} ms"
+        stages = "  ".join(f"{stage} {ms:.1f}" for stage, ms in summary["stage_p95_ms"].items())
+        self.metrics_label.config(text=
+            f"Taps/min: {summary['taps_per_minute']:.0f}   Tap latency: {latency}   "
+            f"Backlog: {gauges.get('backlog', 0)}   Waiting for transfer info: {gauges.get('waiting_transfer_info', 0)}\n"
+            f"Stage p95 (ms): {stages or '-'}")
+        self.master.after(1000, self.update_metrics_panel)
+
+    def notify_empty_tag(self):
+        self.ui.post_call(self.master.event_generate, '<<EmptyNFC>>')  # Generate custom event for empty NFC
+
+    # Function to pick up edits to the master list now; the workbook is read off the Tk thread
+    def refresh_excel_data(self):
+        threading.Thread(target=roster_watcher.poll, name="roster-refresh", daemon=True).start()
+
+    # Safe to call from any thread, the Excel Data tab is updated with the next GUI frame
+    def show_roster_changes(self, diff):
+        self.ui.post_call(self._apply_roster_changes, diff)
+
+    # Safe to call from any thread: a filtered Excel Data tab is searched again once the index has the reload
+    def show_search_index_update(self):
+        self.ui.post_call(self._search_again)
+
+    def _search_again(self):
+        if self.search_entry.get().strip():
+            self.search_as_you_type()
+
+    # Function to show the reloaded master list; the table only draws the rows on screen
+    def _apply_roster_changes(self, diff):
+        if self.search_entry.get().strip():
+            return                      # Filtered: searched again by _search_again once the index is updated
+        table = self.excel_table
+        selected = table.rows[table.selected] if table.selected is not None and table.selected < len(table.rows) else None
+        table.set_rows(roster.rows)
+        if selected is not None:
+            entry = roster.by_cin.get(entry_key(selected))
+            if entry is not None:
+                table.select(entry[0] - 2)  # Keep the same student selected, wherever their row went
+        if not diff.initial and (diff or diff.moved):
+            self.search_status.config(text=f"Master list updated: {diff.summary()}")
+
+    # Function to filter the Excel Data tab down to the students matching what is typed so far
+    def search_as_you_type(self, event=None):
+        query = self.search_entry.get()
         try:
-            student_id, student_firstName, student_lastName, student_major, transferred_from, timestamp = studentData.split(',', 5)
-            self.tree.insert('', 'end', values=(student_id, student_firstName, student_lastName, student_major, transferred_from, timestamp))
+            if not query.strip():
+                self.excel_table.set_rows(roster.all_rows())
+                self.search_status.config(text="")
+                return
+            start = time.perf_counter()
+            results = roster.search(query)
+            elapsed = (time.perf_counter() - start) * 1000
+            self.excel_table.top = 0
+            self.excel_table.set_rows(results)
+            more = "+" if len(results) >= 500 else ""
+            self.search_status.config(text=f"{len(results)}{more} matches ({elapsed:.1f} ms)")
         except Exception as e:
-            app.show_error("Error", f"Error handling attendance event: {e}")
-            print(f"Error handling attendance event: {e}")
-
-    def refresh_excel_data(self):
-        self.excel_tree.delete(*self.excel_tree.get_children())
-        load_excel_data(self)
+            print(f"Error searching master list: {e}")
 
     def search_cin(self):
         search_cin = self.search_entry.get()
         if search_cin:
-            for item in self.excel_tree.get_children():
-                values = self.excel_tree.item(item)['values']
-                if str(values[3]) == search_cin:  # CIN is at index 3
-                    self.excel_tree.selection_set(item)
-                    self.excel_tree.focus(item)
-                    self.excel_tree.see(item)
-                    return
+            entry = roster.find_cin(search_cin)
+            if entry is not None:
+                self.excel_table.set_rows(roster.rows)  # Back to the whole roster, in case the list was filtered or reloaded
+                self.search_status.config(text="")
+                self.excel_table.select(entry[0] - 2)   # Roster rows are consecutive from sheet row 2
+                return
             messagebox.showinfo("Search Result", f"No student found with CIN: {search_cin}")
         else:
             messagebox.showwarning("Search Error", "Please enter a CIN to search")
@@ -583,66 +941,199 @@ class AttendanceGUI:
             process_row_input(row_number)
         self.row_entry.delete(0, tk.END)
 
-    def get_transfer_info(self, student_name):
-        """Prompt user for transfer information when a student checks in"""
-        self.transfer_result = None
-        self.student_name_for_transfer = student_name
-        # Schedule the dialog to run on the main thread
-        self.master.after(0, self._show_transfer_dialog)
-        # Wait for result
-        while self.transfer_result is None:
-            time.sleep(0.1)
-        return self.transfer_result
-    
+    # Function to start bulk writing, or stop the batch that is running
+    def bulk_write(self):
+        if provisioning is not None:
+            stop_provisioning()
+            self.bulk_button.config(text="Bulk Write...")
+            return
+        rows_text = simpledialog.askstring("Bulk Write", "Rows to write (e.g. 2-150, 300-320):", parent=self.master)
+        if not rows_text:
+            return
+        query = simpledialog.askstring("Bulk Write", "Only students matching (CIN, name or major; leave empty for all):",
+                                       parent=self.master)
+        if start_provisioning(rows_text, query) is not None:
+            self.bulk_button.config(text="Stop Bulk Write")
+
+    # Safe to call from any thread
+    def provisioning_finished(self):
+        self.ui.post_call(self.bulk_button.config, {"text": "Bulk Write..."})
+
+    def ask_transfer_info(self, cin, student_name):
+        """Queue a transfer information prompt; safe from any thread, returns right away"""
+        self.ui.post_call(self._queue_transfer_prompt, cin, student_name)
+
+    def _queue_transfer_prompt(self, cin, student_name):
+        self.transfer_prompts.append((cin, student_name))
+        self._update_transfer_status()
+        self._show_transfer_dialog()
+
     def _show_transfer_dialog(self):
-        """Show transfer dialog on main thread"""
-        transfer_info = simpledialog.askstring(
-            "Transfer Information", 
-            f"{self.student_name_for_transfer} is checking in.\nWhere did they transfer from? (Leave blank if not applicable):",
-            initialvalue=""
-        )
-        self.transfer_result = transfer_info if transfer_info is not None else ""
-
-def main_loop():
+        """Show transfer dialog on main thread, one student at a time"""
+        if self.transfer_dialog_open or not self.transfer_prompts:
+            return
+        cin, student_name = self.transfer_prompts.pop(0)
+        self.transfer_dialog_open = True
+        try:
+            # Taps keep being recorded while the dialog is open
+            transfer_info = simpledialog.askstring(
+                "Transfer Information", 
+                f"{student_name} is checking in.\nWhere did they transfer from? (Leave blank if not applicable):",
+                initialvalue=""
+            )
+        finally:
+            self.transfer_dialog_open = False
+        row = complete_transfer_info(cin, transfer_info if transfer_info is not None else "")
+        if row is not None:
+            self._show_transfer_info(cin, row.transferred_from)
+        self._update_transfer_status()
+        self.master.after_idle(self._show_transfer_dialog)  # Next student in line
+
+    # Function to replace "Waiting..." with the answer in the Attendance tab
+    def _show_transfer_info(self, cin, transferred_from):
+        rows = self.attendance_table.rows
+        for index in range(len(rows) - 1, -1, -1):      # Waiting rows are near the end
+            if rows[index].cin == cin:
+                rows[index].set_transferred_from(transferred_from)
+                self.attendance_table.set_row(index, rows[index])
+                return
+
+    def _update_transfer_status(self):
+        names = transfer_followups.names()
+        if names:
+            shown = ", ".join(names[:5]) + (f" and {len(names) - 5} more" if len(names) > 5 else "")
+            self.transfer_status.config(text=f"Waiting for transfer info ({len(names)}): {shown}")
+        else:
+            self.transfer_status.config(text="")
+
+# Stands in for AttendanceGUI on headless stations: messages go to the console
+class ConsoleApp:
+    def display_message(self, message):
+        print(message.strip("\n"))
+
+    def show_error(self, title, message):
+        print(f"{title}: {message}")
+
+    # Nobody is at the station to answer, the row is written with the field left empty
+    def ask_transfer_info(self, cin, student_name):
+        complete_transfer_info(cin, "")
+
+    def show_attendance(self, record):
+        pass                            # log_attendance already printed it
+
+    def show_roster_changes(self, diff):
+        pass                            # Roster.refresh already logged the diff
+
+    def show_search_index_update(self):
+        pass
+
+    def notify_empty_tag(self):
+        pass
+
+    # Headless bulk writing (--provision) ends the run once the batch is done
+    def provisioning_finished(self):
+        pipeline.stop()
+
+# Function to start watching for readers; pyscard is first imported here (for the pcsc backend)
+def start_readers():
+    global reader_pool
+    # One session per attached reader, kept open for the whole event
+    reader_pool = create_reader_pool(reader_backend, on_reader_added, on_reader_removed, **reader_options)
+    reader_pool.start()  # Starts a pipeline source for every reader attached now or later
+
+def main_loop(mode):
     app.display_message("Reached main loop")
-    global studentData, previous_status
     try:
-        while True:
-            status, cin, firstName, lastName, major = read_nfc()
-            display = False
-
-            if status != previous_status:
-                if status == "NO_CARD":
-                    app.display_message("Waiting for a tag...")
-                    print("Waiting for a tag...", end='\r', flush=True)
-                previous_status = status
-
-            if status == "EMPTY":
-                root.event_generate('<<EmptyNFC>>')  # Generate custom event for empty NFC
-                app.master.after(0, lambda: root.event_generate('<<EmptyNFC>>'))
-            elif status == "SUCCESS":
-                if not is_cin_recorded(cin):
-                    display = True
-                    # Get transfer information from user
-                    transferred_from = app.get_transfer_info(f"{firstName} {lastName}")
-                    student_id, student_firstName, student_lastName, student_major, transferred_from_info, timestamp = log_attendance(cin, firstName, lastName, major, transferred_from)
-                    if display:
-                        studentData = f"{student_id},{student_firstName},{student_lastName},{student_major},{transferred_from_info},{timestamp}"
-                        root.event_generate(CUSTOM_EVENT, when='now')
-            time.sleep(0.5)
+        start_readers()
+        mark_startup("readers")
+        report_startup(mode)
+        if not reader_pool.all_sessions():
+            connectReader()  # Reports that there is no reader yet
+        app.display_message("Waiting for a tag...")
+        pipeline.run()  # Runs until pipeline.stop()
     except SystemExit as e:
         print(f"\n{e}")
         app.display_message(f"\n{e}")
     except KeyboardInterrupt:
         print("\nScript stopped by user.")
         app.display_message("\nScript stopped by user.")
+    finally:
+        if reader_pool is not None:
+            reader_pool.stop()
+
+# Function to write what is still pending and close the files, in both modes
+def shutdown():
+    stop_provisioning()  # Reports a bulk write that was interrupted
+    roster_watcher.stop()
+    roster.close()
+    if hub_client is not None:
+        hub_client.stop()  # One last try to send what is queued
+
+    # Rows nobody answered the transfer prompt for are written as they are
+    for row in transfer_followups.take_all():
+        attendance_writer.append(row)
+
+    # Commit the rows still waiting and report how the writer did
+    attendance_writer.close()
+    attendance_checkpoint.save()
+    if excel_exporter is not None:
+        excel_exporter.stop()  # Exports the rows committed just now
+    attendance_store.close()
+    tag_registry.close()
+    metrics.stop()
+    roster_snapshot.close()
+    stats = attendance_writer.stats()
+    print(f"Attendance writer: {stats['rows_committed']} rows in {stats['commits']} commits, "
+          f"{stats['rows_per_second']:.2f} rows/s, commit latency avg {stats['avg_commit_ms']:.1f} ms, max {stats['max_commit_ms']:.1f} ms")
 
-if __name__ == "__main__":
-    globalVar()
+    print("\n***Program exited.***\n")
+
+# Headless station: no window and no tkinter, everything is logged to the console
+def run_headless(config):
+    global app
+    missing = [name for name in ("master_list", "event", "output_folder") if not getattr(config, name)]
+    if missing:
+        print(f"Headless mode needs {', '.join('--' + name.replace('_', '-') for name in missing)} (or a config file)")
+        sys.exit(2)
+    app = ConsoleApp()
+    setup_event(config.master_list, config.event, config.output_folder)
+    initialize_csv(None)
+    attendance_writer.start()
+    start_hub_client()
+    if excel_exporter is not None:
+        excel_exporter.start()
+    start_roster_watch()
+    mark_startup("event setup")
+    if config.provision:
+        if start_provisioning(config.provision, config.provision_filter) is None:
+            shutdown()
+            return
+    else:
+        print(f"Attendance is being logged to: {csv_path}")
+    print("Press Ctrl+C to stop.")
+
+    # Stop cleanly when the service manager stops the station
+    signal.signal(signal.SIGTERM, lambda signum, frame: pipeline.stop())
+    main_loop("headless")
+    shutdown()
+
+def run_gui(config):
+    global app, root
+    import_gui()
     root = tk.Tk()
+    root.withdraw()  # Hidden until the event details are known
+    mark_startup("imports")
+    setup_event(*get_event_details(root, config))
+    root.deiconify()
     app = AttendanceGUI(root)
     initialize_csv(root)
-    load_excel_data(app)  # Load initial Excel data
+    attendance_writer.start()
+    start_hub_client()
+    if excel_exporter is not None:
+        excel_exporter.start()
+    start_roster_watch()
+    load_excel_data(app)  # Load initial Excel data in the background
+    mark_startup("event setup")
 
     app.display_message("NFC Reader initialized.")
     app.display_message(f"Attendance is being logged to: {csv_path}\n")
@@ -651,10 +1142,11 @@ if __name__ == "__main__":
     print("Press Ctrl+C in the console to stop the script.")
 
     app.display_message("Attempting Threading")
-    nfc_thread = threading.Thread(target=main_loop, daemon=True)
+    nfc_thread = threading.Thread(target=main_loop, args=("gui",), daemon=True)
     
     nfc_thread.start()
     app.display_message("Threading successful")
+    root.after_idle(mark_startup, "window")
 
     try:
         root.mainloop()
@@ -663,9 +1155,38 @@ if __name__ == "__main__":
         pass  
 
     # Wait for the NFC thread to finish, about 2 seconds :)
+    pipeline.stop()
     nfc_thread.join(timeout=2)
+    shutdown()
 
-    print("\n***Program exited.***\n")
+reader_pool = None
+hub_client = None
+hub_url = None                          # Set from --hub, see checkin_hub.py
+station_name = ""
+provisioning = None                     # ProvisioningBatch while tags are being bulk written
+reader_backend = "pcsc"                 # Set from --reader, see reader_backend.py
+reader_options = {}
+
+if __name__ == "__main__":
+    config = load_config()
+    globalVar()
+    reader_backend = config.reader
+    hub_url, station_name = config.hub, config.station
+    trace_taps = config.trace
+    if config.metrics_interval:
+        METRICS_INTERVAL = config.metrics_interval
+    EXCEL_INTERVAL, mark_attended = config.excel_interval, config.mark_attended
+    WATCH_INTERVAL = config.watch_interval
+    if reader_backend == "sim":
+        reader_options = {"readers": config.sim_readers, "script": config.sim_script}
+    # Reading, parsing, dedup, writing and the UI each run as their own stage; every reader feeds the same pipeline
+    pipeline = ScanPipeline(parse_tag, check_not_signed_in, record_attendance, show_attendance, remote_dedup=check_hub,
+                           duplicate=report_in_flight_duplicate)
+    if config.headless:
+        mark_startup("imports")
+        run_headless(config)
+    else:
+        run_gui(config)
 
     # Use in terminal to create executable in the terminal of the folder (In the smae location where the python application is at)
     # pyinstaller --onefile --windowed --hidden-import smartcard --hidden-import openpyxl --hidden-import smartcard.System --hidden-import smartcard.util --hidden-import tkinter --hidden-import threading PythonApplication.py
\ No newline at end of file
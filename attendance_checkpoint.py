@@ -0,0 +1,97 @@
+# Attendance checkpoint: sidecar file that makes resuming a large attendance CSV cheap
+#
+# The checkpoint holds a byte offset into the CSV and the CINs of every row before that offset.
+# On restart only the rows appended after the offset are parsed. The last bytes before the offset
+# are stored too, so a CSV that was replaced or edited since the checkpoint is parsed in full instead.
+
+import csv
+import io
+import json
+import os
+import time
+
+CHECKPOINT_VERSION = 1
+TAIL_BYTES = 64
+
+
+class AttendanceCheckpoint:
+    def __init__(self, csv_path, save_interval=30):
+        self.csv_path = csv_path
+        self.path = csv_path + ".checkpoint"
+        self.save_interval = save_interval      # Seconds between checkpoint saves while logging
+        self.cins = set()               # CINs of every row before offset
+        self.offset = 0
+        self.tail_rows = 0              # Rows parsed by the last resume()
+        self.last_save = 0.0
+
+    def _tail(self, offset):
+        with open(self.csv_path, 'rb') as file:
+            file.seek(max(0, offset - TAIL_BYTES))
+            return file.read(offset - max(0, offset - TAIL_BYTES)).hex()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as file:
+                checkpoint = json.load(file)
+            if checkpoint.get("version") != CHECKPOINT_VERSION:
+                return None
+            offset = checkpoint["offset"]
+            if os.path.getsize(self.csv_path) < offset or self._tail(offset) != checkpoint["tail"]:
+                print("Attendance checkpoint does not match the CSV, reading the whole file.")
+                return None
+            return offset, set(checkpoint["cins"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    # Function to load the signed-in CINs, parsing only the rows after the checkpoint
+    def resume(self):
+        loaded = self._load()
+        offset, cins = loaded if loaded else (0, set())
+        rows = 0
+        with open(self.csv_path, 'rb') as binary:
+            binary.seek(offset)
+            with io.TextIOWrapper(binary, newline='') as file:
+                reader = csv.reader(file)
+                if offset == 0:
+                    next(reader, None)  # Skip header
+                for row in reader:
+                    if row:
+                        cins.add(row[0])
+                        rows += 1
+            self.offset = os.path.getsize(self.csv_path)
+        self.cins = cins
+        self.tail_rows = rows
+        if rows:
+            self.save()                 # Next start only has to read what gets appended from here on
+        return cins
+
+    # Called by the attendance writer after each commit with the rows it wrote and the new CSV size
+    def committed(self, rows, size):
+        self.cins.update(row[0] for row in rows)
+        self.offset = size
+        if time.monotonic() - self.last_save >= self.save_interval:
+            self.save()
+
+    # Function to write the checkpoint atomically
+    def save(self):
+        checkpoint = {
+            "version": CHECKPOINT_VERSION,
+            "offset": self.offset,
+            "tail": self._tail(self.offset),
+            "cins": sorted(self.cins),
+        }
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w') as file:
+                json.dump(checkpoint, file)
+            os.replace(temp_path, self.path)
+            self.last_save = time.monotonic()
+        except OSError as e:
+            print(f"Error saving attendance checkpoint: {e}")
+
+    # Function to forget the checkpoint, used when a fresh CSV is created
+    def reset(self):
+        self.cins = set()
+        self.offset = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
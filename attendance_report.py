@@ -0,0 +1,249 @@
+# Attendance report: semester numbers from every event's attendance CSV
+#
+# Finds every <event>_attendance.csv under a folder, reads them in parallel (one file per worker
+# process) and adds up:
+#   - attendance per event, with first and last arrival
+#   - attendance per major and per transfer origin (students and check-ins)
+#   - repeat attenders: students seen at min_events events or more
+#   - arrivals per quarter hour of the day, and per event
+#   - students on the master list who never attended (with --master-list)
+# Every layout initialize_csv reads is accepted: old 5-column, 6-column and current 7-column rows.
+# Rows are streamed and each file comes back as counts, so memory grows with the number of students
+# and events, not with the number of rows; at most two files per worker are in flight.
+#
+#   python attendance_report.py <folder> [--master-list students.xlsx] [--output report_folder]
+
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import csv
+import locale
+import os
+import sys
+import time
+from attendance_store import CSV_HEADER, normalize_row
+from roster import normalize_cin
+from transfer_followup import WAITING_TEXT
+
+CSV_SUFFIX = "_attendance.csv"
+SLOT_MINUTES = 15               # Width of the arrival histogram bars
+NO_ORIGIN = "(not given)"
+
+
+# Function to find every attendance CSV under root; returns (event, path) sorted by event
+def find_event_files(root):
+    files = []
+    for folder, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(CSV_SUFFIX):
+                files.append((name[:-len(CSV_SUFFIX)], os.path.join(folder, name)))
+    return sorted(files)
+
+
+# Function to turn "YYYY-MM-DD HH:MM" into its quarter-hour slot, e.g. "14:15"; None if it isn't a timestamp
+def arrival_slot(minute_stamp):
+    try:
+        hour, minute = int(minute_stamp[11:13]), int(minute_stamp[14:16])
+    except (ValueError, IndexError):
+        return None
+    return f"{hour:02d}:{minute - minute % SLOT_MINUTES:02d}"
+
+
+# Runs in a worker process: one event CSV down to counts
+def summarize_event(event, path):
+    students = {}                       # cin -> (firstName, lastName, major, transferred_from), first check-in wins
+    check_ins = 0
+    skipped = 0
+    minutes = Counter()                 # "YYYY-MM-DD HH:MM" -> arrivals, folded into slots once the file is read
+    # Same encoding the station writes the CSV with (open() without an encoding)
+    with open(path, 'r', newline='', encoding=locale.getpreferredencoding(False), errors='replace') as file:
+        for row in csv.reader(file):
+            if not row or row[:1] == CSV_HEADER[:1]:
+                continue
+            if len(row) < 5:
+                skipped += 1
+                continue
+            cin, firstName, lastName, major, origin, timestamp, _ = normalize_row(row)
+            cin = cin.strip()
+            if not cin:
+                skipped += 1
+                continue
+            check_ins += 1
+            if cin in students:
+                continue                # Already signed in, a replayed or hand-edited duplicate
+            origin = origin.strip()
+            students[cin] = (firstName, lastName, major.strip(), origin if origin and origin != WAITING_TEXT else NO_ORIGIN)
+            minutes[timestamp[:16]] += 1
+
+    arrivals = Counter()
+    stamps = []
+    for minute_stamp, count in minutes.items():
+        slot = arrival_slot(minute_stamp)
+        if slot is not None:
+            arrivals[slot] += count
+            stamps.append(minute_stamp)
+    first, last = (min(stamps), max(stamps)) if stamps else (None, None)
+    return {"event": event, "path": path, "students": students, "check_ins": check_ins, "skipped": skipped,
+            "arrivals": arrivals, "first": first, "last": last}
+
+
+class AttendanceReport:
+    def __init__(self, min_events=2):
+        self.min_events = min_events
+        self.events = {}                # event -> (students, check-ins, first arrival, last arrival)
+        self.event_arrivals = {}        # event -> Counter of quarter-hour slots
+        self.by_major = Counter()       # Check-ins per major
+        self.by_origin = Counter()      # Check-ins per transfer origin
+        self.major_students = {}        # major -> set of CINs
+        self.origin_students = {}       # transfer origin -> set of CINs
+        self.arrivals = Counter()       # Check-ins per quarter-hour slot over every event
+        self.events_per_cin = Counter()
+        self.names = {}                 # cin -> (firstName, lastName, major), from the latest file merged
+        self.skipped_rows = 0
+        self.files = 0
+
+    # Function to fold one summarize_event result into the totals
+    def add(self, summary):
+        event, students = summary["event"], summary["students"]
+        if event in self.events:        # Same event name in two folders, keep them apart
+            event = f"{event} ({summary['path']})"
+        self.files += 1
+        self.skipped_rows += summary["skipped"]
+        self.events[event] = (len(students), summary["check_ins"], summary["first"], summary["last"])
+        self.event_arrivals[event] = summary["arrivals"]
+        self.arrivals.update(summary["arrivals"])
+        self.events_per_cin.update(students.keys())
+        majors = Counter(student[2] for student in students.values())
+        origins = Counter(student[3] for student in students.values())
+        self.by_major.update(majors)
+        self.by_origin.update(origins)
+        for cin, (firstName, lastName, major, origin) in students.items():
+            self.major_students.setdefault(major, set()).add(cin)
+            self.origin_students.setdefault(origin, set()).add(cin)
+            self.names[cin] = (firstName, lastName, major)
+
+    def repeat_attenders(self):
+        return [(cin, count) for cin, count in self.events_per_cin.most_common() if count >= self.min_events]
+
+    # Function to list the master list students (roster entries) who never checked in
+    def never_attended(self, roster_rows):
+        return [entry for entry in roster_rows
+                if normalize_cin(entry[3]) and normalize_cin(entry[3]) not in self.events_per_cin]
+
+    def lines(self, never=None):
+        students = len(self.events_per_cin)
+        lines = [f"{self.files} events, {students} students, {sum(self.by_major.values())} check-ins"
+                 + (f", {self.skipped_rows} unreadable rows skipped" if self.skipped_rows else "")]
+        lines.append("\nAttendance per event:")
+        for event, (count, check_ins, first, last) in sorted(self.events.items(), key=lambda item: item[1][2] or ""):
+            span = f" ({first} - {last[11:]})" if first else ""
+            lines.append(f"  {event}: {count} students{span}")
+        for title, counts, groups in (("major", self.by_major, self.major_students),
+                                      ("transfer origin", self.by_origin, self.origin_students)):
+            lines.append(f"\nAttendance per {title} (students, check-ins):")
+            for name, count in counts.most_common():
+                lines.append(f"  {name or '(blank)'}: {len(groups[name])}, {count}")
+        repeat = self.repeat_attenders()
+        lines.append(f"\nRepeat attenders ({self.min_events}+ events): {len(repeat)} of {students} students")
+        for cin, count in repeat[:20]:
+            firstName, lastName, _ = self.names[cin]
+            lines.append(f"  {cin} {firstName} {lastName}: {count} events")
+        if len(repeat) > 20:
+            lines.append(f"  ... {len(repeat) - 20} more")
+        lines.append(f"\nArrivals per {SLOT_MINUTES} minutes:")
+        peak = max(self.arrivals.values(), default=0)
+        for slot in sorted(self.arrivals):
+            bar = "#" * max(1, round(40 * self.arrivals[slot] / peak))
+            lines.append(f"  {slot} {self.arrivals[slot]:6d} {bar}")
+        if never is not None:
+            lines.append(f"\nNever attended: {len(never)} students on the master list")
+        return lines
+
+    # Function to write every table as a CSV into folder
+    def write_csv(self, folder, never=None):
+        os.makedirs(folder, exist_ok=True)
+        tables = {
+            "per_event.csv": (["Event", "Students", "Rows", "First Arrival", "Last Arrival"],
+                              [(event, *values) for event, values in sorted(self.events.items())]),
+            "per_major.csv": (["Major", "Students", "Check-ins"],
+                              [(major, len(self.major_students[major]), count) for major, count in self.by_major.most_common()]),
+            "per_transfer_origin.csv": (["Transferred from?", "Students", "Check-ins"],
+                                        [(origin, len(self.origin_students[origin]), count)
+                                         for origin, count in self.by_origin.most_common()]),
+            "repeat_attenders.csv": (["Student CIN", "First Name", "Last Name", "Major", "Events"],
+                                     [(cin, *self.names[cin], count) for cin, count in self.repeat_attenders()]),
+            "arrivals.csv": (["Event", "Time", "Arrivals"],
+                             [("(all)", slot, self.arrivals[slot]) for slot in sorted(self.arrivals)] +
+                             [(event, slot, counts[slot]) for event, counts in sorted(self.event_arrivals.items())
+                              for slot in sorted(counts)]),
+        }
+        if never is not None:
+            tables["never_attended.csv"] = (["Row", "First Name", "Last Name", "Student CIN", "Major"], never)
+        for name, (header, rows) in tables.items():
+            with open(os.path.join(folder, name), 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(header)
+                writer.writerows(rows)
+        return list(tables)
+
+
+# Function to read every file with workers processes, merging each result as soon as it is done
+def build_report(files, workers=None, min_events=2):
+    report = AttendanceReport(min_events)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(files) < 2:
+        for event, path in files:
+            try:
+                report.add(summarize_event(event, path))
+            except (OSError, UnicodeError, csv.Error) as e:
+                print(f"Error reading attendance file: {e}")
+        return report
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        remaining = iter(files)
+        running = set()
+        while True:
+            for event, path in remaining:
+                running.add(executor.submit(summarize_event, event, path))
+                if len(running) >= workers * 2:
+                    break
+            if not running:
+                return report
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    report.add(future.result())
+                except (OSError, UnicodeError, csv.Error) as e:
+                    print(f"Error reading attendance file: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attendance numbers across every event CSV under a folder")
+    parser.add_argument("folder", help="Folder holding the event folders / attendance CSVs")
+    parser.add_argument("--master-list", help="Excel master list, to find students who never attended")
+    parser.add_argument("--output", help="Also write the tables as CSV files into this folder")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per core)")
+    parser.add_argument("--min-events", type=int, default=2, help="Events attended to count as a repeat attender")
+    args = parser.parse_args(argv)
+
+    files = find_event_files(args.folder)
+    if not files:
+        print(f"No *{CSV_SUFFIX} files under {args.folder}")
+        return 1
+    start = time.perf_counter()
+    report = build_report(files, args.workers, args.min_events)
+    never = None
+    if args.master_list:
+        from roster import Roster
+        never = report.never_attended(Roster(args.master_list).all_rows())
+    elapsed = time.perf_counter() - start
+
+    print("\n".join(report.lines(never)))
+    print(f"\nRead {report.files} files in {elapsed:.2f} s")
+    if args.output:
+        names = report.write_csv(args.output, never)
+        print(f"Wrote {', '.join(names)} to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
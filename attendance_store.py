@@ -0,0 +1,210 @@
+# Attendance store: SQLite database that holds the attendance of many events
+#
+# Rows are indexed on (event, CIN) and on timestamp. The CINs of the events in use are also kept in
+# memory, so checking whether a student already signed in never touches the database.
+# The per-event CSV stays the file staff open; export_csv() writes the same column layout.
+# An event is stored under the absolute path of its CSV (store_event_key), not under its name, so an
+# event name reused in another folder is a separate event. "events" lists the keys in use.
+#
+# Usage from a terminal:
+#   python attendance_store.py <database> events
+#   python attendance_store.py <database> export <event> <output.csv>
+#   python attendance_store.py <database> import <event> <attendance.csv>
+# <event> is a key listed by "events", the path of the event's CSV, or the event name when only one
+# folder holds an event of that name. import also takes the name or path of the CSV being imported.
+
+import csv
+import os
+import sqlite3
+import sys
+import threading
+
+CSV_HEADER = ["Student CIN", "First Name", "Last Name", "Major", "Transferred from?", "Timestamp", "Reader"]
+USAGE = "usage: python attendance_store.py <database> events | export <event> <output.csv> | import <event> <attendance.csv>"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id INTEGER PRIMARY KEY,
+    event TEXT NOT NULL,
+    cin TEXT NOT NULL,
+    first_name TEXT,
+    last_name TEXT,
+    major TEXT,
+    transferred_from TEXT,
+    timestamp TEXT,
+    reader TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS attendance_event_cin ON attendance (event, cin);
+CREATE INDEX IF NOT EXISTS attendance_timestamp ON attendance (timestamp);
+"""
+
+
+# Function to get the key an event's rows are stored under: the absolute path of its attendance CSV
+def store_event_key(csv_path):
+    return os.path.normcase(os.path.abspath(csv_path))
+
+
+# Turns a CSV row in the old (5 columns), 6-column or current (7 columns) layout into 7 values
+def normalize_row(row):
+    if len(row) >= 7:
+        return list(row[:7])
+    if len(row) >= 6:
+        return list(row[:6]) + [""]
+    return [row[0], row[1], row[2], row[3], "", row[4], ""]
+
+
+class AttendanceStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection shared by the writer thread and the GUI, guarded by self.lock
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.signed_in = {}             # event -> set of CINs, loaded on first use
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def _event_cins(self, event):
+        cins = self.signed_in.get(event)
+        if cins is None:
+            cins = {cin for (cin,) in self.db.execute("SELECT cin FROM attendance WHERE event = ?", (event,))}
+            self.signed_in[event] = cins
+        return cins
+
+    def is_recorded(self, event, cin):
+        with self.lock:
+            return cin in self._event_cins(event)
+
+    # Function to reserve a CIN for an event; returns False if it already signed in
+    # The row itself is written later by add_rows, together with the rest of its group
+    def claim(self, event, cin):
+        with self.lock:
+            cins = self._event_cins(event)
+            if cin in cins:
+                return False
+            cins.add(cin)
+            return True
+
+    # Function to mark CINs as signed in without writing rows (e.g. CINs read back from the CSV)
+    def claim_many(self, event, cins):
+        with self.lock:
+            self._event_cins(event).update(cins)
+
+    def count(self, event):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM attendance WHERE event = ?", (event,)).fetchone()[0]
+
+    # Function to write attendance rows (CSV layout) in one transaction; duplicates are ignored
+    def add_rows(self, event, rows):
+        rows = [normalize_row(row) for row in rows if row]
+        with self.lock:
+            with self.db:
+                before = self.db.total_changes
+                self.db.executemany(
+                    "INSERT OR IGNORE INTO attendance (event, cin, first_name, last_name, major, transferred_from, timestamp, reader) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [[event] + row for row in rows])
+                inserted = self.db.total_changes - before
+            self._event_cins(event).update(row[0] for row in rows)
+        return inserted
+
+    # Function to fill in the transfer information of a row that was recorded without it
+    def set_transferred_from(self, event, cin, transferred_from):
+        with self.lock:
+            with self.db:
+                self.db.execute("UPDATE attendance SET transferred_from = ? WHERE event = ? AND cin = ?",
+                                (transferred_from, event, cin))
+
+    # Function to load an existing attendance CSV into the database
+    def import_csv(self, event, csv_path):
+        with open(csv_path, 'r', newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)  # Skip header
+            return self.add_rows(event, [row for row in reader if len(row) >= 5])
+
+    # Rows of one event in check-in order, in the CSV column layout
+    def rows(self, event):
+        with self.lock:
+            return self.db.execute(
+                "SELECT cin, first_name, last_name, major, transferred_from, timestamp, reader "
+                "FROM attendance WHERE event = ? ORDER BY timestamp, id", (event,)).fetchall()
+
+    # Function to write one event to a CSV with the same columns initialize_csv creates
+    def export_csv(self, event, csv_path):
+        rows = self.rows(event)
+        with open(csv_path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(CSV_HEADER)
+            writer.writerows(rows)
+        return len(rows)
+
+    # (event, attendees, first check-in, last check-in) for every event in the database
+    def events(self):
+        with self.lock:
+            return self.db.execute(
+                "SELECT event, COUNT(*), MIN(timestamp), MAX(timestamp) FROM attendance GROUP BY event ORDER BY MIN(timestamp)").fetchall()
+
+    # (event, timestamp) for every event a student attended
+    def events_for_cin(self, cin):
+        with self.lock:
+            return self.db.execute(
+                "SELECT event, timestamp FROM attendance WHERE cin = ? ORDER BY timestamp", (cin,)).fetchall()
+
+    # Rows (with their event) checked in between two timestamps, "YYYY-MM-DD HH:MM:SS"
+    def between(self, start, end):
+        with self.lock:
+            return self.db.execute(
+                "SELECT event, cin, first_name, last_name, major, transferred_from, timestamp, reader "
+                "FROM attendance WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp", (start, end)).fetchall()
+
+
+# Function to find the stored events an event given on the command line means: its key, its CSV's path or its name
+def matching_events(store, event):
+    keys = [key for key, _, _, _ in store.events()]
+    if event in keys or store_event_key(event) in keys:
+        return [event if event in keys else store_event_key(event)]
+    csv_name = os.path.normcase(f"{event}_attendance.csv")
+    return [key for key in keys if os.path.basename(key) == csv_name]
+
+
+# Function to get the one event key for the command line, or exit with a message
+def command_line_event(store, event, csv_path=None):
+    # An event named after the CSV being imported goes under the key the station uses for that CSV
+    if csv_path is not None and (store_event_key(event) == store_event_key(csv_path) or
+                                 f"{event}_attendance.csv" == os.path.basename(csv_path)):
+        return store_event_key(csv_path)
+    keys = matching_events(store, event)
+    if len(keys) == 1:
+        return keys[0]
+    if keys:
+        print(f"{event} matches several events, give one of: " + ", ".join(keys))
+    else:
+        print(f"No event matches {event}, see: python attendance_store.py <database> events")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print(USAGE)
+        sys.exit(1)
+    store = AttendanceStore(sys.argv[1])
+    command = sys.argv[2]
+    if command == "events":
+        for event, attendees, first, last in store.events():
+            print(f"{event}: {attendees} students ({first} - {last})")
+    elif command == "export" and len(sys.argv) == 5:
+        event = command_line_event(store, sys.argv[3])
+        print(f"Exported {store.export_csv(event, sys.argv[4])} rows of {event} to {sys.argv[4]}")
+    elif command == "import" and len(sys.argv) == 5:
+        event = command_line_event(store, sys.argv[3], sys.argv[4])
+        print(f"Imported {store.import_csv(event, sys.argv[4])} new rows into {event}")
+    else:
+        print(USAGE)
+        sys.exit(1)
+    store.close()
@@ -0,0 +1,166 @@
+# Attendance writer: buffers attendance rows and commits them to the CSV as a group
+#
+# Rows are committed every commit_interval seconds, or as soon as commit_rows rows are waiting.
+# A commit first appends the rows to an fsync'd journal next to the CSV, hands them to on_journaled
+# (the SQLite store), then appends them to the CSV and fsyncs it, and only then empties the journal.
+# If the program dies in between, replay() (called from initialize_csv) cuts any half-written row off
+# the CSV, appends the journaled rows again and hands them to on_journaled again.
+#
+# Journal layout, one block per commit:
+#   #offset <size of the CSV before the commit>
+#   <rows, CSV encoded>
+#   #commit <number of rows>
+# A block without its #commit line was never acknowledged and is dropped.
+
+import csv
+import io
+import os
+import threading
+import time
+
+
+class AttendanceWriter:
+    # on_journaled(rows) is called once rows are durable in the journal; it must ignore rows it already has
+    # on_commit(rows, csv_size) is called after every commit
+    # Both run on the committing thread
+    # metrics (a metrics.Metrics) gets the time of every commit as the csv_commit stage
+    def __init__(self, csv_path, commit_interval=0.5, commit_rows=25, on_commit=None, on_journaled=None, metrics=None):
+        self.csv_path = csv_path
+        self.metrics = metrics
+        self.on_commit = on_commit
+        self.on_journaled = on_journaled
+        self.journal_path = csv_path + ".journal"
+        self.commit_interval = commit_interval
+        self.commit_rows = commit_rows
+        self.pending = []               # Rows waiting for the next commit
+        self.lock = threading.Lock()    # Guards pending
+        self.commit_lock = threading.Lock()   # One commit at a time
+        self.wake = threading.Event()
+        self.closing = False
+        self.thread = None
+
+        # Statistics, read with stats()
+        self.started_at = time.perf_counter()
+        self.rows_committed = 0
+        self.commits = 0
+        self.commit_time = 0.0
+        self.max_commit_time = 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="attendance-commit", daemon=True)
+        self.thread.start()
+
+    # Function to queue one row; it reaches the disk with the next group commit
+    def append(self, row):
+        with self.lock:
+            self.pending.append(row)
+            full = len(self.pending) >= self.commit_rows
+        if full:
+            self.wake.set()
+
+    def _run(self):
+        while not self.closing:
+            self.wake.wait(self.commit_interval)
+            self.wake.clear()
+            try:
+                self.commit()
+            except OSError as e:
+                print(f"Error committing attendance rows: {e}")   # The rows stay queued for the next try
+
+    # Function to write every queued row to the journal and then to the CSV
+    def commit(self):
+        with self.commit_lock:
+            with self.lock:
+                rows, self.pending = self.pending, []
+            if not rows:
+                return 0
+            start = time.perf_counter()
+            if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > 0:
+                self.replay()           # An earlier commit failed after journaling, finish it first
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            data = buffer.getvalue()
+            try:
+                offset = os.path.getsize(self.csv_path)
+                with open(self.journal_path, 'a', newline='') as journal:
+                    journal.write(f"#offset {offset}\n{data}#commit {len(rows)}\n")
+                    journal.flush()
+                    os.fsync(journal.fileno())
+            except OSError:
+                with self.lock:
+                    self.pending[:0] = rows     # Not durable yet, put them back in order
+                raise
+            if self.on_journaled is not None:
+                self.on_journaled(rows)
+            with open(self.csv_path, 'a', newline='') as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+                size = file.tell()
+            open(self.journal_path, 'w').close()   # Rows are in the CSV, the journal can be emptied
+            if self.on_commit is not None:
+                self.on_commit(rows, size)
+
+            elapsed = time.perf_counter() - start
+            self.rows_committed += len(rows)
+            self.commits += 1
+            self.commit_time += elapsed
+            self.max_commit_time = max(self.max_commit_time, elapsed)
+            if self.metrics is not None:
+                self.metrics.observe("csv_commit", elapsed)
+            return len(rows)
+
+    # Function to finish an interrupted commit; returns the number of rows replayed into the CSV
+    def replay(self):
+        if not os.path.exists(self.journal_path):
+            return 0
+        with open(self.journal_path, 'r', newline='') as journal:
+            lines = journal.read().splitlines(keepends=True)
+
+        offset = None
+        committed = []                  # Rows from every complete block, in order
+        block = []
+        for line in lines:
+            if line.startswith("#offset "):
+                if offset is None:
+                    offset = int(line.split()[1])
+                block = []
+            elif line.startswith("#commit "):
+                committed.extend(block)
+                block = []
+            else:
+                block.append(line)
+
+        replayed = 0
+        if committed and self.on_journaled is not None:
+            self.on_journaled(list(csv.reader(io.StringIO("".join(committed)))))
+        if committed and offset is not None and os.path.exists(self.csv_path):
+            with open(self.csv_path, 'r+b') as file:
+                if file.seek(0, os.SEEK_END) > offset:
+                    file.truncate(offset)   # Drops whatever part of the commit made it in
+            with open(self.csv_path, 'a', newline='') as file:
+                file.write("".join(committed))
+                file.flush()
+                os.fsync(file.fileno())
+            replayed = sum(1 for _ in csv.reader(io.StringIO("".join(committed))))
+        os.remove(self.journal_path)
+        return replayed
+
+    # Function to commit what is left and stop the commit thread
+    def close(self):
+        self.closing = True
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+        self.commit()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started_at
+        return {
+            "rows_committed": self.rows_committed,
+            "commits": self.commits,
+            "rows_per_second": self.rows_committed / elapsed if elapsed > 0 else 0.0,
+            "avg_commit_ms": self.commit_time / self.commits * 1000 if self.commits else 0.0,
+            "max_commit_ms": self.max_commit_time * 1000,
+            "pending": len(self.pending),
+        }
@@ -0,0 +1,332 @@
+# Scale benchmark: how startup, lookups, resume and logging grow with the size of the master list and the event
+#
+# For every size (students on the master list, and attendance rows already in the CSV) the benchmark
+# generates synthetic data (synthetic_data.py) and runs each case in a fresh Python process, so import
+# time, the roster snapshot and peak memory are those of a real launch:
+#   startup_cold        import the tracker, setup_event, initialize_csv, load the master list with openpyxl
+#   startup_warm        the same launch again, the master list comes from the roster snapshot
+#   lookups             get_registered_student_from_excel, Roster.find_cin and Roster.search on a warm roster
+#   resume_<layout>     initialize_csv on an event CSV of that many rows, "legacy" (5-column), "old" (6-column)
+#                       or "new" (7-column),
+#                       first without a checkpoint (the CSV is imported into a new attendance database),
+#                       then again with the checkpoint; is_cin_recorded is timed on the resumed event
+#   logging             log_attendance for that many students, back to back, until the writer has committed them
+# Peak memory is the peak resident set size of the case's process (lookups run in a launch of their own).
+#
+#   python benchmarks/bench_scale.py --sizes 1000 10000 100000 --save before
+#   python benchmarks/bench_scale.py --sizes 1000 10000 100000 --compare before
+#
+# Results are saved to benchmarks/baselines/<name>.json. --compare lists every time or memory figure that
+# got more than --threshold worse than the baseline, and exits with 1 if there is any.
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+BASELINE_DIR = os.path.join(BENCH_DIR, "baselines")
+SIZES = (1000, 10000, 100000)
+LAYOUTS = ("legacy", "old", "new")
+LOOKUPS = 2000                  # Lookups timed per kind
+SEARCHES = 200
+EVENT = "Bench"
+
+
+# Peak resident set size of this process in MB, None where it can't be read
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return _peak_working_set_mb()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024   # Bytes on macOS, KB on Linux
+
+
+# Windows has no resource module; the peak working set is the same figure
+def _peak_working_set_mb():
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + \
+                       [(name, ctypes.c_size_t) for name in (
+                           "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                           "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.PeakWorkingSetSize / (1024 * 1024)
+    except (AttributeError, OSError):
+        return None
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+# Function to time calls of function(argument) over arguments; returns microseconds per call
+def time_calls(function, arguments):
+    start = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return (time.perf_counter() - start) / max(1, len(arguments)) * 1e6
+
+
+# ---- Cases, each run in its own process (see run_case) ----
+
+# Function to set the tracker up the way run_headless does, with state_dir holding the databases and the CSV
+def start_station(station, master_list, state_dir):
+    station.ATTENDANCE_DB_PATH = os.path.join(state_dir, "attendance.db")
+    station.EXCEL_INTERVAL = 0          # The Excel export runs on its own thread, it isn't part of these paths
+    station.globalVar()
+    station.app = station.ConsoleApp()
+    station.setup_event(master_list, EVENT, state_dir)
+
+
+def case_startup(args, started):
+    import PythonApplication as station
+    imported = time.perf_counter()
+    start_station(station, args.master_list, args.state_dir)
+    station.initialize_csv(None)
+    ready = time.perf_counter()
+    rows = station.roster.all_rows()    # What load_excel_data shows in the Excel Data tab
+    loaded = time.perf_counter()
+    result = {"import_s": imported - started, "setup_s": ready - imported, "roster_load_s": loaded - ready,
+              "total_s": loaded - started, "roster_rows": len(rows), "snapshot": station.roster_snapshot.last["result"]}
+    if args.lookups:
+        result.update(time_lookups(station, rows, args.seed))
+    station.shutdown()
+    return result
+
+
+def time_lookups(station, rows, seed):
+    rng = random.Random(seed)
+    sample = [rng.choice(rows) for _ in range(LOOKUPS)]
+    queries = [f"{entry[1]} {entry[2][:3]}" for entry in sample[:SEARCHES]]
+    first = time.perf_counter()
+    station.roster.search(queries[0])   # Waits for the search index the roster builds in the background
+    index_s = time.perf_counter() - first
+    return {
+        "row_lookup_us": time_calls(station.get_registered_student_from_excel, [entry[0] for entry in sample]),
+        "cin_lookup_us": time_calls(station.roster.find_cin, [entry[3] for entry in sample]),
+        "search_index_wait_s": index_s,
+        "search_us": time_calls(station.roster.search, queries),
+    }
+
+
+def case_resume(args, started):
+    import PythonApplication as station
+    start_station(station, args.master_list, args.state_dir)
+    begin = time.perf_counter()
+    station.initialize_csv(None)
+    resumed = time.perf_counter()
+    cins = sorted(station.attendance_checkpoint.cins)
+    rng = random.Random(args.seed)
+    probes = [rng.choice(cins) if cins and index % 2 else str(100000000 + index) for index in range(LOOKUPS)]
+    result = {"resume_s": resumed - begin, "tail_rows": station.attendance_checkpoint.tail_rows,
+              "signed_in": len(cins), "is_cin_recorded_us": time_calls(station.is_cin_recorded, probes)}
+    station.shutdown()
+    return result
+
+
+def case_logging(args, started):
+    import PythonApplication as station
+    from student_record import Student
+    from synthetic_data import make_students
+    start_station(station, args.master_list, args.state_dir)
+    station.initialize_csv(None)
+    station.attendance_writer.start()
+    students = [Student(str(cin), firstName, lastName, major, "bench")
+                for firstName, lastName, cin, major in make_students(args.size, args.seed)]
+    latencies = []
+    begin = time.perf_counter()
+    for student in students:
+        call = time.perf_counter()
+        station.log_attendance(student, "")
+        latencies.append(time.perf_counter() - call)
+    logged = time.perf_counter()
+    station.attendance_writer.close()   # Until every row is in the CSV
+    committed = time.perf_counter()
+    stats = station.attendance_writer.stats()
+    station.shutdown()
+    return {"log_p50_us": percentile(latencies, 0.50) * 1e6, "log_p99_us": percentile(latencies, 0.99) * 1e6,
+            "logged_per_s": len(students) / (logged - begin), "committed_per_s": len(students) / (committed - begin),
+            "commits": stats["commits"], "avg_commit_ms": stats["avg_commit_ms"]}
+
+
+CASES = {"startup": case_startup, "resume": case_resume, "logging": case_logging}
+
+
+# Entry point of a case process: runs one case with the tracker's output silenced and prints its JSON result
+def run_case(args, started):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        result = CASES[args.case](args, started)
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+    return 0
+
+
+# ---- The suite ----
+
+def spawn(case, size, master_list, state_dir, seed, lookups=False):
+    command = [sys.executable, os.path.abspath(__file__), "--case", case, "--size", str(size),
+               "--master-list", master_list, "--state-dir", state_dir, "--seed", str(seed)]
+    if lookups:
+        command.append("--lookups")
+    finished = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(BENCH_DIR))
+    if finished.returncode != 0:
+        raise RuntimeError(f"{case} at {size} failed:\n{finished.stderr[-2000:]}")
+    return json.loads(finished.stdout.strip().splitlines()[-1])
+
+
+# Function to generate the data for one size, reusing what an earlier run left in data_dir
+def prepare_data(data_dir, size, seed):
+    from synthetic_data import make_students, write_master_list, write_attendance_csv
+    folder = os.path.join(data_dir, str(size))
+    os.makedirs(folder, exist_ok=True)
+    master_list = os.path.join(folder, "master_list.xlsx")
+    csvs = {layout: os.path.join(folder, f"attendance_{layout}.csv") for layout in LAYOUTS}
+    if os.path.exists(master_list) and all(os.path.exists(path) for path in csvs.values()):
+        return master_list, csvs
+    students = make_students(size, seed)
+    start = time.perf_counter()
+    write_master_list(master_list, students)
+    for layout, path in csvs.items():
+        write_attendance_csv(path, students, size, layout, seed)
+    print(f"  generated {size} students and attendance rows in {time.perf_counter() - start:.1f} s")
+    return master_list, csvs
+
+
+def fresh_dir(path):
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+
+def run_size(size, data_dir, seed):
+    master_list, csvs = prepare_data(data_dir, size, seed)
+    work = os.path.join(data_dir, str(size), "work")
+    results = {}
+
+    state = fresh_dir(os.path.join(work, "startup"))
+    results["startup_cold"] = spawn("startup", size, master_list, state, seed)
+    results["startup_warm"] = spawn("startup", size, master_list, state, seed)
+    # Another warm launch, so building the search index doesn't count towards startup_warm's peak memory
+    lookups = spawn("startup", size, master_list, state, seed, lookups=True)
+    results["lookups"] = {key: lookups[key] for key in
+                          ("row_lookup_us", "cin_lookup_us", "search_index_wait_s", "search_us", "peak_rss_mb")}
+
+    for layout, path in csvs.items():
+        state = fresh_dir(os.path.join(work, f"resume_{layout}"))
+        shutil.copyfile(path, os.path.join(state, f"{EVENT}_attendance.csv"))
+        results[f"resume_{layout}_first"] = spawn("resume", size, master_list, state, seed)
+        results[f"resume_{layout}_checkpoint"] = spawn("resume", size, master_list, state, seed)
+
+    state = fresh_dir(os.path.join(work, "logging"))
+    results["logging"] = spawn("logging", size, master_list, state, seed)
+    return results
+
+
+# Lower is better for times and memory, higher for rates; anything else (counts) isn't compared
+def worse_by(key, value, base):
+    if not isinstance(value, (int, float)) or not isinstance(base, (int, float)) or base <= 0:
+        return None
+    if key.endswith("_per_s"):
+        return base / value - 1 if value > 0 else None
+    if key.endswith(("_s", "_us", "_ms", "_mb")):
+        return value / base - 1
+    return None
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for size, cases in results["sizes"].items():
+        for case, values in cases.items():
+            base_values = baseline["sizes"].get(size, {}).get(case, {})
+            for key, value in values.items():
+                worse = worse_by(key, value, base_values.get(key))
+                if worse is not None and worse > threshold:
+                    regressions.append(f"{size} {case} {key}: {base_values[key]:.4g} -> {value:.4g} (+{worse:.0%})")
+    return regressions
+
+
+def print_results(results):
+    for size, cases in results["sizes"].items():
+        print(f"\n{size} students / rows")
+        for case, values in cases.items():
+            shown = ", ".join(f"{key} {value:.4g}" if isinstance(value, float) else f"{key} {value}"
+                              for key, value in values.items())
+            print(f"  {case}: {shown}")
+
+
+def baseline_path(name):
+    return name if name.endswith(".json") else os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def main():
+    started = time.perf_counter()
+    parser = argparse.ArgumentParser(description="Startup, lookup, resume and logging times at 1k-100k students")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--data", help="Folder for the generated data, reused between runs (default: a temporary folder)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="Save the results as benchmarks/baselines/<name>.json")
+    parser.add_argument("--compare", help="Baseline to compare with (a name in benchmarks/baselines or a path)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Share a figure may get worse before it is reported")
+    # Used by the suite to run one case in a fresh process
+    parser.add_argument("--case", choices=sorted(CASES), help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--master-list", help=argparse.SUPPRESS)
+    parser.add_argument("--state-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--lookups", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        return run_case(args, started)
+
+    data_dir = args.data or tempfile.mkdtemp(prefix="bench_scale_")
+    results = {"created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+               "platform": platform.platform(), "cpus": os.cpu_count(), "seed": args.seed, "sizes": {}}
+    for size in args.sizes:
+        print(f"Running {size} ...", flush=True)
+        results["sizes"][str(size)] = run_size(size, data_dir, args.seed)
+    print_results(results)
+    print(f"\nData in {data_dir}")
+
+    if args.save:
+        path = baseline_path(args.save)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved results to {path}")
+    if args.compare:
+        with open(baseline_path(args.compare)) as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        print(f"\nCompared with {args.compare} ({baseline['created_at']}, Python {baseline['python']}): "
+              f"{len(regressions)} figures more than {args.threshold:.0%} worse")
+        for line in regressions:
+            print(f"  {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
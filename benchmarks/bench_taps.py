@@ -0,0 +1,245 @@
+# Tap benchmark: taps per second and per-tap latency of the whole check-in path on simulated readers
+#
+# Every tap goes through the real code: acquire_tag/read_nfc -> parse_tag -> check_not_signed_in ->
+# record_attendance/log_attendance -> attendance writer, CSV and database, on simulated readers
+# (sim_reader.py) in a temporary folder. A tap's latency runs from the tag entering the field until
+# its record is shown (or, for a student who already signed in, until the tap is turned away).
+#
+#   python benchmarks/bench_taps.py --taps 1000 --readers 2 --latency-ms 8 --duplicates 0.1
+#
+# --latency-ms is added to every APDU; a USB ACR122U takes roughly 5-15 ms per APDU.
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PythonApplication as station                             # Import the tracker itself, nothing runs on import
+import tag_io
+from scan_pipeline import ScanPipeline
+from sim_reader import SimulatedReaderPool, SimulatedTag
+
+FIRST_NAMES = ("Ana", "Luis", "Maria", "Kevin", "Sofia", "Daniel", "Jasmine", "Brian", "Emily", "Jose")
+LAST_NAMES = ("Lopez", "Nguyen", "Garcia", "Kim", "Martinez", "Chen", "Hernandez", "Patel", "Smith", "Ramirez")
+MAJORS = ("Computer Science", "Electrical Engineering", "Mechanical Engineering", "Civil Engineering")
+
+
+def percentile(values, share):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+# Stands in for the GUI: quiet, and notes when each tap is finished
+class BenchApp:
+    def __init__(self):
+        self.waiting = {}               # cin -> threading.Event of the tap in progress
+        self.lock = threading.Lock()
+        self.errors = []
+
+    def expect(self, cin):
+        done = threading.Event()
+        with self.lock:
+            self.waiting[cin] = done
+        return done
+
+    def finished(self, cin):
+        with self.lock:
+            done = self.waiting.pop(cin, None)
+        if done is not None:
+            done.set()
+
+    def display_message(self, message):
+        pass
+
+    def show_error(self, title, message):
+        self.errors.append(f"{title}: {message}")
+
+    def ask_transfer_info(self, cin, student_name):
+        station.complete_transfer_info(cin, "")
+
+    def show_attendance(self, record):
+        self.finished(record.cin)
+
+    def notify_empty_tag(self):
+        pass
+
+
+def make_taps(count, duplicates, legacy, readers, seed):
+    rng = random.Random(seed)
+    unique = int(count * (1 - duplicates))
+    students = []
+    for i in range(unique):
+        cin = str(300000000 + i)
+        tag = SimulatedTag.with_student(cin, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), rng.choice(MAJORS),
+                                        legacy=legacy, uid=bytes([0x04]) + i.to_bytes(6, 'big'))
+        students.append((cin, tag))
+    taps = list(students)
+    # Repeat taps of students who signed in a while ago (not still in flight on another reader)
+    gap = readers * 4
+    for _ in range(count - unique):
+        position = rng.randrange(gap, len(taps) + 1) if len(taps) > gap else len(taps)
+        taps.insert(position, taps[rng.randrange(0, max(1, position - gap))])
+    return taps
+
+
+def run(args):
+    tag_io.USE_FAST_READ = args.fast_read
+    folder = tempfile.mkdtemp(prefix="bench_taps_")
+    app = BenchApp()
+
+    # Set the tracker up the way run_headless does, in the temporary folder
+    station.ATTENDANCE_DB_PATH = os.path.join(folder, "attendance.db")
+    station.globalVar()
+    station.trace_taps = args.trace
+    station.app = app
+    station.setup_event(os.path.join(folder, "master_list.xlsx"), "Benchmark", folder)
+
+    def dedup(student):
+        new = station.check_not_signed_in(student)
+        if not new:
+            app.finished(student.cin)   # Turned away, that tap is done
+        return new
+
+    def duplicate(student):
+        station.report_in_flight_duplicate(student)
+        app.finished(student.cin)
+
+    station.pipeline = ScanPipeline(station.parse_tag, dedup, station.record_attendance, station.show_attendance,
+                                    duplicate=duplicate)
+    station.reader_pool = SimulatedReaderPool(station.on_reader_added, station.on_reader_removed, readers=args.readers,
+                                              latency=args.latency_ms / 1000, error_rate=args.error_rate, seed=args.seed)
+    taps = make_taps(args.taps, args.duplicates, args.legacy, args.readers, args.seed)
+    if args.registered:
+        # As if every tag had been enrolled at this station: known taps are resolved from the UID
+        for cin, tag in taps:
+            station.tag_registry.register(tag.uid.hex().upper(), cin, "Bench", "Student", "Computer Science")
+    pending = list(reversed(taps))
+    pending_lock = threading.Lock()
+    latencies = []
+    retries = [0]
+    lost = [0]
+
+    def drive(session):
+        while True:
+            with pending_lock:
+                if not pending:
+                    return
+                cin, tag = pending.pop()
+            started = time.perf_counter()
+            for attempt in range(args.max_attempts):
+                done = app.expect(cin)
+                session.insert(tag)
+                finished = done.wait(args.tap_timeout)
+                session.remove()
+                if finished:
+                    latencies.append(time.perf_counter() - started)
+                    break
+                retries[0] += 1         # The read failed, the student taps again
+            else:
+                lost[0] += 1
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        station.initialize_csv(None)
+        station.attendance_writer.start()
+        pipeline_thread = threading.Thread(target=station.pipeline.run, daemon=True)
+        pipeline_thread.start()
+        station.reader_pool.start()
+
+        sessions = station.reader_pool.all_sessions()
+        started = time.perf_counter()
+        drivers = [threading.Thread(target=drive, args=(session,)) for session in sessions]
+        for driver in drivers:
+            driver.start()
+        for driver in drivers:
+            driver.join()
+        elapsed = time.perf_counter() - started
+
+        station.pipeline.stop()
+        pipeline_thread.join(timeout=5)
+        station.reader_pool.stop()
+        station.shutdown()
+
+    apdus = {}
+    for session in sessions:
+        for kind, count in session.connection.apdu_counts.items():
+            apdus[kind] = apdus.get(kind, 0) + count
+    with open(station.csv_path, 'r', newline='') as file:
+        rows = sum(1 for _ in csv.reader(file)) - 1
+    writer = station.attendance_writer.stats()
+
+    total_apdus = sum(apdus.values())
+    return {
+        "taps": len(taps),
+        "readers": args.readers,
+        "latency_ms_per_apdu": args.latency_ms,
+        "payload": "legacy" if args.legacy else "compact",
+        "fast_read": args.fast_read,
+        "registered": args.registered,
+        "seconds": elapsed,
+        "taps_per_second": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "max": max(latencies, default=0.0) * 1000,
+        },
+        "apdus": apdus,
+        "apdus_per_tap": total_apdus / (len(taps) + retries[0]) if taps else 0.0,
+        "retries": retries[0],
+        "lost": lost[0],
+        "csv_rows": rows,
+        "unique_students": len({cin for cin, _ in taps}),
+        "commits": writer["commits"],
+        "stage_p95_ms": station.metrics.summary()["stage_p95_ms"],
+        "folder": folder,
+        "errors": app.errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end tap benchmark on simulated readers")
+    parser.add_argument("--taps", type=int, default=500)
+    parser.add_argument("--readers", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added to every APDU")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of APDUs that fail")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="Share of taps by students already signed in")
+    parser.add_argument("--legacy", action="store_true", help="Tags carry the old CinNumber...End payload")
+    parser.add_argument("--fast-read", action="store_true", help="Read with NTAG FAST_READ")
+    parser.add_argument("--tap-timeout", type=float, default=1.0, help="Seconds before a student taps again")
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--registered", action="store_true", help="Tag UIDs are already in the tag registry")
+    parser.add_argument("--trace", action="store_true", help="Keep the per-tap JSON trace in the output folder")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    results = run(args)
+    latency = results["latency_ms"]
+    print(f"{results['taps']} taps on {results['readers']} reader(s), {results['payload']} payload, "
+          f"{results['latency_ms_per_apdu']} ms per APDU")
+    print(f"  {results['taps_per_second']:.1f} taps/s over {results['seconds']:.2f} s")
+    print(f"  latency p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, p99 {latency['p99']:.1f} ms, max {latency['max']:.1f} ms")
+    print(f"  APDUs {results['apdus']} ({results['apdus_per_tap']:.2f} per tap)")
+    print(f"  retries {results['retries']}, lost {results['lost']}, CSV rows {results['csv_rows']} "
+          f"for {results['unique_students']} students in {results['commits']} commits")
+    print("  stage p95 (ms): " + ", ".join(f"{stage} {ms:.2f}" for stage, ms in results["stage_p95_ms"].items()))
+    print(f"  output in {results['folder']}")
+    for error in results["errors"]:
+        print(f"  error: {error}")
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Synthetic data: master lists and attendance CSVs of any size, for the benchmarks
+#
+# The master list has the layout roster.py reads (First Name, Last Name, CIN, Major from row 2 on,
+# CINs stored as numbers the way Excel keeps them). Attendance CSVs come in every layout the tracker
+# resumes: "legacy" is the original 5-column file (no transfer or Reader column), "old" the 6-column
+# one (no Reader column), "new" the current 7-column one.
+# Every student signs in once, in a random order, over a four-hour event. The same seed always gives
+# the same files.
+#
+#   python benchmarks/synthetic_data.py master students.xlsx --students 10000
+#   python benchmarks/synthetic_data.py attendance Event_attendance.csv --students 10000 --rows 8000 --layout old
+
+import argparse
+import csv
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attendance_store import CSV_HEADER
+
+FIRST_NAMES = ("Ana", "Luis", "Maria", "Kevin", "Sofia", "Daniel", "Jasmine", "Brian", "Emily", "Jose",
+               "Andrea", "Carlos", "Vanessa", "Eric", "Diana", "Steven", "Karen", "Jonathan", "Alyssa", "Victor")
+LAST_NAMES = ("Lopez", "Nguyen", "Garcia", "Kim", "Martinez", "Chen", "Hernandez", "Patel", "Smith", "Ramirez",
+              "Tran", "Gonzalez", "Park", "Flores", "Rivera", "Wong", "Torres", "Le", "Sanchez", "Cruz")
+MAJORS = ("Computer Science", "Electrical Engineering", "Mechanical Engineering", "Civil Engineering",
+          "Computer Engineering", "Information Technology", "Technology, Engineering and Design",
+          "Aviation Administration", "Fire Protection Administration", "Industrial Technology")
+COLLEGES = ("", "", "", "East Los Angeles College", "Pasadena City College", "Rio Hondo College",
+            "Mt. San Antonio College", "Glendale Community College", "Los Angeles City College, Main Campus")
+LAYOUTS = {                     # Layout -> columns of CSV_HEADER it has
+    "legacy": (0, 1, 2, 3, 5),  # CIN, names, major, timestamp: before the transfer and Reader columns
+    "old": range(6),            # Before the Reader column
+    "new": range(7),
+}
+READERS = ("ACS ACR122U PICC Interface 0", "ACS ACR122U PICC Interface 1")
+FIRST_CIN = 300000000
+EVENT_START = datetime(2026, 9, 15, 11, 0)
+EVENT_MINUTES = 240
+
+
+# Function to make the students of a master list: (firstName, lastName, cin, major) in sheet order
+def make_students(count, seed=1):
+    rng = random.Random(seed)
+    cins = rng.sample(range(FIRST_CIN, FIRST_CIN + count * 10), count)
+    return [(rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), cin, rng.choice(MAJORS)) for cin in cins]
+
+
+# Function to write a master list workbook (streamed, so 100k rows don't need the whole sheet in memory)
+def write_master_list(path, students):
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Registered Students")
+    sheet.append(["First Name", "Last Name", "CIN", "Major"])
+    for student in students:
+        sheet.append(list(student))
+    workbook.save(path)
+
+
+# Function to write an attendance CSV for rows of the students, in the given layout
+def write_attendance_csv(path, students, rows, layout="new", seed=1):
+    rng = random.Random(seed)
+    attendees = rng.sample(students, min(rows, len(students)))
+    step = timedelta(minutes=EVENT_MINUTES) / max(1, len(attendees))
+    columns = LAYOUTS[layout]
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow([CSV_HEADER[column] for column in columns])
+        for index, (firstName, lastName, cin, major) in enumerate(attendees):
+            timestamp = (EVENT_START + step * index).strftime("%Y-%m-%d %H:%M:%S")
+            row = [cin, firstName, lastName, major, rng.choice(COLLEGES), timestamp, rng.choice(READERS)]
+            writer.writerow([row[column] for column in columns])
+    return len(attendees)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic master lists and attendance CSVs")
+    parser.add_argument("kind", choices=("master", "attendance"))
+    parser.add_argument("path")
+    parser.add_argument("--students", type=int, default=1000, help="Students on the master list")
+    parser.add_argument("--rows", type=int, help="Attendance rows (default: every student)")
+    parser.add_argument("--layout", choices=sorted(LAYOUTS), default="new", help="Attendance CSV layout")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    students = make_students(args.students, args.seed)
+    if args.kind == "master":
+        write_master_list(args.path, students)
+        print(f"Wrote {len(students)} students to {args.path}")
+    else:
+        rows = write_attendance_csv(args.path, students, args.rows or args.students, args.layout, args.seed)
+        print(f"Wrote {rows} attendance rows ({args.layout} layout) to {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# Check-in hub: one place that decides who already signed in, for every station at an event
+#
+# Stations (PythonApplication.py --hub http://host:8765) send their check-ins here in batches; the hub
+# answers each one with "accepted" or "duplicate", so a student can't sign in at two doors. The hub
+# keeps the merged attendance in its own attendance database (attendance_store.py), which can be
+# exported as one CSV. A station sending a CIN it already sent (after a restart or a retry) gets
+# "accepted" again.
+#
+#   python checkin_hub.py --db hub.db --host 0.0.0.0 --port 8765
+#
+# API (JSON):
+#   POST /events/<event>/checkins   {"station": "door-1", "checkins": [[cin, first, last, major, transferred, timestamp, reader], ...]}
+#                                   -> {"results": ["accepted" | "duplicate", ...], "stations": [station that has the CIN, ...]}
+#   GET  /events/<event>            -> {"event": ..., "students": n, "stations": {station: n}}
+#   GET  /events/<event>/export     -> the event's attendance as CSV
+#   GET  /health                    -> {"ok": true}
+
+import argparse
+import csv
+import io
+import threading
+from flask import Flask, jsonify, request, Response
+from attendance_store import AttendanceStore, CSV_HEADER, normalize_row
+
+DEFAULT_PORT = 8765
+MAX_BATCH = 5000                # Check-ins accepted in one request
+
+
+# A CIN arrives as a string or a number; null, booleans or lists would be stored as "None", "True", ...
+def valid_cin(value):
+    return isinstance(value, (str, int)) and not isinstance(value, bool) and bool(str(value).strip())
+
+
+# Function to build the hub's Flask app on top of an attendance database
+def create_hub(db_path):
+    hub = Flask(__name__)
+    store = AttendanceStore(db_path)
+    owners = {}                         # event -> {cin: station that checked it in first}
+    lock = threading.Lock()
+
+    def event_owners(event):
+        found = owners.get(event)
+        if found is None:
+            # The reader column holds "station/reader", see hub_client.hub_row
+            found = {cin: (reader or "").split("/", 1)[0] for cin, *_, reader in store.rows(event)}
+            owners[event] = found
+        return found
+
+    @hub.post("/events/<event>/checkins")
+    def check_in(event):
+        body = request.get_json(silent=True) or {}
+        station = str(body.get("station", ""))
+        checkins = body.get("checkins")
+        if not station or not isinstance(checkins, list) or len(checkins) > MAX_BATCH:
+            return jsonify({"error": f"Expected a station and up to {MAX_BATCH} check-ins"}), 400
+        results, stations, accepted = [], [], []
+        with lock:
+            known = event_owners(event)
+            for row in checkins:
+                if not isinstance(row, list) or len(row) < 5 or not valid_cin(row[0]):
+                    results.append("invalid")
+                    stations.append(None)
+                    continue
+                row = [str(value) for value in normalize_row(row)]
+                cin = row[0].strip()
+                owner = known.get(cin)
+                if owner is None:
+                    known[cin] = owner = station
+                    row[0] = cin
+                    accepted.append(row)
+                results.append("accepted" if owner == station else "duplicate")
+                stations.append(owner)
+            if accepted:
+                store.add_rows(event, accepted)     # One transaction per batch
+        return jsonify({"results": results, "stations": stations})
+
+    @hub.get("/events/<event>")
+    def event_summary(event):
+        with lock:
+            known = event_owners(event)
+            per_station = {}
+            for station in known.values():
+                per_station[station] = per_station.get(station, 0) + 1
+        return jsonify({"event": event, "students": len(known), "stations": per_station})
+
+    @hub.get("/events/<event>/export")
+    def export(event):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(store.rows(event))
+        return Response(output.getvalue(), mimetype="text/csv",
+                        headers={"Content-Disposition": f"attachment; filename={event}_attendance.csv"})
+
+    @hub.get("/health")
+    def health():
+        return jsonify({"ok": True})
+
+    hub.store = store
+    return hub
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check-in hub shared by the stations of an event")
+    parser.add_argument("--db", default="hub_attendance.db", help="Attendance database of the hub")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (0.0.0.0 for the whole network)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(argv)
+    hub = create_hub(args.db)
+    print(f"Check-in hub on http://{args.host}:{args.port}, attendance in {args.db}")
+    hub.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# Excel export: keeps an .xlsx copy of the attendance CSV up to date in the background
+#
+# Every interval seconds the exporter reads the rows the attendance writer appended to the CSV since
+# the last look (it remembers the byte offset) and, if there were any, writes the workbook again with
+# openpyxl's write-only (streaming) mode into a temporary file that then replaces the workbook in one
+# step, so Excel or OneDrive never see half a file. Nothing here runs on the scanning threads.
+# If the workbook is open in Excel and can't be replaced, the export is retried next interval.
+#
+# With mark_attended, the event name is also added to the "Attended" column of every student who
+# signed in, in a workbook next to the master list (<master list>_attended.xlsx) that collects the
+# events of every run. The master list itself is never written: staff edit it and the roster watch
+# reads it while the station runs. The marks are written at most every MARK_INTERVAL seconds and
+# when the exporter stops, only if new students signed in, and also through a temporary file.
+
+import csv
+import locale
+import os
+import threading
+import time
+from attendance_store import CSV_HEADER, normalize_row
+from roster import normalize_cin
+from student_record import AttendanceRecord
+
+INTERVAL = 30.0                 # Seconds between exports
+MARK_INTERVAL = 300.0           # Seconds between updates of the Attended workbook
+ATTENDED_HEADER = "Attended"
+ATTENDED_COLUMNS = CSV_HEADER[:4] + [ATTENDED_HEADER]   # CIN, First Name, Last Name, Major, Attended
+
+
+# Function to save a workbook next to path and move it over path
+def save_atomically(workbook, path):
+    temp_path = path + ".tmp"
+    try:
+        workbook.save(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class ExcelExporter:
+    # metrics (a metrics.Metrics) gets the time of every export as the excel_export stage
+    def __init__(self, csv_path, xlsx_path, event, interval=INTERVAL, master_list=None, mark_attended=False, metrics=None):
+        self.csv_path = csv_path
+        self.xlsx_path = xlsx_path
+        self.event = event
+        self.title = event[:31] or "Attendance"     # Excel's limit on sheet names
+        self.interval = interval
+        self.attended_path = os.path.splitext(master_list)[0] + "_attended.xlsx" if master_list and mark_attended else None
+        self.metrics = metrics
+        self.rows = []                  # Every AttendanceRecord exported so far, in CSV order
+        self.offset = 0                 # Bytes of the CSV read so far
+        self.dirty = False              # Rows read that aren't in the workbook yet
+        self.attended = set()           # CINs read from the CSV
+        self.marked = set()             # CINs already marked in the Attended workbook
+        self.marked_at = time.monotonic()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.exports = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="excel-export", daemon=True)
+        self.thread.start()
+
+    # Function to stop the export thread and export one last time
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout=30)
+        self.export(final=True)
+
+    def _run(self):
+        while True:
+            self.export()
+            if self.stopping.wait(self.interval):
+                return
+
+    # Function to read the complete rows appended to the CSV since the last call
+    def _read_new_rows(self):
+        try:
+            with open(self.csv_path, 'rb') as file:
+                file.seek(self.offset)
+                data = file.read()
+        except FileNotFoundError:
+            return []
+        end = data.rfind(b"\n") + 1     # A row still being written is left for next time
+        if not end:
+            return []
+        # Same encoding the CSV is written with (open() without an encoding)
+        text = data[:end].decode(locale.getpreferredencoding(False), errors="replace")
+        rows = list(csv.reader(text.splitlines()))
+        if self.offset == 0 and rows and rows[0][:1] == CSV_HEADER[:1]:
+            rows = rows[1:]
+        self.offset += end
+        return [AttendanceRecord.from_row(normalize_row(row)) for row in rows if len(row) >= 5]
+
+    # Function to export if anything changed; returns the number of new rows
+    # final also brings the Attended workbook up to date, whenever it was last marked
+    def export(self, final=False):
+        try:
+            new_rows = self._read_new_rows()
+        except (OSError, csv.Error) as e:
+            print(f"Error reading attendance for the Excel export: {e}")
+            return 0
+        if new_rows:
+            self.rows.extend(new_rows)
+            self.attended.update(normalize_cin(record.cin) for record in new_rows)
+            self.dirty = True
+        mark = bool(self.attended_path and self.attended - self.marked) and \
+            (final or time.monotonic() - self.marked_at >= MARK_INTERVAL)
+        if not self.dirty and not mark:
+            return 0
+
+        start = time.perf_counter()
+        try:
+            import openpyxl                                     # Imported on first export, see roster.py
+            if self.dirty:
+                self._write_workbook(openpyxl)
+                self.dirty = False
+                self.exports += 1
+            if mark:
+                self._mark_attended(openpyxl)
+                self.marked_at = time.monotonic()
+        except ImportError as e:
+            print(f"Excel export needs openpyxl: {e}")
+            self.stopping.set()
+            return 0
+        except PermissionError:
+            print(f"{self.xlsx_path} or {self.attended_path} is open in another program, exporting again in {self.interval:.0f} s")
+            return 0
+        except OSError as e:
+            print(f"Error exporting attendance to Excel: {e}")
+            return 0
+        if self.metrics is not None:
+            self.metrics.observe("excel_export", time.perf_counter() - start)
+        return len(new_rows)
+
+    def _write_workbook(self, openpyxl):
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=self.title)
+        sheet.freeze_panes = "A2"
+        sheet.append(CSV_HEADER)
+        for record in self.rows:
+            sheet.append(list(record))
+        save_atomically(workbook, self.xlsx_path)
+
+    # Function to add the event to the Attended column of every student who signed in
+    # Earlier events are read back from the workbook, then the whole workbook is written again
+    def _mark_attended(self, openpyxl):
+        students = {}                   # cin -> [CIN, First Name, Last Name, Major, Attended]
+        if os.path.exists(self.attended_path):
+            workbook = openpyxl.load_workbook(self.attended_path, read_only=True)
+            try:
+                for values in workbook.active.iter_rows(min_row=2, values_only=True):
+                    row = ["" if value is None else str(value) for value in values[:len(ATTENDED_COLUMNS)]]
+                    if row and normalize_cin(row[0]):
+                        students[normalize_cin(row[0])] = row + [""] * (len(ATTENDED_COLUMNS) - len(row))
+            finally:
+                workbook.close()
+        for record in self.rows:
+            cin = normalize_cin(record.cin)
+            row = students.setdefault(cin, [cin, record.first_name, record.last_name, record.major, ""])
+            events = [event for event in row[4].split("; ") if event]
+            if self.event not in events:
+                row[4] = "; ".join(events + [self.event])
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=ATTENDED_HEADER)
+        sheet.freeze_panes = "A2"
+        sheet.append(ATTENDED_COLUMNS)
+        for row in students.values():
+            sheet.append(row)
+        save_atomically(workbook, self.attended_path)
+        self.marked = set(self.attended)
@@ -0,0 +1,153 @@
+# Hub client: the station's side of checkin_hub.py
+#
+# Every tap that passes the station's own check is sent to the hub, which answers "accepted" or
+# "duplicate" (signed in at another station). When the hub can't be reached the tap is accepted
+# locally and queued; a background thread sends the queue in batches once the hub answers again,
+# and reports any of those taps that turn out to be duplicates (on_late_duplicate). While the hub
+# is down, taps don't wait for it: after a failure the hub is only tried again by the background
+# thread, every RETRY_SECONDS.
+
+from collections import deque
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit, quote
+
+TIMEOUT = 0.5                   # Seconds a tap waits for the hub before it is queued instead
+RETRY_SECONDS = 2.0             # Between attempts to reach a hub that is down
+BATCH_ROWS = 500                # Queued check-ins sent per request
+
+ACCEPTED = "accepted"
+DUPLICATE = "duplicate"
+QUEUED = "queued"
+
+
+# Function to build the row sent to the hub; the reader column is "station/reader"
+def hub_row(row, station):
+    row = [str(value) if value is not None else "" for value in row]
+    row[6] = f"{station}/{row[6]}"
+    return row
+
+
+class HubClient:
+    # on_late_duplicate(cin, station) is called for queued taps the hub later answers "duplicate" for
+    def __init__(self, url, event, station, on_late_duplicate=None, timeout=TIMEOUT, metrics=None):
+        parts = urlsplit(url if "://" in url else f"http://{url}")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = f"{parts.path.rstrip('/')}/events/{quote(event, safe='')}/checkins"
+        self.station = station
+        self.timeout = timeout
+        self.on_late_duplicate = on_late_duplicate
+        self.metrics = metrics
+        self.outbox = deque()           # Rows accepted locally, not yet answered by the hub
+        self.lock = threading.Lock()
+        self.connections = threading.local()    # One keep-alive connection per thread
+        self.online = True
+        self.stats = {ACCEPTED: 0, DUPLICATE: 0, QUEUED: 0, "late_duplicates": 0}
+        self.stopping = threading.Event()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="hub-client", daemon=True)
+        self.thread.start()
+
+    # Function to stop the background thread after one last try to send the queue
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.timeout * 4 + 1)
+
+    def pending(self):
+        return len(self.outbox)
+
+    # Function to send rows (CSV layout) and get one answer per row; raises OSError if the hub can't be reached
+    def _post(self, rows):
+        connection = getattr(self.connections, "connection", None)
+        if connection is None:
+            connection = self.connections.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        body = json.dumps({"station": self.station, "checkins": [hub_row(row, self.station) for row in rows]})
+        try:
+            connection.request("POST", self.path, body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            answer = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            self.connections.connection = None
+            raise OSError(f"Check-in hub unreachable: {e}")
+        if response.status != 200:
+            raise OSError(f"Check-in hub answered {response.status}: {answer[:200]!r}")
+        answer = json.loads(answer)
+        return list(zip(answer["results"], answer["stations"]))
+
+    # Function to check a tap in with the hub; returns ACCEPTED, DUPLICATE, or QUEUED when the hub is down
+    def check_in(self, row):
+        if not self.online:
+            return self._queue([row])
+        start = time.perf_counter()
+        try:
+            (result, _), = self._post([row])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"{e}. Check-ins are queued until it is back.")
+            self._went_offline()
+            return self._queue([row])
+        if self.metrics is not None:
+            self.metrics.observe("hub", time.perf_counter() - start)
+        result = DUPLICATE if result == DUPLICATE else ACCEPTED
+        with self.lock:
+            self.stats[result] += 1
+        return result
+
+    # Function to queue rows for the background thread, e.g. the rows recorded before the station started
+    def queue_rows(self, rows):
+        self._queue(rows)
+        self.wake.set()
+
+    def _queue(self, rows):
+        with self.lock:
+            self.outbox.extend(rows)
+            self.stats[QUEUED] += len(rows)
+        return QUEUED
+
+    def _went_offline(self):
+        with self.lock:
+            self.online = False
+
+    def _run(self):
+        while True:
+            self.wake.wait(RETRY_SECONDS)
+            self.wake.clear()
+            self._flush()
+            if self.stopping.is_set():
+                return
+
+    # Function to send the queue in batches, oldest first; stops at the first failure
+    def _flush(self):
+        while True:
+            with self.lock:
+                batch = [self.outbox[i] for i in range(min(BATCH_ROWS, len(self.outbox)))]
+            if not batch:
+                with self.lock:
+                    if not self.outbox and not self.online:
+                        self.online = True
+                        print("Check-in hub reachable again")
+                return
+            try:
+                answers = self._post(batch)
+            except (OSError, ValueError, KeyError) as e:
+                if self.online:
+                    print(f"{e}. Check-ins are queued until it is back.")
+                self._went_offline()
+                return
+            with self.lock:
+                for _ in batch:
+                    self.outbox.popleft()
+            for row, (result, station) in zip(batch, answers):
+                if result == DUPLICATE:
+                    with self.lock:
+                        self.stats["late_duplicates"] += 1
+                    if self.on_late_duplicate is not None:
+                        self.on_late_duplicate(str(row[0]), station)
@@ -0,0 +1,279 @@
+# Metrics: timing of every check-in stage, for finding where a backed-up line spends its time
+#
+# Each stage (connect, read, parse, dedup, persist, notify, csv_commit, ui_update, and "tap" for the
+# whole tap from entering the field to being shown) feeds a histogram with fixed buckets. Besides
+# the running totals, every histogram keeps the last WINDOW seconds in SLOTS slices, which is what
+# the live percentiles and taps per minute are computed from.
+#
+# The numbers come out three ways:
+#   - a Prometheus text file, rewritten every interval seconds (write_prometheus)
+#   - optionally one JSON line per tap with the time spent in each stage (trace_path)
+#   - summary(), which the GUI shows in its metrics panel
+
+import bisect
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import os
+import threading
+import time
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)   # Seconds
+WINDOW = 60.0                   # Seconds covered by the rolling histograms
+SLOTS = 12                      # Slices of the window, the oldest is dropped as time moves on
+STAGES = ("connect", "read", "parse", "dedup", "persist", "notify", "csv_commit", "ui_update", "tap")
+
+
+class StageHistogram:
+    def __init__(self, window=WINDOW, slots=SLOTS):
+        self.counts = [0] * (len(BUCKETS) + 1)  # Since start, the last bucket is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.slot_seconds = window / slots
+        self.slots = slots
+        self.recent = deque()           # (slot number, counts) for the last window
+
+    def observe(self, seconds, now):
+        bucket = bisect.bisect_left(BUCKETS, seconds)
+        self.counts[bucket] += 1
+        self.total += seconds
+        self.count += 1
+        slot = int(now // self.slot_seconds)
+        if not self.recent or self.recent[-1][0] != slot:
+            self.recent.append((slot, [0] * (len(BUCKETS) + 1)))
+        self.recent[-1][1][bucket] += 1
+        self._expire(now)
+
+    def _expire(self, now):
+        oldest = int(now // self.slot_seconds) - self.slots + 1
+        while self.recent and self.recent[0][0] < oldest:
+            self.recent.popleft()
+
+    def rolling_counts(self, now):
+        self._expire(now)
+        counts = [0] * (len(BUCKETS) + 1)
+        for _, slot_counts in self.recent:
+            for i, value in enumerate(slot_counts):
+                counts[i] += value
+        return counts
+
+    # Function to estimate a percentile of the last window, interpolating inside the bucket
+    def percentile(self, share, now):
+        counts = self.rolling_counts(now)
+        total = sum(counts)
+        if not total:
+            return None
+        target = share * total
+        seen = 0
+        for i, value in enumerate(counts):
+            if value and seen + value >= target:
+                lower = BUCKETS[i - 1] if i > 0 else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (target - seen) / value
+            seen += value
+        return BUCKETS[-1]
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms = {stage: StageHistogram() for stage in STAGES}
+        self.counters = {}              # (name, labels) -> value
+        self.gauges = {}                # name -> function returning the current value
+        self.open_traces = {}           # CIN -> traces of that student's taps still going through the pipeline, oldest first
+        self.finished_traces = []       # Traces waiting to be written
+        self.lock = threading.Lock()
+        self.path = None
+        self.trace_path = None
+        self.interval = 15.0
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def observe(self, stage, seconds, trace=None):
+        now = time.monotonic()
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = StageHistogram()
+            histogram.observe(seconds, now)
+            if trace is not None:
+                trace["stages_ms"][stage] = round(trace["stages_ms"].get(stage, 0.0) + seconds * 1000, 3)
+
+    # Times the body of a with statement as one stage
+    @contextmanager
+    def timer(self, stage, trace=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, trace)
+
+    def count(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    # Function to publish a value that is read when the metrics are written, e.g. the pipeline backlog
+    def gauge(self, name, function):
+        self.gauges[name] = function
+
+    # Function to start the trace of a tap; started_at is the time.perf_counter() of the tag entering the field
+    def start_tap(self, reader_name, started_at):
+        return {"time": datetime.now().isoformat(timespec="milliseconds"), "reader": reader_name,
+                "started_at": started_at, "stages_ms": {}}
+
+    # Function to let later stages, which only see the student, find the trace by CIN
+    # A second tap of a student still in flight gets a trace of its own, behind the first one
+    def bind(self, cin, trace):
+        trace["cin"] = cin
+        with self.lock:
+            self.open_traces.setdefault(cin, []).append(trace)
+
+    # The trace of the student's tap being logged (see accept), else of the oldest tap still open
+    def trace_for(self, cin):
+        with self.lock:
+            traces = self.open_traces.get(cin)
+            if not traces:
+                return None
+            return next((trace for trace in traces if trace.get("accepted")), traces[0])
+
+    # The trace of the student's next tap to go through the duplicate check
+    def pending_trace_for(self, cin):
+        with self.lock:
+            return next((trace for trace in self.open_traces.get(cin, ()) if not trace.get("accepted")), None)
+
+    # Function to mark a tap as past the duplicate check, it is being logged
+    def accept(self, trace):
+        if trace is not None:
+            trace["accepted"] = True
+
+    # Function to close a trace: result is "logged", "duplicate", "empty" or "failed"
+    def finish_tap(self, trace, result):
+        if trace is None:
+            return
+        elapsed = time.perf_counter() - trace.pop("started_at")
+        self.observe("tap", elapsed)
+        self.count("taps_total", result=result)
+        trace.pop("accepted", None)
+        trace["result"] = result
+        trace["total_ms"] = round(elapsed * 1000, 3)
+        with self.lock:
+            traces = self.open_traces.get(trace.get("cin"), [])
+            for index, open_trace in enumerate(traces):
+                if open_trace is trace:
+                    del traces[index]
+                    break
+            if not traces:
+                self.open_traces.pop(trace.get("cin"), None)
+            if self.trace_path is not None:
+                self.finished_traces.append(trace)
+
+    # Numbers for the GUI panel; latencies in milliseconds, None when there were no taps in the window
+    def summary(self):
+        now = time.monotonic()
+        with self.lock:
+            tap = self.histograms["tap"]
+            taps = sum(tap.rolling_counts(now))
+            stages = {}
+            for stage, histogram in self.histograms.items():
+                p95 = histogram.percentile(0.95, now)
+                if p95 is not None and stage != "tap":
+                    stages[stage] = p95 * 1000
+            p50 = tap.percentile(0.50, now)
+            p95 = tap.percentile(0.95, now)
+        return {
+            "taps_per_minute": taps * 60.0 / WINDOW,
+            "p50_ms": p50 * 1000 if p50 is not None else None,
+            "p95_ms": p95 * 1000 if p95 is not None else None,
+            "stage_p95_ms": stages,
+            "gauges": self._read_gauges(),
+        }
+
+    def _read_gauges(self):
+        values = {}
+        for name, function in list(self.gauges.items()):
+            try:
+                values[name] = function()
+            except Exception as e:
+                print(f"Error reading metric {name}: {e}")
+        return values
+
+    # Function to render everything in the Prometheus text exposition format
+    def prometheus_text(self):
+        now = time.monotonic()
+        lines = ["# HELP attendance_stage_seconds Time spent in each check-in stage",
+                 "# TYPE attendance_stage_seconds histogram"]
+        with self.lock:
+            for stage, histogram in self.histograms.items():
+                cumulative = 0
+                for bound, value in zip(BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += value
+                    lines.append(f'attendance_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'attendance_stage_seconds_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'attendance_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+            for share in (0.5, 0.95):
+                lines.append(f"# TYPE attendance_stage_seconds_p{int(share * 100)} gauge")
+                for stage, histogram in self.histograms.items():
+                    value = histogram.percentile(share, now)
+                    if value is not None:
+                        lines.append(f'attendance_stage_seconds_p{int(share * 100)}{{stage="{stage}"}} {value:.6f}')
+            counters = sorted(self.counters.items())
+            taps = sum(self.histograms["tap"].rolling_counts(now))
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE attendance_{name} counter")
+            for (counter, labels), value in counters:
+                if counter == name:
+                    label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                    lines.append(f"attendance_{name}{{{label_text}}} {value}" if label_text else f"attendance_{name} {value}")
+        lines.append("# TYPE attendance_taps_per_minute gauge")
+        lines.append(f"attendance_taps_per_minute {taps * 60.0 / WINDOW:.2f}")
+        for name, value in sorted(self._read_gauges().items()):
+            lines.append(f"# TYPE attendance_{name} gauge")
+            lines.append(f"attendance_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    # Function to write the Prometheus file atomically, so a scraper never sees half of it
+    def write_prometheus(self, path):
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w') as file:
+            file.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+    def write_traces(self):
+        with self.lock:
+            traces, self.finished_traces = self.finished_traces, []
+        if traces:
+            with open(self.trace_path, 'a') as file:
+                file.writelines(json.dumps(trace) + "\n" for trace in traces)
+
+    # Function to start writing the metrics file every interval seconds (and the trace, if trace_path is set)
+    def start(self, path, interval=15.0, trace_path=None):
+        self.path = path
+        self.interval = interval
+        self.trace_path = trace_path
+        self.thread = threading.Thread(target=self._run, name="metrics", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        last_write = 0.0
+        while not self.stopping.wait(1.0):
+            try:
+                if self.trace_path is not None:
+                    self.write_traces()
+                if time.monotonic() - last_write >= self.interval:
+                    self.write_prometheus(self.path)
+                    last_write = time.monotonic()
+            except OSError as e:
+                print(f"Error writing metrics: {e}")
+
+    # Function to stop the writer thread and write one last time
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+            try:
+                if self.trace_path is not None:
+                    self.write_traces()
+                self.write_prometheus(self.path)
+            except OSError as e:
+                print(f"Error writing metrics: {e}")
@@ -0,0 +1,26 @@
+# Reader backends: where the reader sessions come from
+#
+#   pcsc  real readers through pyscard (reader_session.ReaderPool)
+#   sim   simulated readers holding NTAG215 page images (sim_reader.SimulatedReaderPool)
+#
+# Both pools have start(), stop() and all_sessions(), call on_added(session) / on_removed(session),
+# and list in NO_CARD_ERRORS the exceptions their connections raise when the tag is gone.
+# Their sessions have reader_name, lock, card_present, open(), close(), ensure_connected() and
+# next_event(timeout), which returns one of the events below.
+
+INSERTED = "INSERTED"
+REMOVED = "REMOVED"
+NO_READER = "NO_READER"
+
+BACKENDS = ("pcsc", "sim")
+
+
+# Function to create the reader pool of a backend; only that backend's modules are imported
+def create_reader_pool(backend, on_added, on_removed, **options):
+    if backend == "pcsc":
+        from reader_session import ReaderPool
+        return ReaderPool(on_added, on_removed)
+    if backend == "sim":
+        from sim_reader import SimulatedReaderPool
+        return SimulatedReaderPool(on_added, on_removed, **options)
+    raise ValueError(f"Unknown reader backend: {backend}")
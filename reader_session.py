@@ -0,0 +1,178 @@
+# Reader session: keeps the PC/SC context and the reader connection open across taps
+# Card insert and remove events come from pyscard's CardMonitor (SCardGetStatusChange underneath)
+# instead of reconnecting and sleeping in a loop. A card is handed out once when it enters the field,
+# so a tag left resting on the reader is not read again until it is removed and tapped again.
+
+import queue                                                    # Import queue to pass card events to the NFC thread
+import threading
+import time
+from smartcard.System import readers
+from smartcard.CardMonitoring import CardMonitor, CardObserver
+from smartcard.ReaderMonitoring import ReaderMonitor, ReaderObserver
+from smartcard.Exceptions import NoCardException
+from reader_backend import INSERTED, REMOVED, NO_READER
+
+
+class ReaderSession(CardObserver):
+    def __init__(self, reader_name=None):
+        self.reader_name = reader_name  # None picks the first reader, like connectReader always did
+        self.reader = None
+        self.connection = None          # Created once per reader, keeps its PC/SC context between taps
+        self.connected = False          # True while connected to the card currently in the field
+        self.card_present = False
+        self.connect_seconds = 0.0      # How long connecting to the last card took
+        self.monitor = None
+        self.closed = False             # Set once the reader has been unplugged
+        self.events = queue.Queue()
+        self.lock = threading.RLock()   # Serializes APDUs from the NFC thread and the GUI (tag writes)
+
+    # Function to pick the reader and start watching it for cards
+    def open(self):
+        with self.lock:
+            if self.reader is not None:
+                return True
+            if self.closed:
+                return False
+            available = readers()
+            if self.reader_name is not None:
+                available = [r for r in available if str(r) == self.reader_name]
+            if not available:
+                return False
+            self.reader = available[0]
+            self.reader_name = str(self.reader)
+            self.connection = self.reader.createConnection()
+            self.monitor = CardMonitor()
+            self.monitor.addObserver(self)          # Reports any card already on the reader straight away
+            return True
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            if self.monitor is not None:
+                self.monitor.deleteObserver(self)
+                self.monitor = None
+            self._disconnect()
+            self.connection = None
+            self.reader = None
+            self.card_present = False
+
+    # Called by the CardMonitor thread
+    def update(self, observable, actions):
+        added, removed = actions
+        for card in removed:
+            if card.reader == self.reader_name:
+                self.events.put(REMOVED)
+        for card in added:
+            if card.reader == self.reader_name:
+                self.events.put(INSERTED)
+
+    def _disconnect(self):
+        if self.connected:
+            try:
+                self.connection.disconnect()
+            except Exception as e:
+                print(f"Error disconnecting from card: {e}")
+            self.connected = False
+
+    # Function to connect to the card in the field, reusing the connection object
+    def ensure_connected(self):
+        with self.lock:
+            if not self.card_present:
+                raise NoCardException("No card in the field", 0)
+            if not self.connected:
+                self.connection.connect()
+                self.connected = True
+            return self.connection
+
+    # Function to wait for the next card event
+    # Returns (INSERTED, connection), (REMOVED, None), (NO_READER, None) or (None, None) on timeout
+    def next_event(self, timeout=None):
+        if not self.open():
+            time.sleep(timeout or 1)                # Check for a reader again after the timeout
+            return NO_READER, None
+        try:
+            event = self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None, None
+
+        with self.lock:
+            if event == REMOVED:
+                self._disconnect()
+                self.card_present = False
+                return REMOVED, None
+            self.card_present = True
+            try:
+                started = time.perf_counter()
+                connection = self.ensure_connected()
+                self.connect_seconds = time.perf_counter() - started
+                return INSERTED, connection
+            except Exception as e:
+                # The card left the field before we could connect, its REMOVED event follows
+                print(f"Failed to connect to card: {e}")
+                self.card_present = False
+                return None, None
+
+
+# Reader pool: one ReaderSession per attached reader
+# Readers plugged in or removed mid-event are picked up through pyscard's ReaderMonitor.
+class ReaderPool(ReaderObserver):
+    NO_CARD_ERRORS = (NoCardException,)
+
+    # on_added(session) and on_removed(session) are called when a reader appears or goes away
+    def __init__(self, on_added, on_removed):
+        self.on_added = on_added
+        self.on_removed = on_removed
+        self.sessions = {}              # reader name -> ReaderSession
+        self.lock = threading.Lock()
+        self.monitor = None
+
+    def start(self):
+        # Add the readers attached right now before returning, the monitor then reports changes
+        self._add(readers())
+        self.monitor = ReaderMonitor()
+        self.monitor.addObserver(self)
+
+    def stop(self):
+        if self.monitor is not None:
+            self.monitor.deleteObserver(self)
+            self.monitor = None
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def all_sessions(self):
+        with self.lock:
+            return list(self.sessions.values())
+
+    # Called by the ReaderMonitor thread
+    def update(self, observable, actions):
+        added, removed = actions
+        self._remove(removed)
+        self._add(added)
+
+    def _add(self, reader_list):
+        for reader in reader_list:
+            name = str(reader)
+            with self.lock:
+                if name in self.sessions:
+                    continue
+                session = ReaderSession(name)
+                self.sessions[name] = session
+            if not session.open():
+                with self.lock:
+                    self.sessions.pop(name, None)
+                continue
+            print(f"Reader attached: {name}")
+            self.on_added(session)
+
+    def _remove(self, reader_list):
+        for reader in reader_list:
+            with self.lock:
+                session = self.sessions.pop(str(reader), None)
+            if session is None:
+                continue
+            print(f"Reader removed: {session.reader_name}")
+            session.close()
+            self.on_removed(session)
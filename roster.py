@@ -0,0 +1,205 @@
+# Roster: in-memory copy of the master list of students
+# The workbook is read once in read-only (streaming) mode and indexed by row number and by CIN,
+# so enrolling a tag, filling the Excel Data tab and searching for a CIN never re-open the file.
+# The workbook is only read again when the file's modification time or size changes, and with a
+# roster_snapshot.RosterSnapshot even that usually comes from the saved snapshot instead of openpyxl.
+# A reload is compared with the rows already loaded (RosterDiff): the CIN index and the search index
+# only take the students that were added, removed or changed, and the diff is logged.
+# The search index over CIN, names and major is built and updated on a background thread.
+# Lookups answer from the rows already loaded and only read the workbook when nothing is loaded yet;
+# reloading is left to refresh(), which the roster watch (roster_watch.py) calls on its own thread.
+
+from concurrent.futures import ThreadPoolExecutor
+import os                                                       # Import the OS module for file modification times
+import threading                                                # Import threading so the NFC thread and the GUI can share the roster
+from roster_search import RosterSearchIndex, entry_key, keyed_entries
+from student_record import intern_text                          # Import the string interning shared with the attendance records
+
+DIFF_LOG_LINES = 20             # Students listed per kind of change when a reload is logged
+
+
+# Turns a CIN from the workbook or from a tag into the key used by the CIN index
+def normalize_cin(cin):
+    if cin is None:
+        return ""
+    if isinstance(cin, float) and cin.is_integer():             # Excel stores numbers as floats, 301234567.0 -> "301234567"
+        cin = int(cin)
+    return str(cin).strip()
+
+
+# What changed between two loads of the master list, student by student (keyed by CIN)
+class RosterDiff:
+    def __init__(self, added, removed, changed, moved, initial=False):
+        self.initial = initial          # The first load: every student is "added"
+        self.added = added              # Entries of new students
+        self.removed = removed          # Entries of students no longer on the list
+        self.changed = changed          # (old entry, new entry) of students whose names or major changed
+        self.moved = moved              # (old entry, new entry) of students now on another row, nothing else changed
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed)
+
+    def summary(self):
+        moved = f", {len(self.moved)} moved to another row" if self.moved else ""
+        return f"{len(self.added)} added, {len(self.removed)} removed, {len(self.changed)} changed{moved}"
+
+    # Lines for the log, at most limit students per kind of change
+    def lines(self, limit=DIFF_LOG_LINES):
+        def describe(entry):
+            row, firstName, lastName, cin, major = entry
+            return f"row {row}: {cin} {firstName} {lastName}, {major}"
+        lines = []
+        for sign, entries in (("+", self.added), ("-", self.removed),
+                              ("~", [f"{describe(old)} -> {describe(new)}" for old, new in self.changed])):
+            lines.extend(f"  {sign} {entry if isinstance(entry, str) else describe(entry)}" for entry in entries[:limit])
+            if len(entries) > limit:
+                lines.append(f"  {sign} ... {len(entries) - limit} more")
+        return lines
+
+
+# Function to compare two keyed_entries() maps
+def diff_entries(old, current):
+    removed = [entry for key, entry in old.items() if key not in current]
+    added, changed, moved = [], [], []
+    for key, entry in current.items():
+        before = old.get(key)
+        if before is None:
+            added.append(entry)
+        elif before[1:] != entry[1:]:
+            changed.append((before, entry))
+        elif before[0] != entry[0]:
+            moved.append((before, entry))
+    return RosterDiff(added, removed, changed, moved)
+
+
+class Roster:
+    # on_change(diff) is called whenever a reload replaced the rows, on the thread that reloaded (see roster_watch.py)
+    # on_indexed() is called once the search index has taken a reload, on the index thread
+    def __init__(self, path, snapshot=None, on_change=None, on_indexed=None):
+        self.path = path
+        self.snapshot = snapshot        # RosterSnapshot, or None to always parse the workbook
+        self.on_change = on_change
+        self.on_indexed = on_indexed
+        self.signature = None           # (modification time, size) of the workbook that is currently loaded
+        self.rows = []                  # (row, firstName, lastName, cin, major) in sheet order, from row 2 on
+        self.by_cin = {}                # Student key (roster_search.entry_key, the normalized CIN) -> entry in self.rows
+        self.lock = threading.Lock()
+        self.reload_lock = threading.Lock()     # One reload at a time; lookups only wait for the swap
+        self.search_index = RosterSearchIndex()
+        # Index updates run one after another on their own thread, in the order the reloads happened
+        self.index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="roster-index")
+
+    # Function to get what identifies the workbook's current contents without reading it
+    def file_signature(self):
+        stat = os.stat(self.path)       # Raises FileNotFoundError if the master list is gone
+        return stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """Re-read the workbook if it changed on disk. Returns the RosterDiff of a reload, or None."""
+        if self.file_signature() == self.signature:
+            return None
+        with self.reload_lock:
+            signature = self.file_signature()
+            if signature == self.signature:
+                return None             # Reloaded by another thread meanwhile
+            # Parsed outside self.lock: lookups keep answering from the loaded rows meanwhile
+            if self.snapshot is not None:
+                rows = self.snapshot.load(self.path, self._read_workbook)
+            else:
+                rows = self._read_workbook()
+            keyed = keyed_entries(rows)
+            first = self.signature is None
+            with self.lock:
+                if first:
+                    diff = RosterDiff(list(keyed.values()), [], [], [], initial=True)
+                    self.by_cin = keyed
+                else:
+                    diff = diff_entries(self.by_cin, keyed)
+                    for entry in diff.removed:
+                        del self.by_cin[entry_key(entry)]
+                    for entry in diff.added:
+                        self.by_cin[entry_key(entry)] = entry
+                    for _, entry in diff.changed + diff.moved:
+                        self.by_cin[entry_key(entry)] = entry
+                self.rows = rows
+                self.signature = signature
+        if first:
+            print(f"Loaded {len(rows)} rows from master list: {self.path}")
+            # Indexing a large roster takes a moment, searches made meanwhile wait for it on the index lock
+            # A copy: later reloads update self.by_cin in place while the build may still be reading it
+            self.index_executor.submit(self._index, self.search_index.build, dict(keyed)).add_done_callback(self._index_done)
+        elif not diff and not diff.moved:
+            # e.g. only other columns were edited, or rows without a student; the rows shown are still replaced
+            print(f"Master list saved again, no students changed: {self.path}")
+        else:
+            print(f"Master list changed ({len(rows)} rows): {diff.summary()}")
+            for line in diff.lines():
+                print(line)
+            self.index_executor.submit(self._index, self.search_index.apply, diff).add_done_callback(self._index_done)
+        if self.on_change is not None:
+            self.on_change(diff)
+        return diff
+
+    # Function to drop index updates that haven't started; waits for the one running
+    def close(self):
+        self.index_executor.shutdown(wait=True, cancel_futures=True)
+
+    def _index(self, update, change):
+        update(change)
+        print(f"Search index updated: {len(self.search_index.entries)} students")
+
+    # Errors raised on the index thread would otherwise stay in the future nobody reads
+    def _index_done(self, future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            print(f"Error updating the search index: {future.exception()}")
+        elif self.on_indexed is not None:
+            self.on_indexed()
+
+    # Function to load the workbook on the first lookup; later lookups use whatever is loaded
+    def _loaded(self):
+        if self.signature is None:
+            self.refresh()
+
+    def _read_workbook(self):
+        import openpyxl                                         # Imported on first read, it is slow to import and headless stations may never need it
+        workbook = openpyxl.load_workbook(self.path, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            rows = []
+            # Only the first four columns are used: First Name, Last Name, CIN, Major
+            for rowNumber, values in enumerate(sheet.iter_rows(min_row=2, max_col=4, values_only=True), start=2):
+                values = tuple(values) + (None,) * (4 - len(values))
+                firstName, lastName, cin, major = values[:4]
+                rows.append((rowNumber, firstName, lastName, cin, intern_text(major)))  # One string per major
+            # Read-only sheets can report trailing rows that hold no data at all
+            while rows and not any(rows[-1][1:]):
+                rows.pop()
+            return rows
+        finally:
+            workbook.close()                                    # Read-only workbooks keep the file open until closed
+
+    def get_row(self, rowNumber):
+        """Return (row, firstName, lastName, cin, major) for a sheet row, or None."""
+        self._loaded()
+        rows = self.rows
+        if 2 <= rowNumber < len(rows) + 2:
+            return rows[rowNumber - 2]  # Rows are read consecutively from sheet row 2
+        return None
+
+    def find_cin(self, cin):
+        """Return (row, firstName, lastName, cin, major) for a CIN, or None."""
+        self._loaded()
+        key = normalize_cin(cin)
+        with self.lock:                 # Never half way through applying a reload
+            return self.by_cin.get(key) if key else None
+
+    def search(self, query, limit=500):
+        """Return up to limit (row, firstName, lastName, cin, major) matching every word of the query."""
+        self._loaded()
+        return self.search_index.search(query, limit)
+
+    def all_rows(self):
+        self._loaded()
+        return self.rows
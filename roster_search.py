@@ -0,0 +1,213 @@
+# Roster search: prefix and fuzzy search over CIN, first name, last name and major
+#
+# Every field is split into lowercase tokens. A sorted list of the distinct tokens answers prefix
+# queries with a binary search, and a trigram index over the same tokens finds near matches for typos.
+# Each token points to the students that contain it. A query matches a student when every word of the
+# query is a prefix of (or, failing that, close to) one of the student's tokens. Close means a few
+# typos apart (typo_distance); numbers such as CINs only ever match exactly or as a prefix.
+#
+# Students are keyed by CIN (by sheet row when a row has no CIN). apply() takes the diff the roster
+# computed when the master list changed (roster.RosterDiff) and only re-tokenizes the students that
+# were added, removed or changed.
+
+import bisect
+from itertools import islice
+import re
+import threading
+
+MAX_RESULTS = 500
+WIDE_PREFIX = 1000              # Prefixes matching more tokens than this are checked row by row instead
+FUZZY_MIN_LENGTH = 3            # Shorter words are only matched as prefixes
+FUZZY_CANDIDATES = 200          # Tokens sharing the most trigrams with a word that are checked for typos
+LONG_WORD = 6                   # Words this long may have two typos, shorter ones one
+
+
+def tokenize(*fields):
+    tokens = set()
+    for field in fields:
+        if field is None:
+            continue
+        if isinstance(field, float) and field.is_integer():
+            field = int(field)
+        tokens.update(re.findall(r"\w+", str(field).lower()))
+    return tokens
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Edits (insert, delete, replace, swap two neighbours) between two words, or bound + 1 once it's more
+def typo_distance(a, b, bound):
+    if abs(len(a) - len(b)) > bound:
+        return bound + 1
+    before, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > bound:
+            return bound + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+def entry_key(entry):
+    cin = entry[3]
+    if cin is None or str(cin).strip() == "":
+        return ("row", entry[0])        # Not a string, so no typed CIN can match it
+    if isinstance(cin, float) and cin.is_integer():
+        cin = int(cin)
+    return str(cin).strip()
+
+
+# Function to key the students of a roster; first occurrence wins, like a top-down search
+# Rows without any data are left out
+def keyed_entries(rows):
+    keyed = {}
+    for entry in rows:
+        if any(entry[1:]):
+            keyed.setdefault(entry_key(entry), entry)
+    return keyed
+
+
+class RosterSearchIndex:
+    def __init__(self):
+        self.entries = {}               # key -> (row, firstName, lastName, cin, major)
+        self.entry_tokens = {}          # key -> tokens of that entry
+        self.postings = {}              # token -> keys of the entries containing it
+        self.vocabulary = []            # Distinct tokens, sorted, for prefix lookups
+        self.trigram_index = {}         # trigram -> tokens containing it
+        self.order = []                 # Keys in sheet order
+        self.lock = threading.Lock()
+
+    # Function to index every student of a roster, replacing what was indexed; keyed is keyed_entries(rows)
+    def build(self, keyed):
+        with self.lock:
+            self.entries, self.entry_tokens, self.postings, self.trigram_index = {}, {}, {}, {}
+            self._build(keyed)
+            self.order = sorted(self.entries, key=lambda key: self.entries[key][0])
+
+    # Function to apply a roster.RosterDiff: only the students in it are re-tokenized
+    def apply(self, diff):
+        with self.lock:
+            for entry in diff.removed:
+                self._remove(entry_key(entry))
+            for old, entry in diff.changed:
+                self._remove(entry_key(old))
+                self._add(entry_key(entry), entry)
+            for entry in diff.added:
+                self._remove(entry_key(entry))   # Nothing to remove unless the index missed an earlier diff
+                self._add(entry_key(entry), entry)
+            for _, entry in diff.moved:
+                if entry_key(entry) in self.entries:
+                    self.entries[entry_key(entry)] = entry   # Same student on another row, tokens are unchanged
+                else:
+                    self._add(entry_key(entry), entry)
+            self.order = sorted(self.entries, key=lambda key: self.entries[key][0])
+
+    def _build(self, entries):
+        self.entries = dict(entries)
+        for key, entry in entries.items():
+            tokens = tokenize(*entry[1:])
+            self.entry_tokens[key] = tokens
+            for token in tokens:
+                self.postings.setdefault(token, set()).add(key)
+        self.vocabulary = sorted(self.postings)
+        for token in self.vocabulary:
+            for gram in trigrams(token):
+                self.trigram_index.setdefault(gram, set()).add(token)
+
+    def _add(self, key, entry):
+        self.entries[key] = entry
+        tokens = tokenize(*entry[1:])
+        self.entry_tokens[key] = tokens
+        for token in tokens:
+            keys = self.postings.get(token)
+            if keys is None:
+                keys = self.postings[token] = set()
+                bisect.insort(self.vocabulary, token)
+                for gram in trigrams(token):
+                    self.trigram_index.setdefault(gram, set()).add(token)
+            keys.add(key)
+
+    # Keys that were never indexed are skipped, e.g. after a build that failed
+    def _remove(self, key):
+        if self.entries.pop(key, None) is None:
+            return
+        for token in self.entry_tokens.pop(key):
+            keys = self.postings[token]
+            keys.discard(key)
+            if not keys:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+                for gram in trigrams(token):
+                    tokens = self.trigram_index[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self.trigram_index[gram]
+
+    def _prefix_range(self, word):
+        start = bisect.bisect_left(self.vocabulary, word)
+        end = bisect.bisect_left(self.vocabulary, word + "\U0010ffff", start)   # First token past the prefix
+        return start, end
+
+    def _prefix_keys(self, start, end):
+        return set().union(*(self.postings[token] for token in islice(self.vocabulary, start, end)))
+
+    def _has_prefix(self, key, word):
+        return any(token.startswith(word) for token in self.entry_tokens[key])
+
+    # Students with a token a typo or two away from word; only the tokens sharing most trigrams are compared
+    def _fuzzy_keys(self, word):
+        shared = {}
+        for gram in trigrams(word):
+            for token in self.trigram_index.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        bound = 2 if len(word) >= LONG_WORD else 1
+        candidates = sorted(shared, key=shared.get, reverse=True)[:FUZZY_CANDIDATES]
+        keys = set()
+        for token in candidates:
+            if not token.isdigit() and typo_distance(word, token, bound) <= bound:
+                keys |= self.postings[token]
+        return keys
+
+    # Function to find students matching every word of the query, best matches first
+    # Returns a list of (row, firstName, lastName, cin, major)
+    def search(self, query, limit=MAX_RESULTS):
+        words = sorted(tokenize(query), key=len, reverse=True)   # Longest words narrow the result fastest
+        if not words:
+            return []
+        with self.lock:
+            matches = None              # Keys matching every narrow word so far
+            wide = []                   # Words too common to collect, checked per student at the end
+            for word in words:
+                start, end = self._prefix_range(word)
+                if end - start > WIDE_PREFIX:
+                    wide.append(word)
+                    continue
+                keys = self._prefix_keys(start, end)
+                if not keys and len(word) >= FUZZY_MIN_LENGTH and not word.isdigit():   # A CIN is never "close" to another
+                    keys = self._fuzzy_keys(word)
+                matches = keys if matches is None else matches & keys
+                if not matches:
+                    return []
+
+            def accept(key):
+                return all(self._has_prefix(key, word) for word in wide)
+
+            # Sheet order, except that a full CIN typed in goes to the top
+            exact = query.strip()
+            results = []
+            if exact in self.entries and (matches is None or exact in matches) and accept(exact):
+                results.append(self.entries[exact])
+            if matches is not None and len(matches) <= limit * 8:
+                keys = sorted((key for key in matches if key != exact and accept(key)), key=lambda key: self.entries[key][0])
+            else:
+                # Most students match: walk the sheet in order and stop once the page is full
+                keys = (key for key in self.order if key != exact and (matches is None or key in matches) and accept(key))
+            results.extend(self.entries[key] for key in islice(keys, limit - len(results)))
+            return results
@@ -0,0 +1,163 @@
+# Roster snapshot: the master list rows saved in a small SQLite file, so a launch doesn't parse the workbook
+#
+# Reading the .xlsx through openpyxl is the slowest part of starting up, and the master list rarely
+# changes between events. After the first parse the rows are stored as one marshal blob, keyed by the
+# workbook's path, size, modification time and SHA-256. A later launch finds the snapshot by path:
+#   - same size and modification time: the snapshot is used as is
+#   - size or time changed (OneDrive re-syncs touch the file): the file is hashed, and an unchanged
+#     hash still uses the snapshot
+#   - anything else: the workbook is parsed again and the snapshot replaced
+# Hits, misses and the last cold (openpyxl) and warm (snapshot) load times are kept per workbook.
+#
+#   python roster_snapshot.py <cache.db>        shows the snapshots and their hit rates
+
+import hashlib
+import marshal
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+SNAPSHOT_VERSION = 1            # Bump when the row layout changes; marshal.version is checked as well
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS roster_snapshot (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    format TEXT NOT NULL,
+    row_count INTEGER NOT NULL,
+    rows BLOB NOT NULL,
+    created_at TEXT,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    cold_seconds REAL,
+    warm_seconds REAL
+);
+"""
+
+
+# Function to hash a file in 1 MB chunks
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_format():
+    return f"{SNAPSHOT_VERSION}/{marshal.version}"
+
+
+class RosterSnapshot:
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")   # A lost hit counter is fine, a startup waiting on fsync isn't
+        self.db.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.last = None                # How the last load() went, see describe()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    # Function to get the rows of the workbook at path, from the snapshot if it is still current
+    # read_workbook() parses the workbook and is only called on a miss
+    def load(self, path, read_workbook):
+        path = os.path.abspath(path)
+        start = time.perf_counter()
+        stat = os.stat(path)
+        with self.lock:
+            found = self.db.execute(
+                "SELECT size, mtime_ns, sha256, format, rows FROM roster_snapshot WHERE path = ?", (path,)).fetchone()
+
+        if found is not None and found[3] == snapshot_format():
+            size, mtime_ns, sha256, _, blob = found
+            current = (size, mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+            if not current and size == stat.st_size and file_sha256(path) == sha256:
+                current = True          # Touched but not changed
+                with self.lock, self.db:
+                    self.db.execute("UPDATE roster_snapshot SET mtime_ns = ? WHERE path = ?", (stat.st_mtime_ns, path))
+            if current:
+                try:
+                    rows = marshal.loads(blob)
+                except (ValueError, EOFError, TypeError) as e:      # A damaged blob is read again from the workbook
+                    print(f"Master list snapshot unreadable, reading the workbook: {e}")
+                else:
+                    self._finish(path, "hit", time.perf_counter() - start, len(rows))
+                    return rows
+
+        sha256 = file_sha256(path)
+        rows = read_workbook()
+        cold_seconds = time.perf_counter() - start
+        # The snapshot is only a cache: rows it can't hold (e.g. a date cell) are still returned, just not saved
+        try:
+            self._save(path, stat, sha256, rows)
+        except (ValueError, sqlite3.Error) as e:
+            print(f"Master list snapshot not saved: {e}")
+            return rows
+        self._finish(path, "miss", cold_seconds, len(rows))
+        return rows
+
+    def _save(self, path, stat, sha256, rows):
+        blob = marshal.dumps([tuple(row) for row in rows])   # ValueError for values marshal can't write
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT INTO roster_snapshot (path, size, mtime_ns, sha256, format, row_count, rows, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (path) DO UPDATE SET size = excluded.size, "
+                "mtime_ns = excluded.mtime_ns, sha256 = excluded.sha256, format = excluded.format, "
+                "row_count = excluded.row_count, rows = excluded.rows, created_at = excluded.created_at",
+                (path, stat.st_size, stat.st_mtime_ns, sha256, snapshot_format(), len(rows), blob,
+                 datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def _finish(self, path, result, seconds, row_count):
+        column = "warm_seconds" if result == "hit" else "cold_seconds"
+        counter = "hits" if result == "hit" else "misses"
+        with self.lock, self.db:
+            self.db.execute(f"UPDATE roster_snapshot SET {counter} = {counter} + 1, {column} = ? WHERE path = ?",
+                            (seconds, path))
+            hits, misses, cold, warm = self.db.execute(
+                "SELECT hits, misses, cold_seconds, warm_seconds FROM roster_snapshot WHERE path = ?", (path,)).fetchone()
+        self.last = {"result": result, "seconds": seconds, "rows": row_count, "hits": hits, "misses": misses,
+                     "cold_seconds": cold, "warm_seconds": warm}
+        print(self.describe())
+
+    # Hit rate over every load of the last workbook, None before the first load
+    def hit_rate(self):
+        if self.last is None:
+            return None
+        return self.last["hits"] / (self.last["hits"] + self.last["misses"])
+
+    def describe(self):
+        last = self.last
+        if last is None:
+            return "Master list snapshot: not used yet"
+        cold = f"{last['cold_seconds'] * 1000:.0f} ms" if last["cold_seconds"] is not None else "-"
+        warm = f"{last['warm_seconds'] * 1000:.0f} ms" if last["warm_seconds"] is not None else "-"
+        return (f"Master list snapshot {last['result']}: {last['rows']} rows in {last['seconds'] * 1000:.0f} ms "
+                f"(cold load {cold}, warm load {warm}, hit rate {self.hit_rate():.0%} "
+                f"over {last['hits'] + last['misses']} loads)")
+
+
+def main(argv):
+    if len(argv) != 2:
+        print("usage: python roster_snapshot.py <cache.db>")
+        return 2
+    snapshot = RosterSnapshot(argv[1])
+    for path, row_count, hits, misses, cold, warm, created in snapshot.db.execute(
+            "SELECT path, row_count, hits, misses, cold_seconds, warm_seconds, created_at FROM roster_snapshot"):
+        cold = f"{cold * 1000:.0f} ms" if cold is not None else "-"
+        warm = f"{warm * 1000:.0f} ms" if warm is not None else "-"
+        print(f"{path}: {row_count} rows, saved {created}, {hits} hits / {misses} misses, cold {cold}, warm {warm}")
+    snapshot.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
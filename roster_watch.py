@@ -0,0 +1,56 @@
+# Roster watch: reloads the master list as soon as it changes on disk, instead of on the next lookup
+#
+# The workbook's modification time and size are polled every interval seconds (os.stat, so it works
+# the same on Windows, OneDrive folders and network shares). A change is only picked up once two
+# polls in a row agree, so a workbook that Excel or OneDrive is still writing isn't read half way.
+# The reload runs on the watch thread: Roster.refresh parses the workbook, applies the row-level diff
+# to its indexes, logs it and hands it to the roster's on_change for everything else that shows the
+# master list, such as the Excel Data tab.
+# Lookups (search, the Excel Data tab) never read the file, they answer from what the watch loaded.
+# Writing a tag still checks the file first, so a tag is never written from rows older than the file.
+
+import threading
+
+INTERVAL = 2.0                  # Seconds between polls
+
+
+class RosterWatcher:
+    def __init__(self, roster, interval=INTERVAL):
+        self.roster = roster
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.thread = None
+        self.reloads = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="roster-watch", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        seen = None                     # Signature at the previous poll
+        while not self.stopping.wait(self.interval):
+            try:
+                signature = self.roster.file_signature()
+            except OSError:
+                seen = None             # Moved away while being saved, or OneDrive is replacing it
+                continue
+            if signature == self.roster.signature or signature != seen:
+                seen = signature        # Unchanged, or still changing
+                continue
+            self.poll()
+
+    # Function to reload now if the workbook changed; returns the RosterDiff, or None
+    def poll(self):
+        try:
+            diff = self.roster.refresh()
+        except Exception as e:          # A workbook saved in the middle of the read, tried again next poll
+            print(f"Error reloading master list: {e}")
+            return None
+        if diff is not None:
+            self.reloads += 1
+        return diff
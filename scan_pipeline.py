@@ -0,0 +1,178 @@
+# Scan pipeline: asyncio engine that runs each step of a check-in as its own stage
+#
+#   acquire -> parse -> dedup -> persist -> notify
+#
+# Stages are joined by bounded queues, so a slow stage only fills its queue instead of stalling the
+# reader. Blocking work (pyscard calls, hub requests, file writes) runs in executors: one thread per
+# reader, one for the remote duplicate check and one for persistence, so the next student can tap
+# while the previous record is still being written.
+# Every reader is a separate source feeding the same parse queue, so all readers share one dedup
+# stage and one writer.
+# When a queue is full the stage feeding it waits, which is the back-pressure; queue_depths() shows it.
+
+import asyncio                                                  # Import asyncio for the pipeline event loop
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+STAGES = ("parse", "dedup", "persist", "notify")
+
+
+class ScanPipeline:
+    # Sources are added with add_source(name, acquire):
+    # acquire()         blocking, returns a raw tap or None when nothing happened (runs on that source's thread)
+    #
+    # parse(raw)        returns a student_record.Student or None
+    # dedup(student)    returns True if the student still needs to be logged
+    # remote_dedup(student)  optional, blocking, same answer from another service (runs in its own executor)
+    # persist(student)  blocking, writes the record and returns it (runs in the persistence executor)
+    # notify(record)    tells the UI about a logged record
+    # duplicate(student)  optional, tells the UI about a tap of a student who is still being logged
+    def __init__(self, parse, dedup, persist, notify, maxsize=32, remote_dedup=None, duplicate=None):
+        self.parse = parse
+        self.dedup = dedup
+        self.remote_dedup = remote_dedup
+        self.duplicate = duplicate
+        self.persist = persist
+        self.notify = notify
+        self.maxsize = maxsize
+        self.queues = {}
+        self.in_flight = set()          # CINs accepted by dedup but not written yet
+        self.loop = None
+        self.started = threading.Event()
+        self.stopping = threading.Event()
+        self.stopped = None             # asyncio.Event set by stop()
+        self.sources = {}               # source name -> (acquire, stop event)
+        self.source_lock = threading.Lock()
+        self.writer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="attendance-writer")
+        self.remote_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="remote-dedup")
+
+    # Number of items waiting in front of each stage
+    def queue_depths(self):
+        return {name: q.qsize() for name, q in self.queues.items()}
+
+    def backlog(self):
+        return sum(self.queue_depths().values())
+
+    # Function to run the pipeline on the calling thread until stop() is called
+    def run(self):
+        asyncio.run(self._main())
+
+    def stop(self):
+        self.stopping.set()
+        if self.started.is_set() and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    # Function to start reading from a new source, can be called from any thread
+    def add_source(self, name, acquire):
+        with self.source_lock:
+            self.sources[name] = (acquire, threading.Event())
+            if self.started.is_set():
+                self.loop.call_soon_threadsafe(self._start_source, name)
+
+    # Function to stop reading from a source; a tap it is reading is still delivered
+    def remove_source(self, name):
+        with self.source_lock:
+            source = self.sources.pop(name, None)
+        if source is not None:
+            source[1].set()             # The source's acquire loop notices within one acquire() timeout
+
+    def _start_source(self, name):
+        with self.source_lock:
+            if name not in self.sources:
+                return
+            acquire, stop_event = self.sources[name]
+        self.source_tasks.add(asyncio.create_task(self._acquire_stage(name, acquire, stop_event)))
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self.queues = {name: asyncio.Queue(self.maxsize) for name in STAGES}
+        self.stopped = asyncio.Event()
+        self.source_tasks = set()
+        with self.source_lock:
+            self.started.set()
+            names = list(self.sources)  # Sources added from here on are started by add_source
+        for name in names:
+            self._start_source(name)    # Takes source_lock itself
+        if self.stopping.is_set():
+            self.stopped.set()
+        workers = [
+            asyncio.create_task(self._stage("parse", self._parse_item)),
+            asyncio.create_task(self._stage("dedup", self._dedup_item)),
+            asyncio.create_task(self._stage("persist", self._persist_item)),
+            asyncio.create_task(self._stage("notify", self._notify_item)),
+        ]
+        try:
+            await self.stopped.wait()
+            with self.source_lock:
+                for _, stop_event in self.sources.values():
+                    stop_event.set()
+            await asyncio.gather(*self.source_tasks)
+            for name in STAGES:
+                await self.queues[name].join()   # Let taps already read finish their way through
+        finally:
+            for worker in workers:
+                worker.cancel()
+            self.remote_executor.shutdown(wait=True)
+            self.writer_executor.shutdown(wait=True)
+
+    async def _acquire_stage(self, name, acquire, stop_event):
+        # Each source gets its own thread so PC/SC calls on different readers run in parallel
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"reader-{name}")
+        try:
+            while not stop_event.is_set():
+                try:
+                    raw = await self.loop.run_in_executor(executor, acquire)
+                except Exception as e:
+                    print(f"Error acquiring tag from {name}: {e}")
+                    continue
+                if raw is not None:
+                    await self.queues["parse"].put(raw)
+        finally:
+            executor.shutdown(wait=False)
+
+    async def _stage(self, name, handle):
+        q = self.queues[name]
+        while True:
+            item = await q.get()
+            try:
+                await handle(item)
+            except Exception as e:
+                print(f"Error in {name} stage: {e}")
+            finally:
+                q.task_done()
+
+    async def _parse_item(self, raw):
+        student = self.parse(raw)
+        if student is not None:
+            await self.queues["dedup"].put(student)
+
+    async def _dedup_item(self, student):
+        cin = student.cin
+        if cin in self.in_flight:
+            if self.duplicate is not None:
+                self.duplicate(student)     # Turned away like a student who already signed in
+            return
+        if not self.dedup(student):
+            return
+        self.in_flight.add(cin)     # Held while the remote check runs, so a second tap of the same CIN waits for it
+        if self.remote_dedup is not None:
+            accepted = False
+            try:
+                accepted = await self.loop.run_in_executor(self.remote_executor, self.remote_dedup, student)
+            finally:
+                if not accepted:
+                    self.in_flight.discard(cin)
+            if not accepted:
+                return
+        await self.queues["persist"].put(student)
+
+    async def _persist_item(self, student):
+        try:
+            record = await self.loop.run_in_executor(self.writer_executor, self.persist, student)
+        finally:
+            self.in_flight.discard(student.cin)
+        if record is not None:
+            await self.queues["notify"].put(record)
+
+    async def _notify_item(self, record):
+        self.notify(record)
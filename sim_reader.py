@@ -0,0 +1,261 @@
+# Simulated reader: an ACR122U with NTAG215 tags, without the hardware
+#
+# A SimulatedTag is the 135 pages of an NTAG215. A SimulatedReaderSession behaves like a
+# reader_session.ReaderSession and its connection answers the APDUs the tracker sends:
+#   FF CA 00 00 00                  get UID
+#   FF B0 00 <page> <length>        READ BINARY, 4 or 16 bytes
+#   FF D6 00 <page> 04 <4 bytes>    UPDATE BINARY, one page
+#   FF 00 00 00 05 D4 42 3A <s> <e> NTAG FAST_READ through the PN532
+# Every APDU can be slowed down (latency) and made to fail (error_rate, or fail_next for exact cases).
+# Taps are driven with insert()/remove(), or from a JSON script with run_script():
+#   {"taps": [{"cin": "301234567", "first": "Ana", "last": "Lopez", "major": "Computer Science",
+#              "dwell": 0.3, "gap": 1.0, "reader": 0, "legacy": false}]}
+
+import json
+import queue
+import random
+import threading
+import time
+from reader_backend import INSERTED, REMOVED, NO_READER
+from tag_payload import encode_payload, encode_legacy_payload
+
+NTAG215_PAGES = 135
+PAGE_SIZE = 4
+FIRST_USER_PAGE = 4
+LAST_USER_PAGE = 129            # Pages 130-134 hold the dynamic lock and configuration bytes
+SW_OK = (0x90, 0x00)
+SW_ERROR = (0x63, 0x00)         # What the ACR122U answers when the tag operation fails
+
+
+class CardRemovedError(Exception):
+    """The simulated tag left the field."""
+
+
+class SimulatedTag:
+    def __init__(self, uid=None):
+        self.uid = bytes(uid) if uid is not None else bytes([0x04]) + random.randbytes(6)
+        self.pages = bytearray(NTAG215_PAGES * PAGE_SIZE)
+        uid = self.uid
+        self.pages[0:4] = bytes([uid[0], uid[1], uid[2], 0x88 ^ uid[0] ^ uid[1] ^ uid[2]])
+        self.pages[4:8] = uid[3:7]
+        self.pages[8] = uid[3] ^ uid[4] ^ uid[5] ^ uid[6]
+        self.pages[12:16] = bytes([0xE1, 0x10, 0x3E, 0x00])    # Capability container of an NTAG215
+
+    # Function to make a tag that already carries a student, as write_nfc would leave it
+    @classmethod
+    def with_student(cls, cin, firstName, lastName, major, legacy=False, uid=None):
+        tag = cls(uid)
+        encode = encode_legacy_payload if legacy else encode_payload
+        tag.write_user_data(encode(cin, firstName, lastName, major))
+        return tag
+
+    def write_user_data(self, data):
+        start = FIRST_USER_PAGE * PAGE_SIZE
+        self.pages[start:start + len(data)] = data
+
+    def read(self, page, length):
+        # NTAG reads roll over past the last page
+        return [self.pages[(page * PAGE_SIZE + i) % len(self.pages)] for i in range(length)]
+
+
+class SimulatedConnection:
+    def __init__(self, session):
+        self.session = session
+        self.apdu_counts = {"uid": 0, "read": 0, "fast_read": 0, "write": 0, "other": 0}
+
+    def connect(self):
+        if self.session.tag is None:
+            raise CardRemovedError("No card in the field")
+
+    def disconnect(self):
+        pass
+
+    def transmit(self, apdu):
+        session = self.session
+        if session.latency:
+            time.sleep(session.latency)
+        tag = session.tag
+        if tag is None:
+            raise CardRemovedError("Card was removed")
+        kind, reply = self._answer(tag, apdu)
+        self.apdu_counts[kind] += 1
+        if session.should_fail():
+            return [], SW_ERROR[0], SW_ERROR[1]
+        return reply
+
+    def _answer(self, tag, apdu):
+        if apdu[:5] == [0xFF, 0xCA, 0x00, 0x00, 0x00]:
+            return "uid", (list(tag.uid), *SW_OK)
+        if apdu[:2] == [0xFF, 0xB0] and len(apdu) == 5:
+            page, length = apdu[3], apdu[4]
+            if page >= NTAG215_PAGES or length not in (PAGE_SIZE, 4 * PAGE_SIZE):
+                return "read", ([], *SW_ERROR)
+            return "read", (tag.read(page, length), *SW_OK)
+        if apdu[:2] == [0xFF, 0xD6] and len(apdu) == 9 and apdu[4] == PAGE_SIZE:
+            page = apdu[3]
+            if not FIRST_USER_PAGE <= page <= LAST_USER_PAGE:
+                return "write", ([], *SW_ERROR)
+            tag.pages[page * PAGE_SIZE:(page + 1) * PAGE_SIZE] = bytes(apdu[5:9])
+            return "write", ([], *SW_OK)
+        if apdu[:5] == [0xFF, 0x00, 0x00, 0x00, 0x05] and apdu[5:8] == [0xD4, 0x42, 0x3A]:
+            start, end = apdu[8], apdu[9]
+            if end < start or end >= NTAG215_PAGES:
+                return "fast_read", ([0xD5, 0x43, 0x01], *SW_OK)
+            return "fast_read", ([0xD5, 0x43, 0x00] + tag.read(start, (end - start + 1) * PAGE_SIZE), *SW_OK)
+        return "other", ([], 0x6A, 0x81)                                # Function not supported
+
+
+class SimulatedReaderSession:
+    def __init__(self, reader_name, latency=0.0, error_rate=0.0, seed=None):
+        self.reader_name = reader_name
+        self.latency = latency          # Seconds added to every APDU
+        self.error_rate = error_rate    # Share of APDUs answered with 63 00
+        self.random = random.Random(seed)
+        self.fail_next = 0              # The next fail_next APDUs fail whatever error_rate says
+        self.tag = None                 # Tag in the field
+        self.connection = SimulatedConnection(self)
+        self.connected = False
+        self.card_present = False
+        self.connect_seconds = 0.0      # How long connecting to the last card took
+        self.closed = False
+        self.events = queue.Queue()
+        self.lock = threading.RLock()
+
+    def open(self):
+        return not self.closed
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.tag = None
+            self.connected = False
+            self.card_present = False
+
+    def should_fail(self):
+        with self.lock:
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return True
+        return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    # Function to put a tag in the field
+    def insert(self, tag):
+        with self.lock:
+            self.tag = tag
+        self.events.put(INSERTED)
+
+    # Function to take the tag out of the field
+    def remove(self):
+        with self.lock:
+            self.tag = None
+        self.events.put(REMOVED)
+
+    # Function to tap a tag: in the field for dwell seconds, then removed
+    def tap(self, tag, dwell=0.3):
+        self.insert(tag)
+        time.sleep(dwell)
+        self.remove()
+
+    def ensure_connected(self):
+        with self.lock:
+            if not self.card_present:
+                raise CardRemovedError("No card in the field")
+            if not self.connected:
+                self.connection.connect()
+                self.connected = True
+            return self.connection
+
+    # Same contract as ReaderSession.next_event
+    def next_event(self, timeout=None):
+        if self.closed:
+            time.sleep(timeout or 1)
+            return NO_READER, None
+        try:
+            event = self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None, None
+
+        with self.lock:
+            if event == REMOVED:
+                self.connected = False
+                self.card_present = False
+                return REMOVED, None
+            self.card_present = True
+            try:
+                started = time.perf_counter()
+                connection = self.ensure_connected()
+                self.connect_seconds = time.perf_counter() - started
+                return INSERTED, connection
+            except CardRemovedError as e:
+                print(f"Failed to connect to card: {e}")
+                self.card_present = False
+                return None, None
+
+
+class SimulatedReaderPool:
+    NO_CARD_ERRORS = (CardRemovedError,)
+
+    # readers simulated readers are attached when the pool starts; the other options go to every session
+    def __init__(self, on_added, on_removed, readers=1, latency=0.0, error_rate=0.0, seed=None, script=None):
+        self.on_added = on_added
+        self.on_removed = on_removed
+        self.readers = readers
+        self.options = {"latency": latency, "error_rate": error_rate, "seed": seed}
+        self.script = script            # Path of a JSON tap script, played once the readers are attached
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.next_number = 0
+
+    def start(self):
+        for _ in range(self.readers):
+            self.add_reader()
+        if self.script:
+            threading.Thread(target=self.run_script, args=(self.script,), name="sim-script", daemon=True).start()
+
+    def stop(self):
+        with self.lock:
+            sessions = list(self.sessions.values())
+            self.sessions.clear()
+        for session in sessions:
+            session.close()
+
+    def all_sessions(self):
+        with self.lock:
+            return list(self.sessions.values())
+
+    # Function to plug in another simulated reader
+    def add_reader(self):
+        with self.lock:
+            name = f"Simulated ACR122U {self.next_number}"
+            self.next_number += 1
+            session = SimulatedReaderSession(name, **self.options)
+            self.sessions[name] = session
+        print(f"Reader attached: {name}")
+        self.on_added(session)
+        return session
+
+    # Function to unplug a simulated reader
+    def remove_reader(self, name):
+        with self.lock:
+            session = self.sessions.pop(name, None)
+        if session is not None:
+            print(f"Reader removed: {name}")
+            session.close()
+            self.on_removed(session)
+
+    # Function to play the taps of a JSON script (layout at the top of this file)
+    def run_script(self, path):
+        with open(path, 'r') as file:
+            script = json.load(file)
+        tags = {}                       # The same CIN is tapped with the same tag
+        for step in script.get("taps", []):
+            sessions = self.all_sessions()
+            if not sessions:
+                return
+            session = sessions[step.get("reader", 0) % len(sessions)]
+            key = str(step["cin"])
+            if key not in tags:
+                tags[key] = SimulatedTag.with_student(step["cin"], step["first"], step["last"], step["major"],
+                                                      legacy=step.get("legacy", False))
+            session.tap(tags[key], step.get("dwell", 0.3))
+            time.sleep(step.get("gap", 1.0))
@@ -0,0 +1,107 @@
+# Station configuration: master list, event name and output folder for one check-in station
+#
+# Values come from an INI file and from command-line arguments; arguments win over the file.
+# Whatever is missing is asked for with dialogs in GUI mode. Headless mode needs all three.
+#
+#   python PythonApplication.py --headless --master-list students.xlsx --event WelcomeMixer --output-folder ~/Events
+#   python PythonApplication.py --config station.ini
+#
+# station.ini:
+#   [station]
+#   master_list = C:\Users\staff\OneDrive\Registered ECST Transfers.xlsx
+#   event = WelcomeMixer
+#   output_folder = C:\Users\staff\Documents\Events
+#   headless = no
+#   reader = pcsc
+#   hub = http://192.168.1.20:8765
+#   station = north-door
+#
+# --reader sim runs against simulated readers (sim_reader.py) instead of an ACR122U; --sim-script plays
+# a JSON file of taps on them.
+#
+# --hub sends every check-in to a checkin_hub.py shared by the stations of the event, so a student
+# can't sign in at two doors; --station names this station there (default: the computer's name).
+#
+# The attendance is also exported to <event>_attendance.xlsx every --excel-interval seconds (0 turns it
+# off); --mark-attended adds the event to an "Attended" column in <master list>_attended.xlsx as well.
+#
+# --provision 2-150 writes tags for those master list rows instead of checking in (headless; the GUI
+# has a Bulk Write button), --provision-filter limits it to the students matching a search.
+
+import argparse
+import configparser
+import os
+import socket
+from reader_backend import BACKENDS
+
+CONFIG_SECTION = "station"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NFC attendance tracker")
+    parser.add_argument("--config", help="INI file with a [station] section")
+    parser.add_argument("--master-list", help="Excel file with the master list of students")
+    parser.add_argument("--event", help="Name of the event (no spaces)")
+    parser.add_argument("--output-folder", help="Folder for the attendance CSV")
+    parser.add_argument("--headless", action="store_true", default=None, help="Run without a window, log to the console")
+    parser.add_argument("--reader", choices=BACKENDS, help="Reader backend (default pcsc)")
+    parser.add_argument("--sim-readers", type=int, help="Number of simulated readers (default 1)")
+    parser.add_argument("--sim-script", help="JSON file of taps to play on the simulated readers")
+    parser.add_argument("--trace", action="store_true", default=None, help="Write one JSON line per tap with its stage timings")
+    parser.add_argument("--excel-interval", type=float, help="Seconds between Excel exports of the attendance (default 30, 0 = off)")
+    parser.add_argument("--mark-attended", action="store_true", default=None, help="Mark who attended in a workbook next to the master list")
+    parser.add_argument("--watch-interval", type=float, help="Seconds between checks of the master list for changes (default 2, 0 = off)")
+    parser.add_argument("--hub", help="URL of the check-in hub shared by the stations, e.g. http://127.0.0.1:8765")
+    parser.add_argument("--station", help="Name of this station at the hub (default: the computer's name)")
+    parser.add_argument("--provision", help="Rows to bulk write tags for, e.g. 2-150,300-320 (headless)")
+    parser.add_argument("--provision-filter", help="Only bulk write tags for students matching this search")
+    parser.add_argument("--metrics-interval", type=float, help="Seconds between writes of the metrics file (default 15)")
+    return parser.parse_args(argv)
+
+
+# Function to merge the config file and the arguments; returns a Namespace with
+# master_list, event, output_folder (None when not given), headless, reader, sim_readers, sim_script,
+# trace, metrics_interval, excel_interval, mark_attended, watch_interval, hub, station, provision and provision_filter
+def load_config(argv=None):
+    args = parse_args(argv)
+    settings = {}
+    if args.config:
+        parser = configparser.ConfigParser()
+        if not parser.read(args.config):
+            raise FileNotFoundError(f"Config file not found: {args.config}")
+        if parser.has_section(CONFIG_SECTION):
+            settings = parser[CONFIG_SECTION]
+
+    config = argparse.Namespace()
+    config.master_list = args.master_list or settings.get("master_list")
+    config.event = args.event or settings.get("event")
+    config.output_folder = args.output_folder or settings.get("output_folder")
+    if args.headless is not None:
+        config.headless = True
+    elif settings:
+        config.headless = settings.getboolean("headless", fallback=False)
+    else:
+        config.headless = False
+
+    config.reader = args.reader or settings.get("reader", "pcsc")
+    if config.reader not in BACKENDS:
+        raise ValueError(f"Unknown reader backend in {args.config}: {config.reader}")
+    config.sim_readers = args.sim_readers or int(settings.get("sim_readers", 1))
+    config.sim_script = args.sim_script or settings.get("sim_script")
+    config.trace = bool(args.trace) or (bool(settings) and settings.getboolean("trace", fallback=False))
+    config.metrics_interval = args.metrics_interval or float(settings.get("metrics_interval", 0)) or None
+    config.excel_interval = args.excel_interval if args.excel_interval is not None else \
+        float(settings.get("excel_interval", 30)) if settings else 30.0
+    config.mark_attended = bool(args.mark_attended) or (bool(settings) and settings.getboolean("mark_attended", fallback=False))
+    config.watch_interval = args.watch_interval if args.watch_interval is not None else \
+        float(settings.get("watch_interval", 2)) if settings else 2.0
+    config.hub = args.hub or settings.get("hub")
+    config.station = args.station or settings.get("station") or socket.gethostname()
+    config.provision = args.provision
+    config.provision_filter = args.provision_filter
+
+    for name in ("master_list", "output_folder", "sim_script"):
+        value = getattr(config, name)
+        if value:
+            setattr(config, name, os.path.expanduser(value))
+    return config
@@ -0,0 +1,101 @@
+# Student records: the student a tap belongs to, and the attendance row it becomes
+#
+# A busy event moves the same few majors and transfer colleges through thousands of taps, and the
+# tag registry and the attendance tab keep a record per student for the whole event. Both types use
+# __slots__ (no per-object dict) and intern the major and college strings, so every "Computer Science"
+# is the same string object. Fields are read by name, and never joined into a comma-separated string
+# and split again, so a comma in a major or a college can't shift the columns.
+#
+# An AttendanceRecord is also a sequence in the CSV column order (see attendance_store.CSV_HEADER),
+# so csv.writer, the attendance database, the hub and the Attendance tab take it like a row.
+
+import sys
+
+
+# Function to intern a text field; None and non-text values are left as they are
+def intern_text(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class Student:
+    __slots__ = ("cin", "first_name", "last_name", "major", "reader")
+
+    def __init__(self, cin, first_name, last_name, major, reader=""):
+        self.cin = cin
+        self.first_name = first_name
+        self.last_name = last_name
+        self.major = intern_text(major)
+        self.reader = intern_text(reader)   # Reader that took the tap, empty outside the scan pipeline
+
+    # Function to pair the student with the reader that took the tap
+    def tapped_at(self, reader):
+        return Student(self.cin, self.first_name, self.last_name, self.major, reader)
+
+    def name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    # (cin, firstName, lastName, major), the fields stored on a tag; the reader is not part of them
+    def __iter__(self):
+        return iter((self.cin, self.first_name, self.last_name, self.major))
+
+    def __eq__(self, other):
+        if not isinstance(other, Student):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Student({self.cin!r}, {self.first_name!r}, {self.last_name!r}, {self.major!r})"
+
+
+class AttendanceRecord:
+    __slots__ = ("cin", "first_name", "last_name", "major", "transferred_from", "timestamp", "reader")
+
+    def __init__(self, cin, first_name, last_name, major, transferred_from, timestamp, reader):
+        self.cin = cin
+        self.first_name = first_name
+        self.last_name = last_name
+        self.major = intern_text(major)
+        self.transferred_from = intern_text(transferred_from)
+        self.timestamp = timestamp
+        self.reader = intern_text(reader)
+
+    @classmethod
+    def for_student(cls, student, transferred_from, timestamp):
+        return cls(student.cin, student.first_name, student.last_name, student.major, transferred_from,
+                   timestamp, student.reader)
+
+    # Function to build a record from a 7-column row (see attendance_store.normalize_row for older layouts)
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row[:7])
+
+    # Function to fill in the transfer information; the college is interned like the major
+    def set_transferred_from(self, transferred_from):
+        self.transferred_from = intern_text(transferred_from)
+
+    def name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    def __iter__(self):
+        return iter((self.cin, self.first_name, self.last_name, self.major, self.transferred_from,
+                     self.timestamp, self.reader))
+
+    def __len__(self):
+        return 7
+
+    def __getitem__(self, index):
+        if isinstance(index, int) and 0 <= index < 7:
+            return getattr(self, self.__slots__[index])
+        return tuple(self)[index]
+
+    def __eq__(self, other):
+        if not isinstance(other, AttendanceRecord):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"AttendanceRecord{tuple(self)!r}"
@@ -0,0 +1,111 @@
+# Tag I/O: APDU helpers for reading NTAG215 tags through the ACR122U
+# Instead of one READ BINARY per 4-byte page, pages are read several at a time
+# (16 bytes per READ BINARY, or up to 64 bytes per NTAG FAST_READ passthrough)
+# and reading stops as soon as the end of the payload has been seen (see tag_payload.payload_complete).
+# Writes still go one page per UPDATE BINARY (the only size NTAG accepts) and are checked by reading them back.
+
+PAGE_SIZE = 4                   # NTAG pages are 4 bytes
+FIRST_DATA_PAGE = 4             # Pages 0-3 hold the UID, lock bytes and capability container
+LAST_DATA_PAGE = 49             # Last page the attendance payload may use
+
+READ_BINARY_PAGES = 4           # FF B0 returns 16 bytes (4 pages) per APDU on NTAG
+FAST_READ_PAGES = 16            # Pages per FAST_READ, keeps the reply within the ACR122U frame size
+USE_FAST_READ = False           # Send NTAG FAST_READ (3A) through the reader instead of READ BINARY
+
+
+class TagRead:
+    def __init__(self):
+        self.data = b""         # Raw bytes read from FIRST_DATA_PAGE onwards
+        self.apdu_count = 0     # APDUs sent for this read
+        self.ok = True          # False if the reader answered with an error status
+        self.sw1 = None
+        self.sw2 = None
+        self.uid = None         # Tag UID as a hex string, when it was read
+        self.student = None     # student_record.Student from the tag registry, if the UID is known
+
+
+# Function to get the tag UID with FF CA; returns it as a hex string, or None if the reader refused
+def read_uid(connection):
+    data, sw1, sw2 = connection.transmit([0xFF, 0xCA, 0x00, 0x00, 0x00])
+    if sw1 != 0x90 or not data:
+        return None
+    return bytes(data).hex().upper()
+
+
+# Function to read 16 bytes (4 pages) starting at page with a single READ BINARY
+def read_binary(connection, page, length=READ_BINARY_PAGES * PAGE_SIZE):
+    return connection.transmit([0xFF, 0xB0, 0x00, page, length])
+
+
+# Function to read pages start..end (inclusive) with NTAG FAST_READ through the reader's direct transmit
+def fast_read(connection, start, end):
+    command = [0xD4, 0x42, 0x3A, start, end]                    # PN532 InCommunicateThru + FAST_READ
+    data, sw1, sw2 = connection.transmit([0xFF, 0x00, 0x00, 0x00, len(command)] + command)
+    expected = (end - start + 1) * PAGE_SIZE
+    if sw1 != 0x90 or data[:3] != [0xD5, 0x43, 0x00] or len(data) - 3 < expected:
+        return [], 0x6F, 0x00                                   # Treat a bad passthrough reply as a failed read
+    return data[3:3 + expected], sw1, sw2
+
+
+# Function to read the tag payload in as few APDUs as possible
+# is_complete(data) is called after every APDU and ends the read early once it returns True
+def read_payload(connection, is_complete=None, first_page=FIRST_DATA_PAGE, last_page=LAST_DATA_PAGE, use_fast_read=None):
+    if use_fast_read is None:
+        use_fast_read = USE_FAST_READ
+
+    tag = TagRead()
+    page = first_page
+    length = READ_BINARY_PAGES * PAGE_SIZE
+    while page <= last_page:
+        if use_fast_read:
+            end = min(page + FAST_READ_PAGES - 1, last_page)
+            data, sw1, sw2 = fast_read(connection, page, end)
+            tag.apdu_count += 1
+            if sw1 != 0x90:
+                use_fast_read = False                           # Reader or tag doesn't support it, fall back to READ BINARY
+                continue
+        else:
+            data, sw1, sw2 = read_binary(connection, page, length)
+            tag.apdu_count += 1
+            if sw1 != 0x90 and length > PAGE_SIZE:
+                length = PAGE_SIZE                              # Some readers only answer 4-byte reads
+                continue
+        tag.sw1, tag.sw2 = sw1, sw2
+        if sw1 != 0x90:
+            tag.ok = False
+            return tag
+
+        # Never keep bytes past the last data page, a 16-byte read can run over it
+        pages = min(len(data) // PAGE_SIZE, last_page - page + 1)
+        if pages < 1:
+            tag.ok = False
+            return tag
+        tag.data += bytes(data[:pages * PAGE_SIZE])
+        page += pages
+
+        if is_complete and is_complete(tag.data):
+            break
+    return tag
+
+
+# Function to write data page by page from first_page, back to back
+# Returns (ok, apdu_count, page); page is the page that failed, if one did
+def write_pages(connection, data, first_page=FIRST_DATA_PAGE):
+    apdu_count = 0
+    for i in range(0, len(data), PAGE_SIZE):
+        page = first_page + i // PAGE_SIZE
+        chunk = bytes(data[i:i + PAGE_SIZE]).ljust(PAGE_SIZE, b'\x00')   # Pad with null bytes if needed
+        _, sw1, sw2 = connection.transmit([0xFF, 0xD6, 0x00, page, PAGE_SIZE] + list(chunk))
+        apdu_count += 1
+        if sw1 != 0x90 or sw2 != 0x00:
+            return False, apdu_count, page
+    return True, apdu_count, None
+
+
+# Function to read back what write_pages wrote; returns (matches, TagRead)
+def verify_pages(connection, data, first_page=FIRST_DATA_PAGE):
+    expected = bytes(data).ljust(-(-len(data) // PAGE_SIZE) * PAGE_SIZE, b'\x00')
+    last_page = first_page + len(expected) // PAGE_SIZE - 1
+    tag = read_payload(connection, is_complete=lambda read: len(read) >= len(expected),
+                       first_page=first_page, last_page=last_page)
+    return tag.ok and tag.data[:len(expected)] == expected, tag
@@ -0,0 +1,165 @@
+# Tag payload: how a student's details are laid out in the tag's user pages
+#
+# Version 1 (compact) record, written by write_nfc:
+#   byte 0      0xA1 (high nibble 0xA marks a compact record, low nibble is the version)
+#   byte 1      number of bytes that follow, including the checksum
+#   fields      CIN, first name, last name, major; each is one length byte followed by the value
+#                 CIN      digits packed two per byte (BCD), padded with 0xF
+#                 strings  UTF-8; a length byte with the high bit set is instead the index of an
+#                          entry in COMMON_STRINGS and has no value bytes
+#   last byte   CRC-8 of everything before it
+#
+# Legacy record, written before the compact format and still decoded:
+#   CinNumber{cin}FirstName{first}LastName{last}Major{major}End   (ASCII)
+
+from tag_io import PAGE_SIZE, FIRST_DATA_PAGE, LAST_DATA_PAGE
+
+COMPACT_MAGIC = 0xA0
+COMPACT_VERSION = 1
+COMPACT_HEADER = COMPACT_MAGIC | COMPACT_VERSION
+MAX_PAYLOAD = (LAST_DATA_PAGE - FIRST_DATA_PAGE + 1) * PAGE_SIZE
+
+# Strings that are stored as a single byte. Only ever append to this list:
+# tags already written rely on the position of every entry.
+COMMON_STRINGS = (
+    "Computer Science",
+    "Computer Engineering",
+    "Electrical Engineering",
+    "Mechanical Engineering",
+    "Civil Engineering",
+    "Aerospace Engineering",
+    "Industrial Technology",
+    "Information Technology",
+    "Technology",
+    "Fire Protection Administration and Technology",
+    "Engineering",
+    "Undeclared",
+)
+COMMON_CODES = {value: code for code, value in enumerate(COMMON_STRINGS)}
+
+
+def crc8(data):
+    crc = 0
+    for b in data:
+        crc ^= b
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+def _encode_cin(cin):
+    digits = str(cin).strip()
+    if isinstance(cin, float) and cin.is_integer():
+        digits = str(int(cin))
+    if not digits.isdigit():
+        raise ValueError(f"CIN must be numeric: {cin}")
+    if len(digits) % 2:
+        digits += "F"
+    packed = bytes(int(digits[i:i + 2], 16) for i in range(0, len(digits), 2))
+    return bytes([len(packed)]) + packed
+
+
+def _decode_cin(value):
+    return value.hex().upper().rstrip("F")
+
+
+def _encode_string(value):
+    value = str(value).strip()
+    if value in COMMON_CODES:
+        return bytes([0x80 | COMMON_CODES[value]])
+    raw = value.encode("utf-8")
+    if len(raw) > 0x7F:
+        raise ValueError(f"Field too long ({len(raw)} bytes): {value}")
+    return bytes([len(raw)]) + raw
+
+
+# Function to build the compact record for a student
+def encode_payload(cin, firstName, lastName, major):
+    body = _encode_cin(cin) + _encode_string(firstName) + _encode_string(lastName) + _encode_string(major)
+    record = bytes([COMPACT_HEADER, len(body) + 1]) + body
+    record += bytes([crc8(record)])
+    if len(record) > MAX_PAYLOAD:
+        raise ValueError(f"Data too long ({len(record)} bytes). Maximum is {MAX_PAYLOAD} bytes.")
+    return record
+
+
+# Function to build the legacy ASCII record (only needed to produce old-style tags)
+def encode_legacy_payload(cin, firstName, lastName, major):
+    return f"CinNumber{cin}FirstName{firstName}LastName{lastName}Major{major}End".encode("ascii")
+
+
+def is_compact(data):
+    return len(data) > 0 and data[0] & 0xF0 == COMPACT_MAGIC
+
+
+# Legacy payloads look like CinNumber...FirstName...LastName...Major...End
+def legacy_payload_complete(data):
+    major_start = data.find(b"Major")
+    return major_start != -1 and data.find(b"End", major_start + 5) != -1
+
+
+# Returns True once no more pages need to be read for this payload
+def payload_complete(data):
+    if is_compact(data):
+        return len(data) >= 2 and len(data) >= 2 + data[1]
+    if len(data) >= 16 and b"CinNumber" not in data[:16]:
+        return True             # Blank or foreign tag, there is nothing of ours further on
+    return legacy_payload_complete(data)
+
+
+def decode_compact(data):
+    if data[0] != COMPACT_HEADER:
+        print(f"Unsupported tag payload version: {data[0] & 0x0F}")
+        return None
+    end = 2 + data[1]
+    if len(data) < end or crc8(data[:end - 1]) != data[end - 1]:
+        print("Tag payload checksum mismatch")
+        return None
+    fields = []
+    pos = 2
+    while pos < end - 1 and len(fields) < 4:
+        length = data[pos]
+        pos += 1
+        if length & 0x80 and fields:                            # The CIN is never a shared string
+            code = length & 0x7F
+            if code >= len(COMMON_STRINGS):
+                return None
+            fields.append(COMMON_STRINGS[code])
+            continue
+        value = data[pos:pos + length]
+        pos += length
+        fields.append(_decode_cin(value) if not fields else value.decode("utf-8", errors="replace"))
+    if len(fields) != 4:
+        return None
+    return tuple(fields)
+
+
+def decode_legacy(data):
+    # Convert data to ASCII, ignore non-printable characters
+    result = ''.join([chr(b) for b in data if 32 <= b <= 126])
+
+    cin_start = result.find("CinNumber")
+    if cin_start == -1:
+        return None
+    firstName_start = result.find("FirstName")
+    lastName_start = result.find("LastName")
+    major_start = result.find("Major")
+    end = result.find("End", major_start + 5)
+    if -1 in (firstName_start, lastName_start, major_start, end):
+        print("Tag payload is missing a field")
+        return None
+
+    # Extract only the numeric part after "CinNumber"
+    cin_number = ''.join(filter(str.isdigit, result[cin_start + 9:firstName_start]))
+    firstName = result[firstName_start + 9:lastName_start]
+    lastName = result[lastName_start + 8:major_start]
+    major = result[major_start + 5:end]
+    return cin_number, firstName, lastName, major
+
+
+# Function to decode a tag payload in either format
+# Returns (cin, firstName, lastName, major), or None if the tag holds no student
+def decode_payload(data):
+    if is_compact(data):
+        return decode_compact(data)
+    return decode_legacy(data)
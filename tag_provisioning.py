@@ -0,0 +1,152 @@
+# Tag provisioning: writing tags for a batch of master list rows, one tag after another
+#
+# A batch is built from row ranges ("2-150, 300-320") and an optional filter (matched like the
+# search box: CIN, names or major). Students whose CIN already has a tag in the tag registry and
+# rows with missing data are left out when the batch is built, and every payload is encoded up
+# front. While the batch runs, every tag presented on any reader is written for the next student
+# and read back to check it. With several readers, several tags are written at the same time.
+# A failed tag leaves its student at the front of the batch for the next tag, up to max_attempts.
+
+import threading
+import time
+from roster import normalize_cin
+from tag_payload import encode_payload
+
+MAX_ATTEMPTS = 3                # Tags tried for one student before giving up on them
+
+
+# Function to parse "2-150, 300, 310-320" into [(2, 150), (300, 300), (310, 320)]
+def parse_row_ranges(text):
+    ranges = []
+    for part in text.replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        try:
+            first = int(first)
+            last = int(last) if last.strip() else first
+        except ValueError:
+            raise ValueError(f"Not a row range: {part}")
+        if first < 2 or last < first:
+            raise ValueError(f"Not a row range: {part} (rows start at 2)")
+        ranges.append((first, last))
+    if not ranges:
+        raise ValueError("No rows given")
+    return ranges
+
+
+class ProvisioningBatch:
+    # students are (row, firstName, lastName, cin, major) roster entries, in the order to write them
+    def __init__(self, students, enrolled_cins=(), max_attempts=MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.pending = []               # [entry, payload, attempts] still to write, next first
+        self.in_progress = {}           # cin -> item of the tags being written right now
+        self.written = []               # (row, cin, uid) written and verified
+        self.skipped = []               # (row, cin, reason) left out when the batch was built
+        self.failures = []              # (row, cin, reason) of every failed tag
+        self.gave_up = []               # (row, cin) that failed max_attempts times
+        self.written_uids = {}          # uid -> cin of the tags written by this batch
+        self.started_at = None          # time.monotonic() of the first tag
+        self.finished_at = None
+        self.stopped = False
+
+        enrolled = {normalize_cin(cin) for cin in enrolled_cins}
+        for entry in students:
+            row, firstName, lastName, cin, major = entry
+            cin = normalize_cin(cin)
+            if not all([firstName, lastName, cin, major]):
+                self.skipped.append((row, cin, "Incomplete data in row"))
+            elif cin in enrolled:
+                self.skipped.append((row, cin, "Already enrolled"))
+            else:
+                try:
+                    payload = encode_payload(cin, firstName, lastName, major)
+                except ValueError as e:
+                    self.skipped.append((row, cin, str(e)))
+                    continue
+                enrolled.add(cin)       # The same student twice in the selection gets one tag
+                self.pending.append([(row, firstName, lastName, cin, major), payload, 0])
+
+    # Function to build a batch from the roster: rows inside ranges and, if given, matching query
+    @classmethod
+    def from_roster(cls, roster, ranges, query=None, enrolled_cins=(), max_attempts=MAX_ATTEMPTS):
+        rows = [entry for entry in roster.all_rows() if any(first <= entry[0] <= last for first, last in ranges)]
+        if query and query.strip():
+            matches = {entry[0] for entry in roster.search(query, limit=len(roster.rows))}
+            rows = [entry for entry in rows if entry[0] in matches]
+        return cls(rows, enrolled_cins, max_attempts)
+
+    def done(self):
+        with self.lock:
+            return self.stopped or (not self.pending and not self.in_progress)
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            if self.finished_at is None:
+                self.finished_at = time.monotonic()
+
+    # Function to take the next student for a tag that was just presented
+    # Returns (entry, payload), or None when there is nobody left; raises ValueError for a tag this batch already wrote
+    def claim(self, uid):
+        with self.lock:
+            if self.stopped or not self.pending:
+                return None
+            if uid is not None and uid in self.written_uids:
+                raise ValueError(f"This tag was just written for CIN {self.written_uids[uid]}, present a new tag")
+            if self.started_at is None:
+                self.started_at = time.monotonic()
+            item = self.pending.pop(0)
+            item[2] += 1
+            self.in_progress[item[0][3]] = item
+            return item[0], item[1]
+
+    # Function to record how the tag for entry went; reason is None when it was written and verified
+    def finish(self, entry, uid, reason=None):
+        with self.lock:
+            item = self.in_progress.pop(entry[3])
+            row, cin = entry[0], entry[3]
+            if reason is None:
+                self.written.append((row, cin, uid))
+                if uid is not None:
+                    self.written_uids[uid] = cin
+            else:
+                self.failures.append((row, cin, reason))
+                if item[2] >= self.max_attempts:
+                    self.gave_up.append((row, cin))
+                else:
+                    self.pending.insert(0, item)    # Same student again with the next tag
+            if not self.pending and not self.in_progress and self.finished_at is None:
+                self.finished_at = time.monotonic()
+
+    def tags_per_minute(self):
+        with self.lock:
+            if self.started_at is None or not self.written:
+                return 0.0
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+            return len(self.written) * 60.0 / elapsed if elapsed > 0 else 0.0
+
+    def progress(self):
+        with self.lock:
+            written, remaining = len(self.written), len(self.pending) + len(self.in_progress)
+        return f"{written} written, {remaining} to go, {self.tags_per_minute():.1f} tags/min"
+
+    # Lines for the end of the batch: totals, then every row that didn't get a tag
+    def report(self):
+        with self.lock:
+            lines = [f"Provisioning: {len(self.written)} tags written and verified, {len(self.skipped)} rows skipped, "
+                     f"{len(self.failures)} failed tags, {len(self.gave_up)} students without a tag"]
+            skipped, failures, gave_up = list(self.skipped), list(self.failures), set(self.gave_up)
+            unwritten = [item[0] for item in self.pending]
+        lines[0] += f", {self.tags_per_minute():.1f} tags/min"
+        for row, cin, reason in failures:
+            given_up = " (gave up)" if (row, cin) in gave_up else ""
+            lines.append(f"  Row {row}, CIN {cin}: {reason}{given_up}")
+        for row, cin, reason in skipped:
+            if reason != "Already enrolled":
+                lines.append(f"  Row {row}, CIN {cin}: skipped, {reason}")
+        if unwritten:
+            lines.append(f"  Not written (batch stopped): rows {', '.join(str(entry[0]) for entry in unwritten)}")
+        return lines
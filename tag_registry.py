@@ -0,0 +1,90 @@
+# Tag registry: which student each tag belongs to, by tag UID
+#
+# Every tag that write_nfc enrolls, and every tag whose payload reads back complete, is recorded here
+# as UID -> Student (CIN, first name, last name, major). A tap on a known tag is then resolved from the UID
+# alone (the one FF CA APDU read_nfc already sends) instead of reading the payload. Every
+# verify_every-th tap of a tag still reads the payload, so a re-written tag updates its entry.
+# Tags whose payload is blank or damaged still check in as long as their UID is registered.
+# The registry lives in the attendance database and is loaded into memory when it opens.
+
+import sqlite3
+import threading
+from datetime import datetime
+from student_record import Student
+
+VERIFY_EVERY = 10               # Taps of the same tag between payload reads
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tag_registry (
+    uid TEXT PRIMARY KEY,
+    cin TEXT NOT NULL,
+    first_name TEXT,
+    last_name TEXT,
+    major TEXT,
+    registered_at TEXT
+);
+CREATE INDEX IF NOT EXISTS tag_registry_cin ON tag_registry (cin);
+"""
+
+
+class TagRegistry:
+    def __init__(self, db_path, verify_every=VERIFY_EVERY):
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self.verify_every = verify_every
+        self.lock = threading.Lock()
+        self.taps = {}                  # uid -> taps since the payload was last read
+        self.students = {uid: Student(cin, first, last, major) for uid, cin, first, last, major in
+                         self.db.execute("SELECT uid, cin, first_name, last_name, major FROM tag_registry")}
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __len__(self):
+        return len(self.students)
+
+    # Function to look a tag up; returns (student, verify) where student is a Student
+    # or None, and verify says the payload should be read anyway this time
+    def resolve(self, uid):
+        with self.lock:
+            student = self.students.get(uid)
+            if student is None:
+                return None, True
+            taps = self.taps.get(uid, 0) + 1
+            verify = taps >= self.verify_every
+            self.taps[uid] = 0 if verify else taps
+            return student, verify
+
+    # Function to record (or update) the student a tag belongs to
+    def register(self, uid, cin, firstName, lastName, major):
+        student = Student(str(cin), firstName, lastName, major)
+        with self.lock:
+            self.taps[uid] = 0
+            if self.students.get(uid) == student:
+                return False
+            self.students[uid] = student
+            with self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO tag_registry (uid, cin, first_name, last_name, major, registered_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (uid, *student, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            return True
+
+    def forget(self, uid):
+        with self.lock:
+            self.taps.pop(uid, None)
+            if self.students.pop(uid, None) is not None:
+                with self.db:
+                    self.db.execute("DELETE FROM tag_registry WHERE uid = ?", (uid,))
+
+    # UIDs of the tags enrolled for a CIN
+    def uids_for_cin(self, cin):
+        cin = str(cin)
+        with self.lock:
+            return [uid for uid, student in self.students.items() if student.cin == cin]
+
+    # CINs with at least one enrolled tag
+    def enrolled_cins(self):
+        with self.lock:
+            return {student.cin for student in self.students.values()}
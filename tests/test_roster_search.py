@@ -0,0 +1,55 @@
+# Tests for roster_search: prefix, typo and CIN matching on a small roster
+#
+#   python -m unittest discover tests
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roster_search import RosterSearchIndex, keyed_entries, typo_distance
+
+ROWS = [
+    (2, "Victor", "Lopez", 300000001, "Computer Science"),
+    (3, "Steven", "Garcia", 300000002, "Mechanical Engineering"),
+    (4, "Karen", "Nguyen", 300000003, "Civil Engineering"),
+    (5, "Eric", "Ramirez", 300000004, "Computer Engineering"),
+    (6, "Diana", "Flores", 300000015, "Aviation Administration"),
+]
+
+
+class RosterSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.index = RosterSearchIndex()
+        self.index.build(keyed_entries(ROWS))
+
+    def last_names(self, query):
+        return [entry[2] for entry in self.index.search(query)]
+
+    def test_prefix(self):
+        self.assertEqual(self.last_names("gar"), ["Garcia"])
+        self.assertEqual(self.last_names("comp eng"), ["Ramirez"])
+
+    def test_typos(self):
+        self.assertEqual(self.last_names("lopz"), ["Lopez"])         # Letter left out
+        self.assertEqual(self.last_names("garcai"), ["Garcia"])      # Neighbours swapped
+        self.assertEqual(self.last_names("nguyne"), ["Nguyen"])
+        self.assertEqual(self.last_names("rameriz"), ["Ramirez"])    # Two letters wrong in a long word
+
+    def test_unrelated_word(self):
+        self.assertEqual(self.last_names("xqzv"), [])
+
+    def test_cin_exact_or_prefix_only(self):
+        self.assertEqual(self.last_names("300000015"), ["Flores"])
+        self.assertEqual(self.last_names("30000000"), ["Lopez", "Garcia", "Nguyen", "Ramirez"])
+        self.assertEqual(self.last_names("300000000"), [])           # Close to every CIN, but not on the roster
+
+    def test_typo_distance(self):
+        self.assertEqual(typo_distance("garcai", "garcia", 1), 1)
+        self.assertEqual(typo_distance("rameriz", "ramirez", 2), 2)
+        self.assertEqual(typo_distance("lopz", "nguyen", 1), 2)      # Stops at bound + 1
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+# Transfer follow-ups: attendance records still waiting for the operator to enter transfer information
+#
+# A tap is recorded as soon as it is read: the CIN is claimed and the row goes into the attendance
+# database with an empty "Transferred from?" field. The AttendanceRecord waits here, and a prompt waits
+# in the GUI, until the operator answers. Then the field is filled in and the completed record is
+# written to the CSV. Records that are still waiting at shutdown are written with the field left empty.
+
+from collections import OrderedDict
+import threading
+
+WAITING_TEXT = "Waiting..."     # Shown in the Attendance tab until the transfer information is entered
+
+
+class TransferFollowUps:
+    def __init__(self):
+        self.waiting = OrderedDict()    # CIN -> AttendanceRecord, oldest first
+        self.lock = threading.Lock()
+
+    def add(self, record):
+        with self.lock:
+            self.waiting[record.cin] = record
+
+    # Function to fill in the transfer information; returns the completed record, or None if the CIN isn't waiting
+    def complete(self, cin, transferred_from):
+        with self.lock:
+            record = self.waiting.pop(cin, None)
+        if record is not None:
+            record.set_transferred_from(transferred_from)
+        return record
+
+    def count(self):
+        with self.lock:
+            return len(self.waiting)
+
+    # Names of the students still waiting, oldest first
+    def names(self):
+        with self.lock:
+            return [record.name() for record in self.waiting.values()]
+
+    # Function to take every waiting record as it is, used at shutdown
+    def take_all(self):
+        with self.lock:
+            rows = list(self.waiting.values())
+            self.waiting.clear()
+        return rows
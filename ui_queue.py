@@ -0,0 +1,89 @@
+# UI queue: the one way for worker threads to update the GUI
+#
+# Tkinter widgets may only be touched from the thread running mainloop. Worker threads (the NFC
+# pipeline, the attendance writer) post messages, table rows and calls here instead, and the Tk thread
+# drains the queue every frame with after(). Everything posted during one frame is applied together:
+# all messages go into the message box with a single insert, rows for a table are added with a single
+# extend, and the message box is trimmed to max_lines so it doesn't grow all day.
+
+import threading
+import time
+import tkinter as tk
+
+FRAME_MS = 50                   # How often the queue is drained, about 20 updates a second
+MAX_LINES = 2000                # Lines of scrollback kept in the message box
+
+
+class UIQueue:
+    # metrics (a metrics.Metrics) gets the time of every frame that had something to apply, as ui_update
+    def __init__(self, root, message_text, frame_ms=FRAME_MS, max_lines=MAX_LINES, metrics=None):
+        self.root = root
+        self.metrics = metrics
+        self.message_text = message_text
+        self.frame_ms = frame_ms
+        self.max_lines = max_lines
+        self.lock = threading.Lock()
+        self.messages = []              # Text waiting for the message box
+        self.rows = {}                  # table -> rows waiting for it, in arrival order
+        self.calls = []                 # (function, args) to run on the Tk thread
+        self.stopped = False
+        self.root.after(self.frame_ms, self._tick)
+
+    # Function to add a line to the message box; safe from any thread
+    def post_message(self, message):
+        with self.lock:
+            self.messages.append(message)
+
+    # Function to add a row to a VirtualTable; safe from any thread
+    def post_row(self, table, row):
+        with self.lock:
+            self.rows.setdefault(table, []).append(row)
+
+    # Function to run function(*args) on the Tk thread, after this frame's messages and rows
+    def post_call(self, function, *args):
+        with self.lock:
+            self.calls.append((function, args))
+
+    def stop(self):
+        self.stopped = True
+
+    def _tick(self):
+        if self.stopped:
+            return
+        try:
+            self.drain()
+        except tk.TclError as e:        # The window is being destroyed
+            print(f"Error updating the GUI: {e}")
+            return
+        self.root.after(self.frame_ms, self._tick)
+
+    # Function to apply everything posted so far; only call it on the Tk thread
+    def drain(self):
+        with self.lock:
+            messages, self.messages = self.messages, []
+            rows, self.rows = self.rows, {}
+            calls, self.calls = self.calls, []
+        if not (messages or rows or calls):
+            return
+        start = time.perf_counter()
+
+        if messages:
+            text = "\n".join(messages) + "\n"
+            lines = text.split("\n")
+            if len(lines) > self.max_lines:         # A burst bigger than the scrollback, keep its end
+                text = "\n".join(lines[-self.max_lines:])
+            self.message_text.insert(tk.END, text)
+            line_count = int(self.message_text.index('end-1c').split('.')[0])
+            if line_count > self.max_lines:
+                self.message_text.delete('1.0', f'{line_count - self.max_lines + 1}.0')
+            self.message_text.see(tk.END)
+
+        for table, table_rows in rows.items():
+            table.extend(table_rows)    # One render per table per frame
+
+        for function, args in calls:
+            # Scheduled rather than called, so a dialog opened by one call doesn't hold up the next frame
+            self.root.after_idle(function, *args)
+
+        if self.metrics is not None:
+            self.metrics.observe("ui_update", time.perf_counter() - start)
@@ -0,0 +1,146 @@
+# Virtual table: a Treeview that only holds the rows that fit on screen
+#
+# The rows live in a plain Python list (or anything with len() and indexing). The Treeview keeps one
+# item per visible line and the scrollbar, mouse wheel and keys just change which slice of the list
+# those items show, so a roster of 50,000 students costs the same to display as one of 50.
+
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualTable(ttk.Frame):
+    def __init__(self, master, columns, headings=None):
+        super().__init__(master)
+        self.columns = columns
+        self.rows = []
+        self.top = 0                    # Index of the row shown on the first line
+        self.visible = 20               # Lines that fit, updated when the widget is resized
+        self.selected = None            # Index of the selected row
+        self.follow = True              # Keep showing the newest rows while scrolled to the bottom
+        self.slots = []                 # Treeview items, one per visible line
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', selectmode='browse', height=self.visible)
+        for col, heading in zip(columns, headings or columns):
+            self.tree.heading(col, text=heading)
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=1)
+
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(-1 if e.delta > 0 else 1, 'units', 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-1, 'units', 3))     # Mouse wheel on Linux
+        self.tree.bind('<Button-5>', lambda e: self.scroll(1, 'units', 3))
+        self.tree.bind('<Up>', lambda e: self._move_selection(-1))
+        self.tree.bind('<Down>', lambda e: self._move_selection(1))
+        self.tree.bind('<Prior>', lambda e: self.scroll(-1, 'pages'))
+        self.tree.bind('<Next>', lambda e: self.scroll(1, 'pages'))
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+
+    # Function to replace every row; the list is used as is, not copied
+    def set_rows(self, rows):
+        self.rows = rows
+        self.top = min(self.top, self._max_top())
+        if self.selected is not None and self.selected >= len(rows):
+            self.selected = None
+        self._render()
+
+    def append(self, row):
+        self.extend([row])
+
+    def extend(self, rows):
+        self.rows.extend(rows)
+        if self.follow:
+            self.top = self._max_top()
+        self._render()
+
+    # Function to insert rows before index, e.g. older rows ahead of the ones already shown
+    def insert(self, index, rows):
+        self.rows[index:index] = rows
+        if self.selected is not None and self.selected >= index:
+            self.selected += len(rows)
+        if self.follow:
+            self.top = self._max_top()
+        self._render()
+
+    # Function to replace one row, redrawing only if it is on screen
+    def set_row(self, index, row):
+        self.rows[index] = row
+        if self.top <= index < self.top + len(self.slots):
+            self._render()
+
+    def row_count(self):
+        return len(self.rows)
+
+    # Function to select a row and scroll it into view
+    def select(self, index):
+        self.selected = index
+        self.see(index)
+
+    def see(self, index):
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.visible:
+            self.top = index - self.visible + 1
+        self.top = max(0, min(self.top, self._max_top()))
+        self.follow = self.top == self._max_top()
+        self._render()
+
+    def scroll(self, amount, what='units', step=1):
+        lines = amount * (self.visible if what == 'pages' else step)
+        self.top = max(0, min(self.top + lines, self._max_top()))
+        self.follow = self.top == self._max_top()
+        self._render()
+        return 'break'
+
+    def _max_top(self):
+        return max(0, len(self.rows) - self.visible)
+
+    def _on_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self.top = max(0, min(int(float(args[0]) * len(self.rows)), self._max_top()))
+            self.follow = self.top == self._max_top()
+            self._render()
+        elif action == 'scroll':
+            self.scroll(int(args[0]), args[1])
+
+    def _on_resize(self, event):
+        row_height = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        visible = max(1, (event.height - row_height - 5) // row_height)   # Leave room for the headings
+        if visible != self.visible:
+            self.visible = visible
+            self.top = min(self.top, self._max_top())
+            self._render()
+
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        if selection and selection[0] in self.slots:
+            self.selected = self.top + self.slots.index(selection[0])
+
+    def _move_selection(self, step):
+        if self.rows:
+            current = self.selected if self.selected is not None else self.top - step
+            self.select(max(0, min(current + step, len(self.rows) - 1)))
+        return 'break'
+
+    # Function to show rows[top:top + visible] in the Treeview items
+    def _render(self):
+        needed = max(0, min(self.visible, len(self.rows) - self.top))
+        while len(self.slots) < needed:
+            self.slots.append(self.tree.insert('', 'end'))
+        while len(self.slots) > needed:
+            self.tree.delete(self.slots.pop())
+        for offset, slot in enumerate(self.slots):
+            self.tree.item(slot, values=tuple('' if value is None else value for value in self.rows[self.top + offset]))
+
+        if self.selected is not None and self.top <= self.selected < self.top + needed:
+            slot = self.slots[self.selected - self.top]
+            if self.tree.selection() != (slot,):
+                self.tree.selection_set(slot)
+            self.tree.focus(slot)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        if self.rows:
+            self.scrollbar.set(self.top / len(self.rows), (self.top + needed) / len(self.rows))
+        else:
+            self.scrollbar.set(0, 1)